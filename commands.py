@@ -3,16 +3,12 @@ import helpers
 import dicts
 import asyncio
 import random
-import os
-import matplotlib.pyplot as plt
 from collections import Counter
+from io import BytesIO
 from discord.ui import View
 from discord.ext import commands
-from PIL import Image, ImageDraw, ImageFont
-from pulsefire.clients import RiotAPIClient
 from pulsefire.taskgroups import TaskGroup
-from datetime import datetime, timedelta, timezone
-import pytz
+from datetime import timedelta, timezone
 
 # Classify file commands as a cog that can be loaded in main
 class BotCommands(commands.Cog):
@@ -128,8 +124,7 @@ class BotCommands(commands.Cog):
         embed.set_footer(text=f"Average Lobby Rank: {avg_rank} {master_plus_lp} LP\nTimestamp: {time}" if master_plus_lp else f"Average Lobby Rank: {avg_rank}\nTimestamp: {time}")
         await ctx.send(embed=embed)
 
-        async with RiotAPIClient(default_headers={"X-Riot-Token": self.tft_token}) as client:
-            match_info = await client.get_tft_match_v1_match(region=mass_region, id=match_id)
+        match_info = await helpers.get_match("TFT", mass_region, match_id, self.tft_token)
 
         participants = match_info['info']['participants']
 
@@ -142,188 +137,55 @@ class BotCommands(commands.Cog):
         puuid_list = [p['puuid'] for p in participants_sorted]
         current_index = puuid_list.index(puuid)
         
-        async def generate_board_strip(index):
+        async def fetch_board_strip(index):
             participant = participants_sorted[index]
 
             # --- Traits Processing ---
             traits = participant['traits']
             filtered_traits = [trait for trait in traits if trait['style'] >= 1]
             sorted_traits = sorted(filtered_traits, key=lambda x: dicts.style_order.get(x['style'], 5))
-            num_traits = len(sorted_traits)
-            if num_traits <= 5:
-                start_y = 40
-            elif num_traits <= 9:
-                start_y = 20
-            else: 
-                start_y = 0
-
-            trait_img_width = 56
-            trait_img_height = 150
-            trait_final_width = 310
-            if puuid == participant['puuid']:
-                background_color = "#2F3136"
-            else:
-                background_color = (0,0,0,0)
-
-            trait_final_image = Image.new("RGBA", (trait_final_width, trait_img_height), background_color)
-
-            async def process_trait(trait, i):
-                temp_image = await helpers.trait_image(trait['name'], trait['style'], mappings["trait_icon_mapping"])
-                if temp_image:
-                    temp_image = temp_image.convert("RGBA")
-                    temp_image.thumbnail((trait_img_width, int(trait_img_width*1.16)))
-                    mask = temp_image.split()[3]
-                    if i < 5:
-                        trait_final_image.paste(temp_image, (10 + trait_img_width * i, start_y), mask)
-                    elif i < 9:
-                        trait_final_image.paste(temp_image, (10 + int(trait_img_width * (i - 4.5)), start_y + int(trait_img_width * 0.8)), mask)
-                    else:
-                        trait_final_image.paste(temp_image, (10 + trait_img_width * int(i - 9), start_y + int(trait_img_width*1.6)), mask)
-
-            # Fetch trait images concurrently
-            await asyncio.gather(*[process_trait(trait, i) for i, trait in enumerate(sorted_traits)])
-            font = ImageFont.truetype("fonts/NotoSans-Bold.ttf", size=36)
-
-            companion_height = 150
-            companion_width = 220
-            companion_final_image = Image.new("RGBA", (companion_width,  companion_height), background_color)
+
             companion_id = participant.get("companion", {}).get("content_ID")
             companion_path = helpers.get_companion_icon(mappings["companion_mapping"], companion_id)
             companion_url = f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/" + companion_path.lower()
-            companion_image = await helpers.fetch_image(companion_url)
-            square = helpers.center_square_crop(companion_image)
-            circle_img = helpers.circular_crop(square)
-            circle_img.thumbnail((70,70))
-            draw = ImageDraw.Draw(companion_final_image)
-
-            def truncate_text(draw, text, font, max_width):
-                # Truncate text with ellipsis (…) if it exceeds the given pixel width.
-                ellipsis = "…"
-                if draw.textlength(text, font=font) <= max_width:
-                    return text
-                while text and draw.textlength(text + ellipsis, font=font) > max_width:
-                    text = text[:-1]
-                return text + ellipsis
-
-            display_name = truncate_text(draw, participant.get('riotIdGameName', 'Unknown'), font, 200)
-
-            draw.text((20,90), display_name, font=font, fill="white")
-            companion_final_image.paste(circle_img, (20,20), circle_img)
 
+            # Fetch trait badges, companion and unit icons concurrently
+            trait_images, companion_image, units = await asyncio.gather(
+                asyncio.gather(*[helpers.trait_image(trait['name'], trait['style'], mappings["trait_icon_mapping"]) for trait in sorted_traits]),
+                helpers.fetch_image(companion_url),
+                helpers.fetch_units(participant.get('units', []), mappings),
+            )
+
+            tier = "UNRANKED"
+            rank = "I"
             try: 
                 rank_info = await helpers.get_rank_info(region, participant["puuid"], self.tft_token)
             except Exception as err:
-                return None, f"Error fetching rank info for {gameName}#{tagLine}: {err}"
-        
-            tier = "UNRANKED"
-            rank = "I"
+                print(f"Error fetching rank info for {participant.get('riotIdGameName', 'Unknown')}: {err}")
+                rank_info = None
+
             if rank_info:
                 for entry in rank_info:
                     if entry['queueType'] == 'RANKED_TFT':
                         tier = entry['tier']
                         rank = entry['rank']
 
-            rank_str = f"{dicts.rank_to_acronym[tier]}{dicts.rank_to_number[rank]}"
-
-            bbox = font.getbbox(rank_str)  # (x_min, y_min, x_max, y_max)
-            text_w = bbox[2] - bbox[0]
-            padding_x = 12
-            x, y = 100, 25
-            rect_coords = [
-                x, 
-                y, 
-                x + text_w + padding_x, 
-                80
-            ]
-            draw.rounded_rectangle(rect_coords, radius=8, fill=dicts.rank_to_text_fill[tier], outline=None)
-            draw.text((x + padding_x/2, y), rank_str, font=font, fill="#fdda82" if tier == "CHALLENGER" else "white")
-
-            # --- Champions Processing ---
-            units = participant.get('units', [])
-            champ_unit_data_unsorted = []
-
-            # Calculate total champion image width
-            champ_img_width = int(min((1180 - trait_final_width - companion_width) / len(units), 70)) if units else 70
-            champ_img_height = 150
-            champ_final_image = Image.new("RGBA", ((1200 - trait_final_width - companion_width), champ_img_height), background_color)
-
-            async def process_unit(unit):
-                champion_name = unit["character_id"]
-                tier = unit["tier"]
-                rarity = unit["rarity"]
-                item_names = unit["itemNames"]
-
-                custom_rarity = dicts.rarity_map.get(rarity, rarity)
-                champ_icon_path = helpers.get_champ_icon(mappings["champ_mapping"], champion_name).lower()
-                rarity_url = f"https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-tft-team-planner/global/default/images/cteamplanner_championbutton_tier{custom_rarity}.png"
-
-                if champ_icon_path:
-                    champion_url = f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{champ_icon_path}.png"
-                    champ_task = helpers.fetch_image(champion_url, (64, 64))
-                    rarity_task = helpers.fetch_image(rarity_url, (72, 72))
-                    
-                    icon_resized, rarity_resized = await asyncio.gather(champ_task, rarity_task)
-
-                    champ_unit_data_unsorted.append({
-                        "champion_name": champion_name,
-                        "icon_resized": icon_resized,
-                        "rarity_resized": rarity_resized,
-                        "rarity": rarity,
-                        "tier": tier,
-                        "item_names": item_names
-                    })
-
-            # Fetch all champion icons & rarity images concurrently
-            await asyncio.gather(*[process_unit(unit) for unit in units])
-            champ_unit_data = sorted(champ_unit_data_unsorted, key=lambda x: x['rarity'])
-
-            # --- Paste Champions & Items ---
-            async def paste_champion(unit, i): 
-                champ_image = await helpers.champion_image(unit, mappings["item_mapping"])
-                if champ_image:
-                    champ_image.thumbnail((champ_img_width, 150))
-                    champ_final_image.paste(champ_image, (((champ_img_width + 1)* i), 15), champ_image)
-
-            # Process and paste champions concurrently
-            await asyncio.gather(*[paste_champion(unit, i) for i, unit in enumerate(champ_unit_data)])
-                        
-            # --- Combine Images ---
-            final_combined_image = Image.new("RGBA", (1200, 150), (0, 0, 0, 0))
-            final_combined_image.paste(trait_final_image, (companion_width, 0), trait_final_image)
-            final_combined_image.paste(champ_final_image, (companion_width + trait_final_width, 0), champ_final_image)
-            final_combined_image.paste(companion_final_image, (0,0), companion_final_image)
-
-             # Get summoner's gameName and tagLine from the match_info
-            gameName = participant.get('riotIdGameName', 'Unknown')
-            tagLine = participant.get('riotIdTagline', 'Unknown')
-            level = participant.get('level','Unknown')
-            gold_left = participant.get('gold_left','Unknown')
-            stage, round = divmod(participant.get('last_round','Unknown') - 4 , 7)
-            players_eliminated = participant.get('players_eliminated','Unknown')
-            total_damage_to_players = participant.get('total_damage_to_players','Unknown')
-            text = f"<:tft_up_arrow:1347339737014341662> Level: {level}\n💰 Gold Remaining: {gold_left}\n:skull: Last round: {stage+2}-{round}\n:crossed_swords: Players Eliminated: {players_eliminated}\n:drop_of_blood: Damage Dealt: {total_damage_to_players}"
-            # Save & Return Image & Embed
-            final_combined_image.save("player_board.png")
-            file = discord.File("player_board.png", filename="player_board.png")
-            embed = discord.Embed(title=f"{gameName}#{tagLine} - Placement {index + 1}/{len(puuid_list)}", description=text)
-            embed.set_image(url="attachment://player_board.png")
-
-            return embed, file, final_combined_image
+            return {
+                "background_color": "#2F3136" if puuid == participant['puuid'] else (0,0,0,0),
+                "trait_images": trait_images,
+                "companion_image": companion_image,
+                "display_name": participant.get('riotIdGameName', 'Unknown'),
+                "tier": tier,
+                "rank": rank,
+                "units": units,
+                "unit_count": len(participant.get('units', [])),
+            }
 
         async def generate_multiple_boards(start, end):
-            # Step 1: Generate boards concurrently
-            board_tasks = [generate_board_strip(i) for i in range(start, end)]
-            board_results = await asyncio.gather(*board_tasks)  # [(embed, file, image), ...]
+            # Fetch every board's assets concurrently, then draw the stack in the render pool
+            specs = await asyncio.gather(*[fetch_board_strip(i) for i in range(start, end)])
+            return await helpers.run_render(helpers.render_board_strips, specs)
 
-            embeds, files, board_images = zip(*board_results)  # unpack into three tuples
-            combined_image = Image.new("RGBA", (1200, 600), (255, 255, 255, 0))
-
-            current_y = 0
-            for img in board_images:
-                combined_image.paste(img, (0, current_y), img)
-                current_y += img.height
-
-            return combined_image
         Select_options =[
             discord.SelectOption(label=f"All Boards", value=0),
         ] + [
@@ -346,14 +208,13 @@ class BotCommands(commands.Cog):
                 await interaction.response.defer()  # Avoid timeout
                 new_index = int(interaction.data['values'][0])
                 if new_index == 0:
-                    top4_img = await generate_multiple_boards(0, 4)
-                    bot4_img = await generate_multiple_boards(4, 8)
-
-                    top4_img.save("top4.png")
-                    bot4_img.save("bot4.png")
+                    top4_png, bot4_png = await asyncio.gather(
+                        generate_multiple_boards(0, 4),
+                        generate_multiple_boards(4, 8),
+                    )
 
-                    top4_file = discord.File("top4.png", filename="top4.png") 
-                    bot4_file = discord.File("bot4.png", filename="bot4.png")
+                    top4_file = discord.File(BytesIO(top4_png), filename="top4.png") 
+                    bot4_file = discord.File(BytesIO(bot4_png), filename="bot4.png")
 
                     top4_embed = discord.Embed(
                         title="All Boards",
@@ -369,7 +230,7 @@ class BotCommands(commands.Cog):
                     await ctx.send(embed= bot4_embed, file = bot4_file)
 
                 else:
-                    new_embed, new_file, _ = await helpers.generate_board_preview(new_index-1, puuid, region, mass_region, match_id, tft_token, mappings)
+                    new_embed, new_file = await helpers.generate_board_preview(new_index-1, puuid, region, mass_region, match_id, tft_token, mappings)
                     await interaction.followup.edit_message(
                         message_id=interaction.message.id,
                         embed=new_embed,
@@ -377,9 +238,8 @@ class BotCommands(commands.Cog):
                         view=PlayerSwitchView(new_index, self.author_id)
                     )
         # index, puuid, region, mass_region, match_id, tft_token, mappings
-        embed, file, _ = await helpers.generate_board_preview(current_index, puuid, region, mass_region, match_id, tft_token, mappings)
+        embed, file = await helpers.generate_board_preview(current_index, puuid, region, mass_region, match_id, tft_token, mappings)
         await ctx.send(embed=embed, file=file, view=PlayerSwitchView(current_index, ctx.author.id))
-        os.remove("player_board.png")
 
     # League recent command
     @commands.command(name="recentleague", aliases=["rl","lr","lrn","lrd","lra","lrf","lrc","lrac","lrq"])
@@ -424,8 +284,9 @@ class BotCommands(commands.Cog):
                 return f"Could not find PUUID for {gameName}#{tagLine}.", None, None
         
         background_color = (0,0,0,0)
-        if game_type == "Ranked Solo/Duo" and data:
-            await helpers.update_user_games(self.pool, user_id, self.tft_token, self.lol_token)
+        stored = game_type == "Ranked Solo/Duo" and data
+
+        async def stored_match_id():
             async with self.pool.acquire() as conn:
                 row = await conn.fetchrow('''
                     SELECT match_id
@@ -434,7 +295,15 @@ class BotCommands(commands.Cog):
                     ORDER BY game_datetime DESC
                     OFFSET $2;
                 ''', puuid, game_num)
-                match_id = row['match_id']
+                checked_at = await helpers.last_synced(conn, [puuid])
+            return (row['match_id'] if row else None), checked_at
+
+        if stored:
+            # Answer from stored games and sync in the background, only a first sync blocks
+            match_id, checked_at = await stored_match_id()
+            if not match_id:
+                await helpers.refresh_user_games(self.pool, user_id, self.tft_token, self.lol_token)
+                match_id, checked_at = await stored_match_id()
         else:
             error, match_ids, puuid = await helpers.find_match_ids(gameName, tagLine, game_type, "League", mass_region, self.lol_token)
             if error:
@@ -444,193 +313,121 @@ class BotCommands(commands.Cog):
         if not match_id:
             return f"No recent {game_type} matches found for {gameName}#{tagLine}.",  None, None, None, None, None, None, None, None
 
-        error, final_file, tab_embed, max_damage, max_taken, duration, blue_team, red_team, blue_win  = await helpers.league_last_match(gameName, tagLine, mass_region, self.lol_token, puuid, match_id, game_type, mappings, background_color, True)
-        async def process_participant(participant, duration, mappings):
-            items = []
-            gameName = participant["riotIdGameName"]
-            tagLine = participant["riotIdTagline"]
-            cs = participant["totalMinionsKilled"] + participant["neutralMinionsKilled"]
-            kills = participant["kills"]
-            deaths = participant["deaths"]
-            assists = participant["assists"]
-            items.append(participant["item0"]) 
-            items.append(participant["item1"]) 
-            items.append(participant["item2"]) 
-            items.append(participant["item3"]) 
-            items.append(participant["item4"]) 
-            items.append(participant["item5"]) 
-            items.append(participant["item6"]) 
-            killparticipation = participant.get("challenges", {}).get("killParticipation", 0)
-            damagedealt = participant["totalDamageDealtToChampions"]
-            damagetaken = participant["totalDamageTaken"]
-
-            bold_font = ImageFont.truetype("fonts/NotoSans-Black.ttf", 18)  
-
-            if participant["puuid"] == puuid:
-                strip = Image.new("RGBA", (600, 60), "#2F3136")
-            else:
-                strip = Image.new("RGBA", (600, 60), background_color)
-            draw = ImageDraw.Draw(strip)
-            if deaths == 0:
-                kda_ratio_str = "Perfect"
-            else:
-                kda_ratio = (kills + assists) / deaths
-                kda_ratio_str = f"{kda_ratio:.2f}:1 KDA"
-            cspm = cs * 60 / duration
-            kda_str = f"{kills}/{deaths}/{assists}"
-            cs_str = f" CS {cs} "
-            cspm_str = f"{cspm:.1f}/m"
-
-            if len(gameName) > 15:
-                gameName = gameName[:14] + "…"
-
-            champ_path = helpers.get_lol_champ_icon(participant["championId"])
-            keystone_path = helpers.get_keystone_icon(mappings["keystone_mapping"], participant["perks"]["styles"][0]["selections"][0]["perk"]).lower()
-            runes_path = helpers.get_rune_icon(mappings["runes_mapping"], participant["perks"]["styles"][1]["style"]).lower()
-            summ1_path = helpers.get_summs_icon(mappings["summs_mapping"], participant["summoner1Id"]).lower()
-            summ2_path = helpers.get_summs_icon(mappings["summs_mapping"], participant["summoner2Id"]).lower()
-            items = [participant[f"item{i}"] for i in range(7)]
-            items_urls = [f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{helpers.get_lol_item_icon(mappings['lol_item_mapping'], item).lower()}" for item in items]
-
-            # --- Fetch images concurrently ---
-            fetch_tasks = [
-                helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{champ_path}.png", (50,50)),
-                helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{keystone_path}", (25,25)),
-                helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{runes_path}", (16,16)),
-                helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{summ1_path}", (25,25)),
-                helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{summ2_path}", (25,25)),
-                helpers.fetch_image(f"https://wiki.leagueoflegends.com/en-us/images/thumb/Gold_colored_icon.png/20px-Gold_colored_icon.png?39991", (20,20)),
-            ]
-            # Add item icons
-            fetch_tasks.extend([helpers.fetch_image(url, (25,25)) for url in items_urls])
-
-            # Gather all images concurrently
-            images = await asyncio.gather(*fetch_tasks)
-            champ_image, keystone_image, runes_image, summ1_image, summ2_image, gold_image, *item_icons = images
-
-            try: 
-                rank_info = await helpers.get_lol_rank_info(region, participant["puuid"], self.lol_token)
-            except Exception as err:
-                return None, f"Error fetching rank info for {gameName}#{tagLine}: {err}"
-        
-            tier = "UNRANKED"
-            rank = "I"
-            if rank_info:
-                for entry in rank_info:
-                    if entry['queueType'] == 'RANKED_SOLO_5x5':
-                        tier = entry['tier']
-                        rank = entry['rank']
-            
-            strip.paste(champ_image, (15,5))
-            strip.paste(summ1_image, (65,5))
-            strip.paste(summ2_image, (65,30))
-            strip.paste(keystone_image, (90,5), keystone_image)
-            strip.paste(runes_image, (94,34), runes_image)
-            strip.paste(gold_image, (515,35), gold_image)
-            for i, item_icon in enumerate(item_icons):
-                strip.paste(item_icon, (410 + i*25, 5), item_icon)  # adjust position as needed
-            
-            percentMaxDamage = damagedealt / max_damage
-
-            damage_coords = [
-                410,
-                35,
-                410 + percentMaxDamage * 100,
-                55
-            ]
-
-            damageFill_coords = [
-                410 + percentMaxDamage * 100,
-                35,
-                510,
-                55
-
-            ]
-            bbox = bold_font.getbbox(kda_str)  # (x_min, y_min, x_max, y_max)
-            width1 = bbox[2] - bbox[0]         # text width
-
-            kda_color = "#8a8a8a"
-            if kda_ratio_str == "Perfect":
-                kda_color = "#f78324"
-            elif kda_ratio >= 5.00:
-                kda_color = "#f78324"
-            elif kda_ratio >= 4.00:
-                kda_color = "#188ae9"
-            elif kda_ratio >= 3.00:
-                kda_color = "#29b0a3"
-
-            rank_str = f"{dicts.rank_to_acronym[tier]}{dicts.rank_to_number[rank]}"
-            damage_str = f"{damagedealt/1000:.1f}k"
-            participant_gold_str = f"{participant["goldEarned"]/1000:.1f}k"
-
-            damage_font = ImageFont.truetype("fonts/NotoSans-Black.ttf", 16)  
-            bbox = bold_font.getbbox(rank_str)  # (x_min, y_min, x_max, y_max)
-            text_w = bbox[2] - bbox[0]
-
-            padding_x = 6
-
-            x, y = 115, 5
-
-            rect_coords = [
-                x, 
-                y, 
-                x + text_w + padding_x, 
-                30
-            ]
-            
-            draw.rectangle([409,34,511,56], fill="black", outline=None)
-            draw.rectangle(damage_coords, fill="#e94054", outline=None)
-            draw.rectangle(damageFill_coords, fill="#2a2736", outline=None)
-            draw.rectangle([45,35,65,55], fill="black", outline=None)
-            draw.text((412,35), damage_str, font = damage_font, fill = "white")
-            draw.rounded_rectangle(rect_coords, radius=8, fill=dicts.rank_to_text_fill[tier], outline=None)
-            draw.text((118, 5), rank_str, font=bold_font, fill="#fdda82" if tier == "CHALLENGER" else "white")
-            draw.text((130 + text_w,5), f"{gameName}", font=bold_font, fill="white")
-            draw.text((115,30), kda_str, font=bold_font, fill="white")
-            draw.text((125 + width1, 30), kda_ratio_str, font=bold_font, fill=kda_color)
-            draw.text((535,35),participant_gold_str, font=damage_font, fill="white")
-
-            helpers.draw_centered(draw, cs_str, damage_font, 360, y=10, fill="white")
-            helpers.draw_centered(draw, cspm_str, damage_font, 360, y=30, fill="white")
-            helpers.draw_centered(draw, str(participant["champLevel"]), damage_font, 55, y=35, fill="white")
-
-            return strip
-
-        async def build_team_image(team_participants, duration, mappings):
-            # Run process_participant for each player concurrently
-            strips = await asyncio.gather(*(process_participant(p, duration, mappings) for p in team_participants))
-
-            # Each strip is 600x60 → total height = 300
-            team_img = Image.new("RGBA", (600, 300), background_color)
-
-            for i, strip in enumerate(strips):
-                team_img.paste(strip, (0, i * 60)) 
-
-            return team_img
+        # Build the match tab and both team breakdowns for one match
+        async def render(match_id, checked_at=None):
+            error, final_file, tab_embed, max_damage, max_taken, duration, blue_team, red_team, blue_win  = await helpers.league_last_match(gameName, tagLine, mass_region, self.lol_token, puuid, match_id, game_type, mappings, background_color, True)
+            if error:
+                return error, None, None
+            if stored:
+                tab_embed.set_footer(text=helpers.synced_note(checked_at))
+            async def fetch_participant(participant, duration, mappings):
+                gameName = participant["riotIdGameName"]
+                tagLine = participant["riotIdTagline"]
+
+                champ_path = helpers.get_lol_champ_icon(participant["championId"])
+                keystone_path = helpers.get_keystone_icon(mappings["keystone_mapping"], participant["perks"]["styles"][0]["selections"][0]["perk"]).lower()
+                runes_path = helpers.get_rune_icon(mappings["runes_mapping"], participant["perks"]["styles"][1]["style"]).lower()
+                summ1_path = helpers.get_summs_icon(mappings["summs_mapping"], participant["summoner1Id"]).lower()
+                summ2_path = helpers.get_summs_icon(mappings["summs_mapping"], participant["summoner2Id"]).lower()
+                items = [participant[f"item{i}"] for i in range(7)]
+                items_urls = [f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{helpers.get_lol_item_icon(mappings['lol_item_mapping'], item).lower()}" for item in items]
+
+                # --- Fetch images concurrently ---
+                fetch_tasks = [
+                    helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{champ_path}.png", (50,50)),
+                    helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{keystone_path}", (25,25)),
+                    helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{runes_path}", (16,16)),
+                    helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{summ1_path}", (25,25)),
+                    helpers.fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{summ2_path}", (25,25)),
+                    helpers.fetch_image(f"https://wiki.leagueoflegends.com/en-us/images/thumb/Gold_colored_icon.png/20px-Gold_colored_icon.png?39991", (20,20)),
+                ]
+                # Add item icons
+                fetch_tasks.extend([helpers.fetch_image(url, (25,25)) for url in items_urls])
+
+                # Gather all images concurrently
+                images = await asyncio.gather(*fetch_tasks)
+                champ_image, keystone_image, runes_image, summ1_image, summ2_image, gold_image, *item_icons = images
+
+                tier = "UNRANKED"
+                rank = "I"
+                try: 
+                    rank_info = await helpers.get_lol_rank_info(region, participant["puuid"], self.lol_token)
+                except Exception as err:
+                    print(f"Error fetching rank info for {gameName}#{tagLine}: {err}")
+                    rank_info = None
+
+                if rank_info:
+                    for entry in rank_info:
+                        if entry['queueType'] == 'RANKED_SOLO_5x5':
+                            tier = entry['tier']
+                            rank = entry['rank']
+
+                return {
+                    "background_color": "#2F3136" if participant["puuid"] == puuid else background_color,
+                    "gameName": gameName,
+                    "kills": participant["kills"],
+                    "deaths": participant["deaths"],
+                    "assists": participant["assists"],
+                    "cs": participant["totalMinionsKilled"] + participant["neutralMinionsKilled"],
+                    "gold": participant["goldEarned"],
+                    "level": participant["champLevel"],
+                    "damagedealt": participant["totalDamageDealtToChampions"],
+                    "max_damage": max_damage,
+                    "duration": duration,
+                    "tier": tier,
+                    "rank": rank,
+                    "champ_image": champ_image,
+                    "keystone_image": keystone_image,
+                    "runes_image": runes_image,
+                    "summ1_image": summ1_image,
+                    "summ2_image": summ2_image,
+                    "gold_image": gold_image,
+                    "item_icons": item_icons,
+                }
+
+            async def build_team_image(team_participants, duration, mappings):
+                # Fetch each player's icons and rank concurrently, then draw the team in the render pool
+                specs = await asyncio.gather(*(fetch_participant(p, duration, mappings) for p in team_participants))
+                return await helpers.run_render(helpers.render_league_team, specs, background_color)
         
-        blue_img = await build_team_image(blue_team, duration, mappings)
-        red_img = await build_team_image(red_team, duration, mappings)
+            blue_png, red_png = await asyncio.gather(
+                build_team_image(blue_team, duration, mappings),
+                build_team_image(red_team, duration, mappings),
+            )
 
-        # Now these are PIL Images → you can save them
-        blue_img.save("blue_team.png")
-        red_img.save("red_team.png")
+            blue_file = discord.File(BytesIO(blue_png), filename="blue_team.png")
+            red_file = discord.File(BytesIO(red_png), filename="red_team.png")
 
-        blue_file = discord.File("blue_team.png", filename="blue_team.png")
-        red_file = discord.File("red_team.png", filename="red_team.png")
+            blue_embed = discord.Embed(
+                # title="Victory (Blue team)" if blue_win else "Defeat (Blue team)",
+                color=discord.Color.blue() if blue_win else discord.Color.red()
+            )
+            blue_embed.set_image(url="attachment://blue_team.png")
 
-        blue_embed = discord.Embed(
-            # title="Victory (Blue team)" if blue_win else "Defeat (Blue team)",
-            color=discord.Color.blue() if blue_win else discord.Color.red()
-        )
-        blue_embed.set_image(url="attachment://blue_team.png")
+            red_embed = discord.Embed(
+                # title="Defeat (Red team)" if blue_win else "Victory (Red team)",
+                color=discord.Color.red() if blue_win else discord.Color.blue()
+                )
+            red_embed.set_image(url="attachment://red_team.png")
 
-        red_embed = discord.Embed(
-            # title="Defeat (Red team)" if blue_win else "Victory (Red team)",
-            color=discord.Color.red() if blue_win else discord.Color.blue()
-            )
-        red_embed.set_image(url="attachment://red_team.png")
+            return None, [final_file, blue_file, red_file], [tab_embed, blue_embed, red_embed]
+
+        error, files, embeds = await render(match_id, checked_at if stored else None)
+        if error:
+            await ctx.send(error)
+            return
+        message = await ctx.send(files=files, embeds=embeds)
 
-        await ctx.send(files=[final_file,blue_file,red_file], embeds=[tab_embed, blue_embed, red_embed])
+        async def revalidate():
+            if await helpers.refresh_user_games(self.pool, user_id, self.tft_token, self.lol_token):
+                new_match_id, new_checked_at = await stored_match_id()
+                if new_match_id and new_match_id != match_id:
+                    new_error, new_files, new_embeds = await render(new_match_id, new_checked_at)
+                    if not new_error:
+                        await message.edit(attachments=new_files, embeds=new_embeds)
+
+        if stored:
+            helpers.run_in_background(revalidate())
 
     @commands.command(name="todayleague", aliases=["tl","lt"])
     async def today_league(self, ctx, *args):
@@ -655,96 +452,89 @@ class BotCommands(commands.Cog):
         else:
             return await ctx.send("Must be a linked user to use this command.")
 
-        await helpers.update_user_games(self.pool, user_id, self.tft_token, self.lol_token)
+        today = helpers.rollup_day()
 
-        eastern = pytz.timezone("America/New_York")
-        now = datetime.now(eastern)
-        today_6am = now.replace(hour=6, minute=0, second=0, microsecond=0)
+        # Answer from what is already stored, then sync in the background and edit if games came in
+        async def build_embed():
+            async with self.pool.acquire() as conn:
 
-        if now < today_6am:
-            today_6am -= timedelta(days=1)
+                user_row = await conn.fetchrow('''
+                    SELECT league_puuid, region
+                    FROM users
+                    WHERE discord_id = $1;
+                ''', user_id)
 
-        cutoff = int(today_6am.timestamp())
+                if not user_row:
+                    return "❌ Could not find a linked account.", None, None
 
-        async with self.pool.acquire() as conn:
+                # 🔹 Today's record from the daily rollup
+                day = await helpers.rollup_window(conn, user_row['league_puuid'], "League", today)
+                wins = day['wins']
 
-            user_row = await conn.fetchrow('''
-                SELECT league_puuid, region
-                FROM users
-                WHERE discord_id = $1;
-            ''', user_id)
-
-            if not user_row:
-                await ctx.send("❌ Could not find a linked account.")
-                return
-
-            # 🔹 Fetch today's league games
-            rows = await conn.fetch('''
-                SELECT *
-                FROM league_games
-                WHERE league_puuid = $1
-                AND game_datetime >= $2
-                ORDER BY game_datetime DESC;
-            ''', user_row['league_puuid'], cutoff * 1000)
-
-            matches = [row['match_id'] for row in rows]
-            wins = sum(row['win_loss'] for row in rows)
-
-            first_snapshot = await conn.fetchrow('''
-                SELECT elo, game_datetime
-                FROM league_games
-                WHERE league_puuid = $1
-                AND game_datetime < $2
-                ORDER BY game_datetime DESC
-                LIMIT 1;
-            ''', user_row['league_puuid'], cutoff * 1000)
-
-            if rows:
-                latest_snapshot = rows[0]
-            else:
-                latest_snapshot = first_snapshot
+                # Only the newest five are rendered below
+                matches = [row['match_id'] for row in await conn.fetch('''
+                    SELECT match_id
+                    FROM league_games
+                    WHERE league_puuid = $1
+                    AND game_datetime >= $2
+                    ORDER BY game_datetime DESC
+                    LIMIT 5;
+                ''', user_row['league_puuid'], int(helpers.rollup_day_start(today).timestamp() * 1000))]
 
-            if not first_snapshot or not latest_snapshot:
-                await ctx.send("No snapshot data found.")
-                return
+                if day['open_elo'] is None or day['close_elo'] is None:
+                    return "No snapshot data found.", None, None
 
-            league_diff = latest_snapshot['elo'] - first_snapshot['elo']
+                checked_at = await helpers.last_synced(conn, [user_row['league_puuid']])
 
-            old_rank, old_tier, old_lp = helpers.lp_to_div(first_snapshot['elo'])
-            new_rank, new_tier, new_lp = helpers.lp_to_div(latest_snapshot['elo'])
+                league_diff = day['close_elo'] - day['open_elo']
 
-        # 🔹 formatting
-        if league_diff < 0:
-            lp_diff_emoji = "📉"
-            diff_str = str(league_diff)
-        else:
-            lp_diff_emoji = "📈"
-            diff_str = f"+{league_diff}"
+                old_rank, old_tier, old_lp = helpers.lp_to_div(day['open_elo'])
+                new_rank, new_tier, new_lp = helpers.lp_to_div(day['close_elo'])
+
+            # 🔹 formatting
+            if league_diff < 0:
+                lp_diff_emoji = "📉"
+                diff_str = str(league_diff)
+            else:
+                lp_diff_emoji = "📈"
+                diff_str = f"+{league_diff}"
 
-        url = await helpers.get_pfp(user_row['region'], user_row['league_puuid'], self.lol_token)
+            url = await helpers.get_pfp(user_row['region'], user_row['league_puuid'], self.lol_token)
 
-        text = (
-            f"{dicts.tier_to_rank_icon.get(old_rank, '')} {old_rank} {old_tier} {old_lp} LP "
-            f"→ {dicts.tier_to_rank_icon.get(new_rank, '')} {new_rank} {new_tier} {new_lp} LP\n"
-            f"{lp_diff_emoji} **LP Difference:** {diff_str}\n"
-            f"🏆 **Record:** {wins} - {len(matches) - wins}"
-        )
+            text = (
+                f"{dicts.tier_to_rank_icon.get(old_rank, '')} {old_rank} {old_tier} {old_lp} LP "
+                f"→ {dicts.tier_to_rank_icon.get(new_rank, '')} {new_rank} {new_tier} {new_lp} LP\n"
+                f"{lp_diff_emoji} **LP Difference:** {diff_str}\n"
+                f"🏆 **Record:** {wins} - {day['losses']}"
+            )
 
-        embed = discord.Embed(
-            description=text,
-            color=discord.Color.blue()
-        )
+            embed = discord.Embed(
+                description=text,
+                color=discord.Color.blue()
+            )
 
-        embed.set_author(
-            name=f"Today: {gameName}#{tagLine}",
-            url=f"https://op.gg/lol/summoners/{region[:-1]}/{gameName.replace(' ', '%20')}-{tagLine}",
-            icon_url="https://static.wikia.nocookie.net/leagueoflegends/images/9/9a/League_of_Legends_Update_Logo_Concept_05.jpg/revision/latest/scale-to-width-down/250"
-        )
+            embed.set_author(
+                name=f"Today: {gameName}#{tagLine}",
+                url=f"https://op.gg/lol/summoners/{region[:-1]}/{gameName.replace(' ', '%20')}-{tagLine}",
+                icon_url="https://static.wikia.nocookie.net/leagueoflegends/images/9/9a/League_of_Legends_Update_Logo_Concept_05.jpg/revision/latest/scale-to-width-down/250"
+            )
 
-        embed.set_thumbnail(url=url)
-        embed.set_footer(text="Last five matches below")
+            embed.set_thumbnail(url=url)
+            embed.set_footer(text=f"Last five matches below\n{helpers.synced_note(checked_at)}")
+            return None, embed, matches
 
-        await ctx.send(embed=embed)
+        error, embed, matches = await build_embed()
+        message = await ctx.send(content=error, embed=embed)
+
+        async def revalidate():
+            if await helpers.refresh_user_games(self.pool, user_id, self.tft_token, self.lol_token):
+                new_error, new_embed, _ = await build_embed()
+                if not new_error:
+                    await message.edit(content=None, embed=new_embed)
+
+        helpers.run_in_background(revalidate())
+        if error:
+            return
 
         # 🔹 Match detail rendering
         results = []
@@ -785,94 +575,43 @@ class BotCommands(commands.Cog):
 
     @commands.command(name="summary", aliases=["sum","sumw"])
     async def summary(self, ctx, *args):
-        eastern = pytz.timezone("America/New_York")
-        now = datetime.now(eastern)
-        today_6am = now.replace(hour=6, minute=0, second=0, microsecond=0)
-        if now < today_6am:
-            today_6am -= timedelta(days=1)
+        from_day = helpers.rollup_day()
         if ctx.invoked_with == "sumw":
-            today_6am -= timedelta(days=7)
+            from_day -= timedelta(days=7)
 
-        cutoff = int(today_6am.timestamp())
-
-        guild = ctx.guild
-        members = [member.id async for member in guild.fetch_members(limit=None)]
-        
-        entries = []
+        await helpers.ensure_guild_index(self.pool, ctx.guild)
 
         async with self.pool.acquire() as conn:
 
             user_rows = await conn.fetch('''
-                SELECT *
-                FROM users
-                WHERE discord_id = ANY($1)
-            ''', members)
+                SELECT u.*
+                FROM users u
+                JOIN guild_members g ON g.discord_id = u.discord_id
+                WHERE g.guild_id = $1
+            ''', ctx.guild.id)
             
             connected_ids = [row["discord_id"] for row in user_rows]
 
-            async with TaskGroup(asyncio.Semaphore(10)) as tg:
-                for member in connected_ids:
-                    await tg.create_task(
-                        helpers.update_user_games(
-                            self.pool, member, self.tft_token, self.lol_token
-                        )
-                    )
-
-            print("Finished updating server games.")
-
-            for row in user_rows:
-                print(row['game_name'], row['tag_line'])
-            for user_row in user_rows:
-                print(f"Processing {user_row['game_name']}#{user_row['tag_line']}")
-
-                print("  -> fetching rows")
-
-                rows = await conn.fetch('''
-                    SELECT placement, elo, game_datetime
-                    FROM tft_games
-                    WHERE tft_puuid = $1
-                    AND game_datetime >= $2
-                    ORDER BY game_datetime DESC;
-                ''', user_row['tft_puuid'], cutoff * 1000)
-
-                print("  -> rows fetched")
-
-                print("  -> fetching first snapshot")
-
-                print([row['placement'] for row in rows])
-                placements = [row['placement'] for row in rows]
-
-                first_snapshot = await conn.fetchrow('''
-                    SELECT elo, game_datetime
-                    FROM tft_games
-                    WHERE tft_puuid = $1
-                    AND game_datetime < $2
-                    ORDER BY game_datetime DESC
-                    LIMIT 1;
-                ''', user_row['tft_puuid'], cutoff * 1000)
+        # Answer from stored games, then sync every member in the background and edit if games came in
+        async def build_embed():
+            entries = []
+            async with self.pool.acquire() as conn:
+                # Games, placements and elo at both ends of the period for every member in one query
+                summary_rows = await helpers.period_summary(conn, "TFT", connected_ids, from_day)
+                checked_at = await helpers.last_synced(conn, [row['tft_puuid'] for row in user_rows])
 
-                print("  -> first snapshot fetched")
-                # 🔹 Snapshot logic using tft_games
-                if not rows and not first_snapshot:
-                    print(f"No data at all for {user_row['game_name']}")
+            for row in summary_rows:
+                if row['first_elo'] is None or row['last_elo'] is None:
                     continue
-                
-                if not rows:
-                    print(f"No games since cutoff for {user_row['game_name']}")
-                    continue 
-
-                latest_snapshot = rows[0] if rows else first_snapshot
-
-                print(f"[SUMMARY] user={user_row['game_name']} rows={len(rows)} first_snapshot={first_snapshot is not None}")
 
                 # 🔹 Compute LP diff
-                tft_diff = latest_snapshot['elo'] - first_snapshot['elo']
+                tft_diff = row['last_elo'] - row['first_elo']
 
-                old_rank, old_tier, old_lp = helpers.lp_to_div(first_snapshot['elo'])
-                new_rank, new_tier, new_lp = helpers.lp_to_div(latest_snapshot['elo'])
+                old_rank, old_tier, old_lp = helpers.lp_to_div(row['first_elo'])
+                new_rank, new_tier, new_lp = helpers.lp_to_div(row['last_elo'])
 
                 entries.append({
-                    "name": f"{user_row['game_name']}#{user_row['tag_line']}",
+                    "name": f"{row['game_name']}#{row['tag_line']}",
                     "old_rank": old_rank,
                     "old_tier": old_tier,
                     "old_lp": old_lp,
@@ -880,159 +619,127 @@ class BotCommands(commands.Cog):
                     "new_tier": new_tier,
                     "new_lp": new_lp,
                     "tft_diff": tft_diff,
-                    "matches": len(placements),
-                    "avp": round(sum(placements) / len(placements), 1) if placements else 0
+                    "matches": row['games'],
+                    "avp": round(row['placement_sum'] / row['games'], 1)
                 })
 
-        print("entries collected")
+            print("entries collected")
 
-        if not entries:
-            await ctx.send("No TFT games found for this period.")
-            return
+            if not entries:
+                return "No TFT games found for this period.", None
+
+            # 🔹 Sort by LP gain
+            entries.sort(key=lambda e: e["tft_diff"], reverse=True)
 
-        # 🔹 Sort by LP gain
-        entries.sort(key=lambda e: e["tft_diff"], reverse=True)
+            # 🔹 Align LP formatting
+            max_old_lp_width = max(len(str(e["old_lp"])) for e in entries)
+            max_new_lp_width = max(len(str(e["new_lp"])) for e in entries)
+            lp_width = max(max_old_lp_width, max_new_lp_width)
+
+            for e in entries:
+                old_lp_str = f"{e['old_lp']:>{lp_width}}"
+                new_lp_str = f"{e['new_lp']:>{lp_width}}"
+
+                e["rank_str"] = (
+                    f"{dicts.rank_to_acronym[e['old_rank']]}{dicts.rank_to_number[e['old_tier']]} {old_lp_str} LP"
+                    f" -> "
+                    f"{dicts.rank_to_acronym[e['new_rank']]}{dicts.rank_to_number[e['new_tier']]} {new_lp_str} LP"
+                )
 
-        # 🔹 Align LP formatting
-        max_old_lp_width = max(len(str(e["old_lp"])) for e in entries)
-        max_new_lp_width = max(len(str(e["new_lp"])) for e in entries)
-        lp_width = max(max_old_lp_width, max_new_lp_width)
+            print("rank strings prepared")
 
-        for e in entries:
-            old_lp_str = f"{e['old_lp']:>{lp_width}}"
-            new_lp_str = f"{e['new_lp']:>{lp_width}}"
+            total_lp = sum(e["tft_diff"] for e in entries)
 
-            e["rank_str"] = (
-                f"{dicts.rank_to_acronym[e['old_rank']]}{dicts.rank_to_number[e['old_tier']]} {old_lp_str} LP"
-                f" -> "
-                f"{dicts.rank_to_acronym[e['new_rank']]}{dicts.rank_to_number[e['new_tier']]} {new_lp_str} LP"
+            name_w   = max(len(e["name"]) for e in entries)
+            rank_w   = max(len(e["rank_str"]) for e in entries)
+            lp_w     = max(len(f"{e['tft_diff']:+}") for e in entries)
+            matches_w = max(len(str(e["matches"])) for e in entries)
+
+            lines = []
+            lines.append(
+                f"{'Name':<{name_w}}  {'Rank Change':<{rank_w}}  {'LP Δ':>{lp_w}}  {'Games':>{matches_w}}"
             )
+            lines.append("-" * (name_w + rank_w + lp_w + matches_w + 6))
 
-        print("rank strings prepared")
+            print("header prepared")
 
-        total_lp = sum(e["tft_diff"] for e in entries)
+            for e in entries:
+                lp_diff_str = f"{e['tft_diff']:+}"
+                matches_str = str(e["matches"])
 
-        name_w   = max(len(e["name"]) for e in entries)
-        rank_w   = max(len(e["rank_str"]) for e in entries)
-        lp_w     = max(len(f"{e['tft_diff']:+}") for e in entries)
-        matches_w = max(len(str(e["matches"])) for e in entries)
+                line = (
+                    f"{e['name']:<{name_w}}  "
+                    f"{e['rank_str']:<{rank_w}}  "
+                    f"{lp_diff_str:>{lp_w}}  "
+                    f"{matches_str:>{matches_w}}"
+                )
+                lines.append(line)
 
-        lines = []
-        lines.append(
-            f"{'Name':<{name_w}}  {'Rank Change':<{rank_w}}  {'LP Δ':>{lp_w}}  {'Games':>{matches_w}}"
-        )
-        lines.append("-" * (name_w + rank_w + lp_w + matches_w + 6))
+            title = f"**Total Server LP Change:** {'+' if total_lp >= 0 else ''}{total_lp}"
 
-        print("header prepared")
+            description = "```text\n" + "\n".join(lines) + "\n```"
 
-        for e in entries:
-            lp_diff_str = f"{e['tft_diff']:+}"
-            matches_str = str(e["matches"])
+            print("lines prepared")
 
-            line = (
-                f"{e['name']:<{name_w}}  "
-                f"{e['rank_str']:<{rank_w}}  "
-                f"{lp_diff_str:>{lp_w}}  "
-                f"{matches_str:>{matches_w}}"
+            embed = discord.Embed(
+                title=title,
+                description=description,
+                color=discord.Color.blue()
             )
-            lines.append(line)
 
-        title = f"**Total Server LP Change:** {'+' if total_lp >= 0 else ''}{total_lp}"
+            embed.set_footer(text=helpers.synced_note(checked_at))
+            return None, embed
 
-        description = "```text\n" + "\n".join(lines) + "\n```"
+        error, embed = await build_embed()
+        message = await ctx.send(content=error, embed=embed)
 
-        print("lines prepared")
+        async def revalidate():
+            if await helpers.refresh_users_games(self.pool, connected_ids, self.tft_token, self.lol_token):
+                new_error, new_embed = await build_embed()
+                if not new_error:
+                    await message.edit(content=None, embed=new_embed)
 
-        embed = discord.Embed(
-            title=title,
-            description=description,
-            color=discord.Color.blue()
-        )
-
-        await ctx.send(embed=embed)
+        helpers.run_in_background(revalidate())
         
     @commands.command(name="leaguesummary", aliases=["lsum","lsumw"])
     async def league_summary(self, ctx, *args):
-        eastern = pytz.timezone("America/New_York")
-        now = datetime.now(eastern)
-        today_6am = now.replace(hour=6, minute=0, second=0, microsecond=0)
-
-        if now < today_6am:
-            today_6am -= timedelta(days=1)
+        from_day = helpers.rollup_day()
         if ctx.invoked_with == "lsumw":
-            today_6am -= timedelta(days=7)
+            from_day -= timedelta(days=7)
 
-        cutoff = int(today_6am.timestamp())
-
-        guild = ctx.guild
-        members = [member.id async for member in guild.fetch_members(limit=None)]
-
-        entries = []
+        await helpers.ensure_guild_index(self.pool, ctx.guild)
 
         async with self.pool.acquire() as conn:
 
             user_rows = await conn.fetch('''
-                SELECT *
-                FROM users
-                WHERE discord_id = ANY($1)
-            ''', members)
+                SELECT u.*
+                FROM users u
+                JOIN guild_members g ON g.discord_id = u.discord_id
+                WHERE g.guild_id = $1
+            ''', ctx.guild.id)
 
             connected_ids = [row["discord_id"] for row in user_rows]
 
-            async with TaskGroup(asyncio.Semaphore(10)) as tg:
-                for member in connected_ids:
-                    await tg.create_task(
-                        helpers.update_user_games(
-                            self.pool, member, self.tft_token, self.lol_token
-                        )
-                    )
-
-            print("Finished updating server games.")
-
-            for user_row in user_rows:
-
-                # 🔹 Fetch league games in range
-                rows = await conn.fetch('''
-                    SELECT win_loss, elo, game_datetime
-                    FROM league_games
-                    WHERE league_puuid = $1
-                    AND game_datetime >= $2
-                    ORDER BY game_datetime DESC;
-                ''', user_row['league_puuid'], cutoff * 1000)
-
-                matches = [row['win_loss'] for row in rows]
-
-                if not rows:
-                    continue
-
-                wins = sum(matches)
-                
-                first_snapshot = await conn.fetchrow('''
-                    SELECT elo, game_datetime
-                    FROM league_games
-                    WHERE league_puuid = $1
-                    AND game_datetime < $2
-                    ORDER BY game_datetime DESC
-                    LIMIT 1;
-                ''', user_row['league_puuid'], cutoff * 1000)
-
-                # 🔹 Snapshot logic from league_games
-                if rows:
-                    latest_snapshot = rows[0]
-                else:
-                    latest_snapshot = first_snapshot
+        # Answer from stored games, then sync every member in the background and edit if games came in
+        async def build_embed():
+            entries = []
+            async with self.pool.acquire() as conn:
+                # Record and elo at both ends of the period for every member in one query
+                summary_rows = await helpers.period_summary(conn, "League", connected_ids, from_day)
+                checked_at = await helpers.last_synced(conn, [row['league_puuid'] for row in user_rows])
 
-                if not first_snapshot or not latest_snapshot:
+            for row in summary_rows:
+                if row['first_elo'] is None or row['last_elo'] is None:
                     continue
 
                 # 🔹 LP diff
-                league_diff = latest_snapshot['elo'] - first_snapshot['elo']
+                league_diff = row['last_elo'] - row['first_elo']
 
-                old_rank, old_tier, old_lp = helpers.lp_to_div(first_snapshot['elo'])
-                new_rank, new_tier, new_lp = helpers.lp_to_div(latest_snapshot['elo'])
+                old_rank, old_tier, old_lp = helpers.lp_to_div(row['first_elo'])
+                new_rank, new_tier, new_lp = helpers.lp_to_div(row['last_elo'])
 
                 entries.append({
-                    "name": f"{user_row['game_name']}#{user_row['tag_line']}",
+                    "name": f"{row['game_name']}#{row['tag_line']}",
                     "old_rank": old_rank,
                     "old_tier": old_tier,
                     "old_lp": old_lp,
@@ -1040,65 +747,76 @@ class BotCommands(commands.Cog):
                     "new_tier": new_tier,
                     "new_lp": new_lp,
                     "league_diff": league_diff,
-                    "wins": wins,
-                    "losses": len(matches) - wins,
+                    "wins": row['wins'],
+                    "losses": row['games'] - row['wins'],
                 })
 
-        # 🔹 Sort
-        entries.sort(key=lambda e: e["league_diff"], reverse=True)
+            # 🔹 Sort
+            entries.sort(key=lambda e: e["league_diff"], reverse=True)
 
-        if not entries:
-            await ctx.send("No League games found for this period.")
-            return
+            if not entries:
+                return "No League games found for this period.", None
 
-        # 🔹 Formatting
-        max_old_lp_width = max(len(str(e["old_lp"])) for e in entries)
-        max_new_lp_width = max(len(str(e["new_lp"])) for e in entries)
-        lp_width = max(max_old_lp_width, max_new_lp_width)
+            # 🔹 Formatting
+            max_old_lp_width = max(len(str(e["old_lp"])) for e in entries)
+            max_new_lp_width = max(len(str(e["new_lp"])) for e in entries)
+            lp_width = max(max_old_lp_width, max_new_lp_width)
 
-        for e in entries:
-            old_lp_str = f"{e['old_lp']:>{lp_width}}"
-            new_lp_str = f"{e['new_lp']:>{lp_width}}"
+            for e in entries:
+                old_lp_str = f"{e['old_lp']:>{lp_width}}"
+                new_lp_str = f"{e['new_lp']:>{lp_width}}"
 
-            e["rank_str"] = (
-                f"{dicts.rank_to_acronym[e['old_rank']]}{dicts.rank_to_number[e['old_tier']]} {old_lp_str} LP"
-                f" -> "
-                f"{dicts.rank_to_acronym[e['new_rank']]}{dicts.rank_to_number[e['new_tier']]} {new_lp_str} LP"
-            )
+                e["rank_str"] = (
+                    f"{dicts.rank_to_acronym[e['old_rank']]}{dicts.rank_to_number[e['old_tier']]} {old_lp_str} LP"
+                    f" -> "
+                    f"{dicts.rank_to_acronym[e['new_rank']]}{dicts.rank_to_number[e['new_tier']]} {new_lp_str} LP"
+                )
 
-        total_lp = sum(e["league_diff"] for e in entries)
+            total_lp = sum(e["league_diff"] for e in entries)
 
-        name_w = max(len(e["name"]) for e in entries)
-        rank_w = max(len(e["rank_str"]) for e in entries)
-        lp_w = max(len(f"{e['league_diff']:+}") for e in entries)
-        record_w = max(len(f"{e['wins']}-{e['losses']}") for e in entries)
+            name_w = max(len(e["name"]) for e in entries)
+            rank_w = max(len(e["rank_str"]) for e in entries)
+            lp_w = max(len(f"{e['league_diff']:+}") for e in entries)
+            record_w = max(len(f"{e['wins']}-{e['losses']}") for e in entries)
 
-        lines = []
-        lines.append(
-            f"{'Name':<{name_w}}  {'Rank Change':<{rank_w}}  {'LP Δ':>{lp_w}}  {'W-L':>{record_w}}"
-        )
-        lines.append("-" * (name_w + rank_w + lp_w + record_w + 6))
+            lines = []
+            lines.append(
+                f"{'Name':<{name_w}}  {'Rank Change':<{rank_w}}  {'LP Δ':>{lp_w}}  {'W-L':>{record_w}}"
+            )
+            lines.append("-" * (name_w + rank_w + lp_w + record_w + 6))
 
-        for e in entries:
-            lp_diff_str = f"{e['league_diff']:+}"
-            record_str = f"{e['wins']}-{e['losses']}"
+            for e in entries:
+                lp_diff_str = f"{e['league_diff']:+}"
+                record_str = f"{e['wins']}-{e['losses']}"
 
-            lines.append(
-                f"{e['name']:<{name_w}}  "
-                f"{e['rank_str']:<{rank_w}}  "
-                f"{lp_diff_str:>{lp_w}}  "
-                f"{record_str:>{record_w}}"
+                lines.append(
+                    f"{e['name']:<{name_w}}  "
+                    f"{e['rank_str']:<{rank_w}}  "
+                    f"{lp_diff_str:>{lp_w}}  "
+                    f"{record_str:>{record_w}}"
+                )
+
+            title = f"**Total Server LP Change:** {'+' if total_lp >= 0 else ''}{total_lp}"
+
+            embed = discord.Embed(
+                title=title,
+                description="```text\n" + "\n".join(lines) + "\n```",
+                color=discord.Color.blue()
             )
 
-        title = f"**Total Server LP Change:** {'+' if total_lp >= 0 else ''}{total_lp}"
+            embed.set_footer(text=helpers.synced_note(checked_at))
+            return None, embed
 
-        embed = discord.Embed(
-            title=title,
-            description="```text\n" + "\n".join(lines) + "\n```",
-            color=discord.Color.blue()
-        )
+        error, embed = await build_embed()
+        message = await ctx.send(content=error, embed=embed)
 
-        await ctx.send(embed=embed)
+        async def revalidate():
+            if await helpers.refresh_users_games(self.pool, connected_ids, self.tft_token, self.lol_token):
+                new_error, new_embed = await build_embed()
+                if not new_error:
+                    await message.edit(content=None, embed=new_embed)
+
+        helpers.run_in_background(revalidate())
     # Redirect user to /link
     @commands.command()
     async def link(self, ctx):
@@ -1114,8 +832,11 @@ class BotCommands(commands.Cog):
         region = region.lower()
         mass_region = dicts.region_to_mass[region]
 
-        tft_puuid = await helpers.get_puuid(name, tag, mass_region, self.tft_token)
-        lol_puuid = await helpers.get_puuid(name, tag, mass_region, self.lol_token)
+        # Each API key sees its own puuid, so both lookups are needed but can run together
+        tft_puuid, lol_puuid = await asyncio.gather(
+            helpers.get_puuid(name, tag, mass_region, self.tft_token),
+            helpers.get_puuid(name, tag, mass_region, self.lol_token)
+        )
         if not tft_puuid or not lol_puuid:
             await interaction.response.send_message(
                 f"Could not find {name}#{tag} in region {region}. "
@@ -1145,12 +866,14 @@ class BotCommands(commands.Cog):
                             'DELETE FROM tft_games WHERE tft_puuid = $1',
                             old_tft_puuid
                         )
+                        await helpers.forget_player(conn, old_tft_puuid, "TFT")
 
                     if old_lol_puuid and old_lol_puuid != lol_puuid:
                         await conn.execute(
                             'DELETE FROM league_games WHERE league_puuid = $1',
                             old_lol_puuid
                         )
+                        await helpers.forget_player(conn, old_lol_puuid, "League")
 
                 await conn.execute(
                     '''
@@ -1181,6 +904,12 @@ class BotCommands(commands.Cog):
                     region,
                     mass_region
                 )
+        # Keep server leaderboards and summaries aware of the new link
+        if interaction.guild:
+            await helpers.add_guild_member(self.pool, interaction.guild.id, user_id)
+        helpers.run_in_background(helpers.index_linked_user(
+            self.pool, [guild for guild in self.bot.guilds if guild != interaction.guild], user_id
+        ))
         await interaction.response.send_message(
             f"Your data has been linked/updated: {name}#{tag} in region {region}. "
             "If this looks incorrect, re-link using `/link <name> <tag>`.",
@@ -1195,41 +924,11 @@ class BotCommands(commands.Cog):
         result = ""
         server = False
         if ctx.guild and ctx.invoked_with in {"server", "serverlb"}:
-            guild = ctx.guild
-            members = {member.id async for member in guild.fetch_members(limit=None)}
+            await helpers.ensure_guild_index(self.pool, ctx.guild)
             server = True
-        else:
-            members = set()
-
-        async with self.pool.acquire() as conn:
-            users = await conn.fetch('SELECT discord_id, game_name, tag_line, tft_puuid, league_puuid, region, mass_region FROM users;')
-        
-        # Create a list to store all users' elo and name
-        user_elo_and_name = []
-
-        async def process_user(user):
-
-            print(f"processing {user['game_name']}")
-            if server:
-                if not int(user['discord_id']) in members:
-                    return
-            try:
-                user_elo, user_tier, user_rank, user_lp = await helpers.calculate_elo(
-                    user['tft_puuid'], "TFT", self.tft_token, user['region']
-                )
-                name_and_tag = f"{user['game_name']}#{user['tag_line']}"
-                user_elo_and_name.append(
-                    (user_elo, user_tier, user_rank, user_lp, name_and_tag, user['region'])
-                )
-            except Exception as e:
-                await ctx.send(f"Error processing {user['game_name']}#{user['tag_line']}: {e}")
 
-        async with TaskGroup(asyncio.Semaphore(20)) as tg:
-            for user in users:
-                await tg.create_task(process_user(user))
-            
-        # Sort users by their elo score (assuming user_elo is a numeric value)
-        user_elo_and_name.sort(reverse=True, key=lambda x: x[0])  # Sort in descending order
+        # Ranks come from the table kept fresh by the background sync and rank lookups
+        user_elo_and_name, oldest = await helpers.leaderboard(self.pool, "TFT", self.tft_token, ctx.guild.id if server else None)
 
         # Prepare the leaderboard result
         for index, (user_elo, user_tier, user_rank, user_lp, name_and_tag, region) in enumerate(user_elo_and_name):
@@ -1256,6 +955,8 @@ class BotCommands(commands.Cog):
             description=result,
             color=discord.Color.blue()
         )
+        if oldest:
+            lb_embed.set_footer(text=f"Ranks updated between {helpers.time_ago(oldest)} and now")
 
         await ctx.send(embed=lb_embed)
 
@@ -1265,37 +966,10 @@ class BotCommands(commands.Cog):
         result = ""
         server = False
         if ctx.guild and ctx.invoked_with in {"lserver", "lserverlb"}:
-            guild = ctx.guild
-            members = {member.id async for member in guild.fetch_members(limit=None)}
+            await helpers.ensure_guild_index(self.pool, ctx.guild)
             server = True
-        else:
-            members = set()
 
-        async with self.pool.acquire() as conn:
-            users = await conn.fetch('SELECT discord_id, game_name, tag_line, tft_puuid, league_puuid, region, mass_region FROM users;')
-        user_elo_and_name = []
-
-        async def process_user(user):
-            if server and int(user["discord_id"]) not in members:
-                return
-
-            try:
-                user_elo, user_tier, user_rank, user_lp = await helpers.calculate_elo(
-                    user['league_puuid'], "League", self.lol_token, user['region'])
-
-                name_and_tag = f"{user['game_name']}#{user['tag_line']}"
-                user_elo_and_name.append(
-                    (user_elo, user_tier, user_rank, user_lp, name_and_tag, user["region"])
-                )
-
-            except Exception as e:
-                await ctx.send(f"Error processing {user['game_name']}#{user['tag_line']}: {e}")
-
-        async with TaskGroup() as tg:
-            for user in users:
-                await tg.create_task(process_user(user))
-
-        user_elo_and_name.sort(reverse=True, key=lambda x: x[0])
+        user_elo_and_name, oldest = await helpers.leaderboard(self.pool, "League", self.lol_token, ctx.guild.id if server else None)
 
         for index, (user_elo, user_tier, user_rank, user_lp, name_and_tag, region) in enumerate(user_elo_and_name):
             name, tag = name_and_tag.split("#")
@@ -1322,6 +996,8 @@ class BotCommands(commands.Cog):
             description=result,
             color=discord.Color.blue()
         )
+        if oldest:
+            lb_embed.set_footer(text=f"Ranks updated between {helpers.time_ago(oldest)} and now")
 
         await ctx.send(embed=lb_embed)
 
@@ -1336,6 +1012,41 @@ class BotCommands(commands.Cog):
         )
         await ctx.send(embed=cutoff_embed)
 
+    # Command to check how busy the bot's Riot request scheduler and caches are
+    @commands.command(name="status", aliases=["botstatus"])
+    async def status(self, ctx):
+        queue_depth = helpers.riot_scheduler.queue_depth()
+        match_stats = helpers.match_cache_stats
+        image_stats = helpers.image_cache_stats
+        rank_stats = helpers.rank_cache_stats
+        pool_stats = self.pool.stats()
+        cached_members = sum(len(guild.members) for guild in self.bot.guilds)
+        status_embed = discord.Embed(
+            title="Bot Status",
+            description=(
+                f"**Riot queue:** {queue_depth['interactive']} interactive, {queue_depth['background']} background\n"
+                f"**DB pool:** {pool_stats['in_use']}/{pool_stats['size']} in use (max {pool_stats['max_size']}, "
+                f"peak {pool_stats['peak_in_use']}), {pool_stats['waiting']} waiting, "
+                f"wait avg {pool_stats['avg_wait_ms']:.1f} ms / max {pool_stats['max_wait_ms']:.0f} ms, "
+                f"{pool_stats['timeouts']} timeouts, {pool_stats['slow_holds']} slow holds\n"
+                f"**Match cache:** {len(helpers.match_lru)} in memory, "
+                f"{match_stats['memory_hits']} memory hits, {match_stats['db_hits']} db hits, {match_stats['misses']} misses\n"
+                f"**Rank cache:** {len(helpers.rank_cache)} players, "
+                f"{rank_stats['hits']} hits, {rank_stats['misses']} misses\n"
+                f"**Riot ID cache:** {len(helpers.riot_id_cache)} players, {helpers.riot_id_stats['hits']} hits, "
+                f"{helpers.riot_id_stats['db_hits']} db hits, {helpers.riot_id_stats['misses']} misses\n"
+                f"**PUUID cache:** {len(helpers.puuid_cache)} names, {helpers.puuid_cache_stats['hits']} hits, "
+                f"{helpers.puuid_cache_stats['db_hits']} db hits, {helpers.puuid_cache_stats['misses']} misses\n"
+                f"**Image cache:** {len(helpers.image_memory_cache)} images, "
+                f"{helpers.image_memory_cache_bytes / 1024 / 1024:.1f} MB, "
+                f"{image_stats['hits']} hits, {image_stats['misses']} misses\n"
+                f"**Gateway cache:** {len(self.bot.guilds)} guilds, {cached_members} members, "
+                f"{len(self.bot.users)} users, {len(helpers.guild_indexes)} guilds indexed"
+            ),
+            color=discord.Color.blue()
+        )
+        await ctx.send(embed=status_embed)
+
     # Roll command 
     @commands.command()
     async def roll(self, ctx, *args):
@@ -1372,20 +1083,22 @@ class BotCommands(commands.Cog):
             gameNum = 20
 
         # pull user data if registered
+        placements = None
         if user_id:
             data, gameName, tagLine, region, mass_region, puuid = await helpers.check_data(user_id, self.pool, "TFT")
+            # Linked players are kept in the match index by the sync, only go to Riot if it is short
+            if data and 0 < gameNum <= 20:
+                placements, checked_at = await helpers.stored_placements(self.pool, puuid, game_type, gameNum)
+                if len(placements) < gameNum:
+                    placements = None
         else:
             mass_region = self.mass_region
             puuid = await helpers.get_puuid(gameName, tagLine, mass_region, self.tft_token)
             if not puuid:
                 print(f"Could not find PUUID for {gameName}#{tagLine}.")
                 return f"Could not find PUUID for {gameName}#{tagLine}.", None, None
-        
-        error_message, placements, real_num_matches = await helpers.recent_matches(gameName, tagLine, puuid, game_type, mass_region, self.tft_token, gameNum)  # Unpack tuple
 
-        if error_message:
-            await ctx.send(embed=discord.Embed(description=error_message,color=discord.Color.blue()))  # Send error as embed
-        else:
+        async def build_embed(placements, note=None):
             top4s = 0
             firsts = 0
             total_placement = 0
@@ -1410,42 +1123,40 @@ class BotCommands(commands.Cog):
             num_ticks = max(5, max_frequency)  # Minimum 5 ticks
             y_labels = list(range(1, num_ticks+1)) # Sets ticks = to higher freq or 5 
 
-            # Create the plot
-            fig, ax = plt.subplots()
-            bar_colors = ['#F0B52B', '#969696', '#A45F00', '#595988', '#596263', '#596263', '#596263', '#596263']
-
-            ax.bar(x_labels, frequencies, color=bar_colors)
-            # ax.set_xlabel('Placement', color = "white", fontsize=14)
-            ax.set_ylabel('Count', color = "white", fontsize=17)
-            # ax.set_title('Placement Frequency', color = "white")
-            ax.set_xticks(x_labels)
-            ax.set_yticks(y_labels)
-            [t.set_color('white') for t in ax.xaxis.get_ticklabels()]
-            [t.set_color('white') for t in ax.yaxis.get_ticklabels()]
-            ax.tick_params(axis='x', color = 'white', labelsize=16)
-            ax.tick_params(axis='y', color = 'white', labelsize=16)
-
-            for spine in ax.spines.values():
-                spine.set_edgecolor('white')
-
-            filename = 'placements.png'
-            plt.tight_layout(pad=0.8)
-            plt.savefig(filename,transparent=True,dpi=300)
-            plt.close()
-            img = Image.open(filename)
-            img = img.resize((240, 180))  # Width, Height in pixels
-            img.save(filename)
+            chart_png = await helpers.run_render(helpers.render_placement_chart, frequencies, x_labels, y_labels)
             embed = discord.Embed(
-                title=f"Recent {real_num_matches} {game_type} Matches for {gameName}#{tagLine}",
+                title=f"Recent {len(placements)} {game_type} Matches for {gameName}#{tagLine}",
                 description=text,
                 color=discord.Color.blue()
             )
-            file = discord.File('placements.png', filename='placements.png')
+            file = discord.File(BytesIO(chart_png), filename='placements.png')
             embed.set_image(url="attachment://placements.png")
-            
-            await ctx.send(file=file, embed=embed)
+            if note:
+                embed.set_footer(text=note)
+            return embed, file
+
+        # Answer linked players from the index, then sync in the background and edit if games came in
+        if placements:
+            embed, file = await build_embed(placements, helpers.synced_note(checked_at))
+            message = await ctx.send(file=file, embed=embed)
+
+            async def revalidate():
+                if await helpers.refresh_user_games(self.pool, user_id, self.tft_token, self.lol_token):
+                    new_placements, new_checked_at = await helpers.stored_placements(self.pool, puuid, game_type, gameNum)
+                    if new_placements:
+                        new_embed, new_file = await build_embed(new_placements, helpers.synced_note(new_checked_at))
+                        await message.edit(embed=new_embed, attachments=[new_file])
+
+            helpers.run_in_background(revalidate())
+            return
 
-            os.remove("placements.png")
+        error_message, placements, real_num_matches = await helpers.recent_matches(gameName, tagLine, puuid, game_type, mass_region, self.tft_token, gameNum)  # Unpack tuple
+
+        if error_message:
+            await ctx.send(embed=discord.Embed(description=error_message,color=discord.Color.blue()))  # Send error as embed
+        else:
+            embed, file = await build_embed(placements)
+            await ctx.send(file=file, embed=embed)
 
     @commands.command(name="today", aliases=["t"])
     async def today(self, ctx, *args): 
@@ -1457,113 +1168,87 @@ class BotCommands(commands.Cog):
         else:
             return await ctx.send("Must be a linked user to use this command.")
             
-        await helpers.update_user_games(self.pool, user_id, self.tft_token, self.lol_token)
-
-        eastern = pytz.timezone("America/New_York")
-        now = datetime.now(eastern)
-        today_6am = now.replace(hour=6, minute=0, second=0, microsecond=0)
-        if now < today_6am:
-            today_6am -= timedelta(days=1)
-
-        cutoff = int(today_6am.timestamp())
-
-        async with self.pool.acquire() as conn:
-            print("Running fetch with:", user_id, cutoff, type(cutoff))
-
-            user_row = await conn.fetchrow('''
-                SELECT league_puuid, tft_puuid, region
-                FROM users
-                WHERE discord_id = $1;
-            ''', user_id)
+        # Answer from what is already stored, then sync in the background and edit if games came in
+        async def build_embed():
+            async with self.pool.acquire() as conn:
+                user_row = await conn.fetchrow('''
+                    SELECT league_puuid, tft_puuid, region
+                    FROM users
+                    WHERE discord_id = $1;
+                ''', user_id)
             
-            if not user_row:
-                print(f"No user found with discord_id {user_id}")
-                await ctx.send("❌ Could not find a linked TFT account for this user.")
-                return
+                if not user_row:
+                    print(f"No user found with discord_id {user_id}")
+                    return None
             
-            # 🔹 Fetch today's games
-            rows = await conn.fetch('''
-                SELECT placement, elo, game_datetime
-                FROM tft_games
-                WHERE tft_puuid = $1
-                AND game_datetime >= $2
-                ORDER BY game_datetime DESC;
-            ''', user_row['tft_puuid'], cutoff * 1000)
-
-            print("Fetched rows:", len(rows))
-
-            placements = [row['placement'] for row in rows]
-
-            # most recent game yesterday
-            first_snapshot = await conn.fetchrow('''
-                SELECT elo, game_datetime
-                FROM tft_games
-                WHERE tft_puuid = $1
-                AND game_datetime < $2
-                ORDER BY game_datetime DESC
-                LIMIT 1;
-            ''', user_row['tft_puuid'], cutoff * 1000)
-
-            if rows:
-                latest_snapshot = rows[0]      # most recent game today
-            else:
-                # fallback: if no games today, use yesterday's snapshot as both first and latest
-                latest_snapshot = first_snapshot
+                # 🔹 Today's games from the daily rollup
+                day = await helpers.rollup_window(conn, user_row['tft_puuid'], "TFT", helpers.rollup_day())
 
-            print("first_snapshot:", first_snapshot)
-            print("latest_snapshot:", latest_snapshot)
+                placements = day['placements']
+                checked_at = await helpers.last_synced(conn, [user_row['tft_puuid']])
 
-            tft_diff = 0  
+                tft_diff = 0  
 
-            if first_snapshot and latest_snapshot:
-                tft_diff = latest_snapshot['elo'] - first_snapshot['elo']
+                if day['open_elo'] is not None and day['close_elo'] is not None:
+                    tft_diff = day['close_elo'] - day['open_elo']
 
-                old_rank, old_tier, old_lp = helpers.lp_to_div(first_snapshot['elo'])
-                new_rank, new_tier, new_lp = helpers.lp_to_div(latest_snapshot['elo'])
+                    old_rank, old_tier, old_lp = helpers.lp_to_div(day['open_elo'])
+                    new_rank, new_tier, new_lp = helpers.lp_to_div(day['close_elo'])
+                else:
+                    print("Missing snapshot(s)")
+                    old_rank = old_tier = old_lp = "N/A"
+                    new_rank = new_tier = new_lp = "N/A"
+
+            # 🔹 Formatting
+            if isinstance(tft_diff, int) and tft_diff < 0:
+                lp_diff_emoji = "📉"
+                tft_diff_str = str(tft_diff)
             else:
-                print("Missing snapshot(s)")
-                old_rank = old_tier = old_lp = "N/A"
-                new_rank = new_tier = new_lp = "N/A"
-
-        # 🔹 Formatting
-        if isinstance(tft_diff, int) and tft_diff < 0:
-            lp_diff_emoji = "📉"
-            tft_diff_str = str(tft_diff)
-        else:
-            lp_diff_emoji = "📈"
-            tft_diff_str = f"+{tft_diff}" if isinstance(tft_diff, int) else "N/A"
+                lp_diff_emoji = "📈"
+                tft_diff_str = f"+{tft_diff}" if isinstance(tft_diff, int) else "N/A"
 
-        url = await helpers.get_pfp(user_row['region'], user_row['league_puuid'], self.lol_token)
+            url = await helpers.get_pfp(user_row['region'], user_row['league_puuid'], self.lol_token)
 
-        total_placement = sum(placements)
-        scores = " ".join(dicts.number_to_num_icon[p] for p in placements)
+            total_placement = sum(placements)
+            scores = " ".join(dicts.number_to_num_icon[p] for p in placements)
 
-        avg_placement = round(total_placement / len(placements), 1) if placements else "N/A"
+            avg_placement = round(total_placement / len(placements), 1) if placements else "N/A"
 
-        text = (
-            f"{dicts.tier_to_rank_icon.get(old_rank, '')} {old_rank} {old_tier} {old_lp} LP -> "
-            f"{dicts.tier_to_rank_icon.get(new_rank, '')} {new_rank} {new_tier} {new_lp} LP\n"
-            f"{lp_diff_emoji} **LP Difference:** {tft_diff_str}\n"
-            f"📊 **Games Played:** {len(placements)}\n"
-            f"⭐ **AVP:** {avg_placement}\n"
-            f"🏅 **Scores:** {scores}"
-        )
+            text = (
+                f"{dicts.tier_to_rank_icon.get(old_rank, '')} {old_rank} {old_tier} {old_lp} LP -> "
+                f"{dicts.tier_to_rank_icon.get(new_rank, '')} {new_rank} {new_tier} {new_lp} LP\n"
+                f"{lp_diff_emoji} **LP Difference:** {tft_diff_str}\n"
+                f"📊 **Games Played:** {len(placements)}\n"
+                f"⭐ **AVP:** {avg_placement}\n"
+                f"🏅 **Scores:** {scores}"
+            )
 
-        embed = discord.Embed(
-            description=text,
-            color=discord.Color.blue()
-        )
+            embed = discord.Embed(
+                description=text,
+                color=discord.Color.blue()
+            )
 
-        embed.set_author(
-            name=f"Today: {gameName}#{tagLine}",
-            url=f"https://lolchess.gg/profile/{region[:-1]}/{gameName.replace(' ', '%20')}-{tagLine}/",
-            icon_url="https://cdn-b.saashub.com/images/app/service_logos/184/6odf4nod5gmf/large.png?1627090832"
-        )
+            embed.set_author(
+                name=f"Today: {gameName}#{tagLine}",
+                url=f"https://lolchess.gg/profile/{region[:-1]}/{gameName.replace(' ', '%20')}-{tagLine}/",
+                icon_url="https://cdn-b.saashub.com/images/app/service_logos/184/6odf4nod5gmf/large.png?1627090832"
+            )
 
-        embed.set_thumbnail(url=url)
-        embed.set_footer(text="Last five matches below")
+            embed.set_thumbnail(url=url)
+            embed.set_footer(text=f"Last five matches below\n{helpers.synced_note(checked_at)}")
+            return embed
 
-        await ctx.send(embed=embed)
+        embed = await build_embed()
+        if not embed:
+            await ctx.send("❌ Could not find a linked TFT account for this user.")
+            return
+        message = await ctx.send(embed=embed)
+
+        async def revalidate():
+            if await helpers.refresh_user_games(self.pool, user_id, self.tft_token, self.lol_token):
+                await message.edit(embed=await build_embed())
+
+        helpers.run_in_background(revalidate())
 
     # Command to check all available commands, update as new commands are added (list alphabetically)
     @commands.command(name="commands", aliases=["command"])
@@ -1586,6 +1271,7 @@ class BotCommands(commands.Cog):
 **!todayleague | !lt** - Gives summary of today's League games for a player
 **\nGeneral Commands:**\n
 **!roll** - Rolls a random number (default 1-100)
+**!status** - Show Riot request queue and cache stats
 **/link** - Link your Riot account to your Discord account
 **!ping** - Test that bot is active
 **!commands** - Get a list of all commands
@@ -1,15 +1,26 @@
 import asyncio
+import aiohttp
 import discord
 import requests
 import dicts
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+import pytz
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
+from matplotlib.figure import Figure
 from pulsefire.clients import RiotAPIClient
+from pulsefire.middlewares import http_error_middleware, json_response_middleware
 from pulsefire.taskgroups import TaskGroup
 import os
 import hashlib
+import numpy as np
+import json
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
 
 CACHE_DIR = "image_cache"
 current_tft_unix = 1776240000 
@@ -17,180 +28,1037 @@ current_lol_unix = 1767873600
 
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+# Connection pool settings for the shared Riot API clients
+RIOT_POOL_LIMIT = int(os.getenv("RIOT_POOL_LIMIT", 100))
+RIOT_POOL_LIMIT_PER_HOST = int(os.getenv("RIOT_POOL_LIMIT_PER_HOST", 30))
+RIOT_KEEPALIVE_TIMEOUT = 60
+
+# Priority lanes for Riot requests: commands run in the interactive lane, the background sync
+# switches its task to the background lane so it only uses budget interactive commands leave
+INTERACTIVE = 0
+BACKGROUND = 1
+riot_priority = ContextVar("riot_priority", default=INTERACTIVE)
+
+# Share of each rate limit the background lane may use, the rest is kept for commands
+BACKGROUND_LIMIT_SHARE = float(os.getenv("RIOT_BACKGROUND_LIMIT_SHARE", 0.8))
+
+class RiotScheduler:
+    """Hands out Riot request slots per (token, region) app bucket and (token, region, endpoint)
+    method bucket, using the limits and counts Riot reports in the response headers."""
+
+    def __init__(self, background_share):
+        self.background_share = background_share
+        self.buckets = {}         # bucket key -> {window seconds: [limit, count, reset time]}
+        self.blocked_until = {}   # bucket key -> time a 429 Retry-After expires
+        self.waiting = [0, 0]     # requests waiting per lane
+        self.interactive_idle = asyncio.Event()
+        self.interactive_idle.set()
+
+    def queue_depth(self):
+        return {"interactive": self.waiting[INTERACTIVE], "background": self.waiting[BACKGROUND]}
+
+    def _wait_time(self, keys, priority):
+        now = time.monotonic()
+        wait = 0
+        for key in keys:
+            wait = max(wait, self.blocked_until.get(key, 0) - now)
+            for window, (limit, count, reset) in self.buckets.get(key, {}).items():
+                if now >= reset:
+                    continue
+                if priority == BACKGROUND:
+                    limit = max(1, int(limit * self.background_share))
+                if count >= limit:
+                    wait = max(wait, reset - now)
+        return wait
+
+    def _consume(self, keys):
+        now = time.monotonic()
+        for key in keys:
+            for window, bucket in self.buckets.get(key, {}).items():
+                if now >= bucket[2]:
+                    bucket[1], bucket[2] = 0, now + window
+                bucket[1] += 1
+
+    async def acquire(self, keys):
+        priority = riot_priority.get()
+        self.waiting[priority] += 1
+        if priority == INTERACTIVE:
+            self.interactive_idle.clear()
+        try:
+            while True:
+                if priority == BACKGROUND:
+                    await self.interactive_idle.wait()
+                wait = self._wait_time(keys, priority)
+                if wait <= 0:
+                    self._consume(keys)
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            self.waiting[priority] -= 1
+            if not self.waiting[INTERACTIVE]:
+                self.interactive_idle.set()
+
+    def synchronize(self, keys, status, headers):
+        now = time.monotonic()
+        app_key, method_key = keys
+        for key, limit_header, count_header in (
+            (app_key, "X-App-Rate-Limit", "X-App-Rate-Limit-Count"),
+            (method_key, "X-Method-Rate-Limit", "X-Method-Rate-Limit-Count"),
+        ):
+            if limit_header not in headers or count_header not in headers:
+                continue
+            counts = {window: count for count, window in (pair.split(":") for pair in headers[count_header].split(","))}
+            bucket = self.buckets.setdefault(key, {})
+            for pair in headers[limit_header].split(","):
+                limit, window = pair.split(":")
+                limit, window = int(limit), int(window)
+                count = int(counts.get(str(window), 0))
+                if window in bucket and now < bucket[window][2]:
+                    bucket[window][0] = limit
+                    bucket[window][1] = max(bucket[window][1], count)
+                else:
+                    bucket[window] = [limit, count, now + window]
+
+        if status == 429:
+            retry_after = int(headers.get("Retry-After", 1))
+            key = app_key if headers.get("X-Rate-Limit-Type") == "application" else method_key
+            self.blocked_until[key] = now + retry_after
+            print(f"[WARN] Riot 429 on {key}, backing off {retry_after}s")
+
+riot_scheduler = RiotScheduler(BACKGROUND_LIMIT_SHARE)
+
+# Pulsefire middleware that routes every request of one token through the shared scheduler
+def riot_scheduler_middleware(scheduler, token_id):
+    def constructor(next):
+        async def middleware(invocation):
+            region = invocation.params.get("region", "")
+            keys = (f"{token_id}:{region}", f"{token_id}:{region}:{invocation.urlformat}")
+            await scheduler.acquire(keys)
+            try:
+                response = await next(invocation)
+            except aiohttp.ClientResponseError as e:
+                scheduler.synchronize(keys, e.status, e.headers or {})
+                raise
+            scheduler.synchronize(keys, response.status, response.headers)
+            return response
+        return middleware
+    return constructor
+
+# One long-lived client per token, reused by every helper instead of opening a new session per call
+riot_clients = {}
+
+# Short stable id for an API key, safe to log and store
+def token_id(token):
+    return hashlib.sha256(token.encode()).hexdigest()[:8]
+
+def get_riot_client(token):
+    client = riot_clients.get(token)
+    if client is None or client.session.closed:
+        client = RiotAPIClient(
+            default_headers={"X-Riot-Token": token},
+            middlewares=[
+                json_response_middleware(),
+                http_error_middleware(),
+                riot_scheduler_middleware(riot_scheduler, token_id(token)),
+            ],
+        )
+        # Keep-alive connections are reused across calls, so only the first request pays the TLS handshake
+        client.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=RIOT_POOL_LIMIT,
+                limit_per_host=RIOT_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=RIOT_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+            )
+        )
+        riot_clients[token] = client
+    return client
+
+# Create the shared clients up front, called once the bot is ready
+async def open_riot_clients(*tokens):
+    for token in tokens:
+        get_riot_client(token)
+    print(f"Opened {len(riot_clients)} Riot API clients.")
+
+async def close_riot_clients():
+    for client in riot_clients.values():
+        await client.session.close()
+    riot_clients.clear()
+
+# Wraps the asyncpg pool so acquire waits, connections in use and hold times can be read from !status.
+# Acquires give up after POOL_ACQUIRE_TIMEOUT seconds instead of queueing forever, and holds longer
+# than POOL_SLOW_HOLD seconds are logged since a connection should only be held around queries
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("POOL_ACQUIRE_TIMEOUT", 30))
+POOL_SLOW_HOLD = float(os.getenv("POOL_SLOW_HOLD", 5))
+
+class InstrumentedPool:
+    def __init__(self, pool, acquire_timeout=POOL_ACQUIRE_TIMEOUT, slow_hold=POOL_SLOW_HOLD):
+        self.pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.slow_hold = slow_hold
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waiting = 0
+        self.acquires = 0
+        self.timeouts = 0
+        self.slow_holds = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def acquire(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            conn = await self.pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f"[POOL] Acquire timed out after {self.acquire_timeout:.0f}s with {self.in_use} connections in use")
+            raise
+        finally:
+            self.waiting -= 1
+
+        acquired = time.perf_counter()
+        wait = acquired - start
+        self.acquires += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        try:
+            yield conn
+        finally:
+            self.in_use -= 1
+            held = time.perf_counter() - acquired
+            if held > self.slow_hold:
+                self.slow_holds += 1
+                print(f"[POOL] Connection held for {held:.1f}s")
+            await self.pool.release(conn)
+
+    def stats(self):
+        return {
+            "size": self.pool.get_size(),
+            "max_size": self.pool.get_max_size(),
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "waiting": self.waiting,
+            "acquires": self.acquires,
+            "timeouts": self.timeouts,
+            "slow_holds": self.slow_holds,
+            "avg_wait_ms": self.total_wait / self.acquires * 1000 if self.acquires else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    # Everything else (close, fetch, ...) goes straight to the asyncpg pool
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+# Pool used by caches that are reached from helpers without a pool argument, set in init_db
+db_pool = None
+
+# Create tables owned by the bot's caches, called once the pool is created
+async def init_db(pool):
+    global db_pool
+    db_pool = pool
+    async with pool.acquire() as conn:
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS match_cache (
+                match_id TEXT NOT NULL,
+                game TEXT NOT NULL,
+                data BYTEA NOT NULL,
+                cached_at BIGINT NOT NULL,
+                PRIMARY KEY (match_id, game)
+            );
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS sync_cursors (
+                puuid TEXT NOT NULL,
+                game TEXT NOT NULL,
+                last_match_id TEXT,
+                last_seen_at BIGINT NOT NULL,
+                checked_at BIGINT NOT NULL,
+                PRIMARY KEY (puuid, game)
+            );
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS poll_schedule (
+                discord_id BIGINT PRIMARY KEY,
+                next_poll BIGINT NOT NULL,
+                interval_seconds INTEGER NOT NULL,
+                last_activity BIGINT
+            );
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS poll_schedule_next_poll_idx ON poll_schedule (next_poll);
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS ranks (
+                puuid TEXT NOT NULL,
+                game TEXT NOT NULL,
+                tier TEXT NOT NULL,
+                rank TEXT NOT NULL,
+                lp INTEGER NOT NULL,
+                elo INTEGER NOT NULL,
+                updated_at BIGINT NOT NULL,
+                PRIMARY KEY (puuid, game)
+            );
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS ranks_game_elo_idx ON ranks (game, elo DESC);
+        ''')
+        # Drop ranks of players that were never linked or have since relinked
+        await conn.execute('''
+            DELETE FROM ranks r
+            WHERE NOT EXISTS (
+                SELECT 1 FROM users u
+                WHERE (r.game = 'TFT' AND u.tft_puuid = r.puuid) OR (r.game = 'League' AND u.league_puuid = r.puuid)
+            );
+        ''')
+        # Covering indexes so per-player period scans and the last-game-before lookups never touch the heap
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS tft_games_puuid_datetime_idx
+            ON tft_games (tft_puuid, game_datetime) INCLUDE (placement, elo);
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS league_games_puuid_datetime_idx
+            ON league_games (league_puuid, game_datetime) INCLUDE (win_loss, elo);
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                puuid TEXT NOT NULL,
+                game TEXT NOT NULL,
+                day DATE NOT NULL,
+                games INTEGER NOT NULL,
+                placements SMALLINT[],
+                placement_sum INTEGER NOT NULL,
+                wins INTEGER NOT NULL,
+                losses INTEGER NOT NULL,
+                open_elo INTEGER,
+                close_elo INTEGER,
+                updated_at BIGINT NOT NULL,
+                PRIMARY KEY (puuid, game, day)
+            );
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS riot_id_lookups (
+                name_key TEXT NOT NULL,
+                tag_key TEXT NOT NULL,
+                token_id TEXT NOT NULL,
+                puuid TEXT,
+                expires_at BIGINT NOT NULL,
+                PRIMARY KEY (name_key, tag_key, token_id)
+            );
+        ''')
+        await conn.execute('DELETE FROM riot_id_lookups WHERE expires_at <= $1;', int(time.time()))
+        # Linked users per guild, kept current from member events so server commands don't page the member list
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS guild_members (
+                guild_id BIGINT NOT NULL,
+                discord_id BIGINT NOT NULL,
+                PRIMARY KEY (guild_id, discord_id)
+            );
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS guild_members_discord_id_idx ON guild_members (discord_id);
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS match_index (
+                match_id TEXT NOT NULL,
+                puuid TEXT NOT NULL,
+                queue_id INTEGER NOT NULL,
+                game_datetime BIGINT NOT NULL,
+                placement SMALLINT NOT NULL,
+                PRIMARY KEY (puuid, match_id)
+            );
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS match_index_puuid_queue_idx
+            ON match_index (puuid, queue_id, game_datetime DESC) INCLUDE (placement);
+        ''')
+        if not await conn.fetchval('SELECT EXISTS (SELECT 1 FROM match_index);'):
+            await backfill_match_index(conn)
+        if not await conn.fetchval('SELECT EXISTS (SELECT 1 FROM daily_rollups);'):
+            await backfill_rollups(conn)
+    print("Database tables ready.")
+
+# Finished matches never change, so match documents are kept forever in Postgres
+# with a small in-process LRU in front of it
+MATCH_LRU_SIZE = 256
+match_lru = OrderedDict()
+match_cache_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+async def get_match(game, mass_region, match_id, token, conn=None):
+    key = (game, match_id)
+    match_info = match_lru.get(key)
+    if match_info is not None:
+        match_lru.move_to_end(key)
+        match_cache_stats["memory_hits"] += 1
+        return match_info
+
+    if conn or db_pool:
+        # Reuse the caller's connection when it already holds one so the pool can't deadlock
+        async with (nullcontext(conn) if conn else db_pool.acquire()) as db:
+            row = await db.fetchrow('''
+                SELECT data
+                FROM match_cache
+                WHERE match_id = $1 AND game = $2
+            ''', match_id, game)
+        if row:
+            match_info = json.loads(zlib.decompress(row['data']))
+            match_cache_stats["db_hits"] += 1
+
+    if match_info is None:
+        match_info = await fetch_riot_match(game, mass_region, match_id, token)
+
+        if conn or db_pool:
+            async with (nullcontext(conn) if conn else db_pool.acquire()) as db:
+                await db.execute('''
+                    INSERT INTO match_cache (match_id, game, data, cached_at)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (match_id, game) DO NOTHING;
+                ''', match_id, game, compress_match(match_info), int(time.time()))
+
+    remember_match(key, match_info)
+    return match_info
+
+# Bulk version of get_match for ingestion: one cache query, then Riot fetches for the rest with bounded concurrency. Returns {match_id: match_info},
+# matches that could not be fetched are left out and, when a failed dict is passed, recorded there with their HTTP status
+# (None for anything that wasn't an HTTP error). No connection is held while Riot is fetching
+MATCH_FETCH_CONCURRENCY = int(os.getenv("MATCH_FETCH_CONCURRENCY", 10))
+
+# Rate limits, server errors and network failures are worth retrying, other 4xx (a missing or
+# refused match) will fail the same way every time
+def fetch_retryable(status):
+    return status is None or status == 429 or status >= 500
+
+async def get_matches(game, mass_region, match_ids, token, pool, failed=None):
+    matches = {}
+    for match_id in match_ids:
+        key = (game, match_id)
+        if key in match_lru:
+            match_lru.move_to_end(key)
+            match_cache_stats["memory_hits"] += 1
+            matches[match_id] = match_lru[key]
+
+    async with pool.acquire() as conn:
+        rows = await conn.fetch('''
+            SELECT match_id, data
+            FROM match_cache
+            WHERE game = $1 AND match_id = ANY($2::text[])
+        ''', game, [match_id for match_id in match_ids if match_id not in matches])
+    for row in rows:
+        matches[row['match_id']] = json.loads(zlib.decompress(row['data']))
+        match_cache_stats["db_hits"] += 1
+
+    semaphore = asyncio.Semaphore(MATCH_FETCH_CONCURRENCY)
+
+    async def fetch(match_id):
+        async with semaphore:
+            try:
+                return match_id, await fetch_riot_match(game, mass_region, match_id, token)
+            except Exception as e:
+                print(f"[ERROR] Failed to fetch {game} match {match_id}: {e}")
+                if failed is not None:
+                    failed[match_id] = e.status if isinstance(e, aiohttp.ClientResponseError) else None
+                return match_id, None
+
+    fetched = await asyncio.gather(*[fetch(match_id) for match_id in match_ids if match_id not in matches])
+    fetched = [(match_id, match_info) for match_id, match_info in fetched if match_info is not None]
+    if fetched:
+        now = int(time.time())
+        async with pool.acquire() as conn:
+            await conn.executemany('''
+                INSERT INTO match_cache (match_id, game, data, cached_at)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (match_id, game) DO NOTHING;
+            ''', [(match_id, game, compress_match(match_info), now) for match_id, match_info in fetched])
+        matches.update(fetched)
+
+    for match_id, match_info in matches.items():
+        remember_match((game, match_id), match_info)
+    return matches
+
+# Riot match fetches in flight, linked players syncing the same lobby wait on one request
+match_downloads = {}
+
+async def fetch_riot_match(game, mass_region, match_id, token):
+    key = (game, match_id)
+    download = match_downloads.get(key)
+    if download is None:
+        download = asyncio.ensure_future(download_riot_match(game, mass_region, match_id, token))
+        match_downloads[key] = download
+        download.add_done_callback(lambda _: match_downloads.pop(key, None))
+    # Shield so one cancelled caller doesn't cancel the fetch for everyone else
+    return await asyncio.shield(download)
+
+async def download_riot_match(game, mass_region, match_id, token):
+    client = get_riot_client(token)
+    match_cache_stats["misses"] += 1
+    if game == "TFT":
+        match_info = await client.get_tft_match_v1_match(region=mass_region, id=match_id)
+    else:
+        match_info = await client.get_lol_match_v5_match(region=mass_region, id=match_id)
+    # Remember it right away so other users' syncs find it before it reaches match_cache
+    remember_match((game, match_id), match_info)
+    return match_info
+
+def compress_match(match_info):
+    return zlib.compress(json.dumps(match_info, separators=(",", ":")).encode())
+
+def remember_match(key, match_info):
+    match_lru[key] = match_info
+    match_lru.move_to_end(key)
+    if len(match_lru) > MATCH_LRU_SIZE:
+        match_lru.popitem(last=False)
+    remember_riot_ids(match_info)
+
+# puuid -> (gameName, tagLine). Match documents carry every participant's Riot ID, so lobbies are
+# named from here, then from the users table, and account-v1 is only asked about what is left
+RIOT_ID_CACHE_SIZE = 8192
+riot_id_cache = OrderedDict()
+riot_id_stats = {"hits": 0, "db_hits": 0, "misses": 0}
+
+def remember_riot_id(puuid, game_name, tag_line):
+    riot_id_cache[puuid] = (game_name, tag_line)
+    riot_id_cache.move_to_end(puuid)
+    if len(riot_id_cache) > RIOT_ID_CACHE_SIZE:
+        riot_id_cache.popitem(last=False)
+
+def remember_riot_ids(match_info):
+    for p in match_info.get('info', {}).get('participants', []):
+        if p.get('puuid') and p.get('riotIdGameName'):
+            remember_riot_id(p['puuid'], p['riotIdGameName'], p.get('riotIdTagline', ''))
+
+# {puuid: (gameName, tagLine)} for these puuids, players that can't be resolved are left out
+async def resolve_riot_ids(puuids, mass_region, token):
+    riot_ids = {}
+    for puuid in puuids:
+        if puuid in riot_id_cache:
+            riot_id_cache.move_to_end(puuid)
+            riot_id_stats["hits"] += 1
+            riot_ids[puuid] = riot_id_cache[puuid]
+
+    missing = [puuid for puuid in puuids if puuid not in riot_ids]
+    if missing and db_pool:
+        async with db_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT tft_puuid, league_puuid, game_name, tag_line
+                FROM users
+                WHERE tft_puuid = ANY($1::text[]) OR league_puuid = ANY($1::text[])
+            ''', missing)
+        for row in rows:
+            for puuid in (row['tft_puuid'], row['league_puuid']):
+                if puuid in missing:
+                    riot_id_stats["db_hits"] += 1
+                    riot_ids[puuid] = (row['game_name'], row['tag_line'])
+        missing = [puuid for puuid in missing if puuid not in riot_ids]
+
+    async def lookup(puuid):
+        riot_id_stats["misses"] += 1
+        try:
+            account = await get_riot_client(token).get_account_v1_by_puuid(region=mass_region, puuid=puuid)
+        except Exception as e:
+            print(f"[WARN] Could not resolve Riot ID for {puuid}: {e}")
+            return
+        if 'gameName' in account:
+            remember_riot_id(puuid, account['gameName'], account.get('tagLine', ''))
+            riot_ids[puuid] = riot_id_cache[puuid]
+
+    await asyncio.gather(*[lookup(puuid) for puuid in missing])
+    return riot_ids
+
+# Each linked user is polled on their own schedule, kept in poll_schedule so restarts pick up
+# where they left off. A poll that finds new games, or a command from the user, resets them to
+# POLL_MIN_MINUTES, every idle poll doubles the interval up to POLL_MAX_MINUTES. A failed one keeps it,
+# until POLL_RETRY_LIMIT failures in a row start backing off like idle polls
+POLL_MIN_INTERVAL = int(os.getenv("POLL_MIN_MINUTES", 5)) * 60
+POLL_MAX_INTERVAL = int(os.getenv("POLL_MAX_MINUTES", 1440)) * 60
+POLL_RETRY_LIMIT = int(os.getenv("POLL_RETRY_LIMIT", 3))
+poll_failures = {}
+
 async def update_db_games(pool, tft_token, lol_token):
+    # Background sync yields to interactive commands in the Riot scheduler
+    riot_priority.set(BACKGROUND)
+    now = int(time.time())
     async with pool.acquire() as conn:
-        users = await conn.fetch('SELECT discord_id FROM users;')
-    
+        # Users that were never scheduled (new links, first run) are due straight away
+        users = await conn.fetch('''
+            SELECT u.discord_id, ps.interval_seconds
+            FROM users u
+            LEFT JOIN poll_schedule ps ON ps.discord_id = u.discord_id
+            WHERE ps.next_poll IS NULL OR ps.next_poll <= $1
+            ORDER BY ps.next_poll NULLS FIRST;
+        ''', now)
+
+    if not users:
+        return 0
+
+    async def poll_user(user):
+        user_id = int(user['discord_id'])
+        changed, ok = await sync_user_games(pool, user_id, tft_token, lol_token)
+        if ok:
+            poll_failures.pop(user_id, None)
+        else:
+            poll_failures[user_id] = poll_failures.get(user_id, 0) + 1
+        if changed:
+            interval = POLL_MIN_INTERVAL
+        elif not ok and poll_failures[user_id] < POLL_RETRY_LIMIT:
+            # A Riot or database error says nothing about whether they played, keep their interval
+            interval = user['interval_seconds'] or POLL_MIN_INTERVAL
+        else:
+            interval = min((user['interval_seconds'] or POLL_MIN_INTERVAL) * 2, POLL_MAX_INTERVAL)
+        async with pool.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO poll_schedule (discord_id, next_poll, interval_seconds, last_activity)
+                VALUES ($1, $2, $3, CASE WHEN $4 THEN $5::BIGINT END)
+                ON CONFLICT (discord_id)
+                DO UPDATE SET
+                    next_poll = EXCLUDED.next_poll,
+                    interval_seconds = EXCLUDED.interval_seconds,
+                    last_activity = COALESCE(EXCLUDED.last_activity, poll_schedule.last_activity);
+            ''', user_id, int(time.time()) + interval, interval, bool(changed), int(time.time()))
+
     async with TaskGroup(asyncio.Semaphore(10)) as tg:
         for user in users:
-            await tg.create_task(update_user_games(pool, int(user['discord_id']), tft_token, lol_token))
+            await tg.create_task(poll_user(user))
+
+    print(f"User games updated for {len(users)} due users.")
+    return len(users)
 
-    print("User games updated.")
+# Poll a user at the fastest rate again after they use the bot
+async def mark_user_active(pool, user_id):
+    now = int(time.time())
+    async with pool.acquire() as conn:
+        await conn.execute('''
+            INSERT INTO poll_schedule (discord_id, next_poll, interval_seconds, last_activity)
+            SELECT discord_id, $2, $3, $4
+            FROM users
+            WHERE discord_id = $1
+            ON CONFLICT (discord_id)
+            DO UPDATE SET
+                next_poll = LEAST(poll_schedule.next_poll, EXCLUDED.next_poll),
+                interval_seconds = EXCLUDED.interval_seconds,
+                last_activity = EXCLUDED.last_activity;
+        ''', user_id, now + POLL_MIN_INTERVAL, POLL_MIN_INTERVAL, now)
+
+# Commands answer from Postgres straight away and refresh in the background. Refreshes and scheduled
+# polls of the same user share one update_user_games run, and tasks are kept here so they aren't collected
+user_refreshes = {}
+background_tasks = set()
+
+def run_in_background(coro):
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# Scheduled polls and command refreshes both go through here, (changed, ok) like update_user_games
+async def sync_user_games(pool, user_id, tft_token, lol_token):
+    user_id = int(user_id)
+    refresh = user_refreshes.get(user_id)
+    if refresh is None:
+        refresh = asyncio.ensure_future(background_update(pool, user_id, tft_token, lol_token))
+        user_refreshes[user_id] = refresh
+        refresh.add_done_callback(lambda _: user_refreshes.pop(user_id, None))
+    return await asyncio.shield(refresh)
+
+# Tasks copy the context they are started from, so a refresh kicked off by a command would
+# otherwise page and download matches in the interactive lane
+async def background_update(pool, user_id, tft_token, lol_token):
+    riot_priority.set(BACKGROUND)
+    return await update_user_games(pool, user_id, tft_token, lol_token)
+
+async def refresh_user_games(pool, user_id, tft_token, lol_token):
+    changed, ok = await sync_user_games(pool, user_id, tft_token, lol_token)
+    return changed
+
+# Refresh several users at once, True if any of them had new games
+async def refresh_users_games(pool, user_ids, tft_token, lol_token):
+    async with TaskGroup(asyncio.Semaphore(10)) as tg:
+        tasks = [await tg.create_task(refresh_user_games(pool, user_id, tft_token, lol_token)) for user_id in user_ids]
+    return any(task.result() for task in tasks)
+
+# Drop everything derived from a player's games when their account is unlinked or replaced, so
+# linking it again later syncs from scratch instead of from a stale cursor and rollups
+async def forget_player(conn, puuid, game):
+    await conn.execute('DELETE FROM daily_rollups WHERE puuid = $1 AND game = $2;', puuid, game)
+    await conn.execute('DELETE FROM sync_cursors WHERE puuid = $1 AND game = $2;', puuid, game)
+    await conn.execute('DELETE FROM lp WHERE puuid = $1 AND game = $2;', puuid, game)
+    await conn.execute('DELETE FROM ranks WHERE puuid = $1 AND game = $2;', puuid, game)
+    if game == "TFT":
+        await conn.execute('DELETE FROM match_index WHERE puuid = $1;', puuid)
+    rank_cache.pop((game, puuid), None)
+
+# Oldest sync check among these puuids (seconds), None if they were never synced
+async def last_synced(conn, puuids):
+    return await conn.fetchval('''
+        SELECT MIN(checked_at)
+        FROM sync_cursors
+        WHERE puuid = ANY($1::text[]);
+    ''', list(puuids))
+
+def synced_note(checked_at):
+    if checked_at is None:
+        return "Not synced yet, checking for new games"
+    return f"Last synced {time_ago(checked_at)}"
+
+# Server scoped commands read guild_members instead of paging the member list. Each guild is indexed
+# once per process by asking the gateway about linked users only, member events and /link keep it current
+guild_indexes = {}
+
+async def index_guild(pool, guild):
+    async with pool.acquire() as conn:
+        linked_ids = [row['discord_id'] for row in await conn.fetch('SELECT discord_id FROM users;')]
+
+    member_ids = []
+    for i in range(0, len(linked_ids), 100):
+        members = await guild.query_members(user_ids=linked_ids[i:i + 100], limit=100, cache=False)
+        member_ids.extend(member.id for member in members)
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute('DELETE FROM guild_members WHERE guild_id = $1;', guild.id)
+            await conn.executemany('''
+                INSERT INTO guild_members (guild_id, discord_id)
+                VALUES ($1, $2)
+                ON CONFLICT DO NOTHING;
+            ''', [(guild.id, member_id) for member_id in member_ids])
+    print(f"Indexed {len(member_ids)} linked members of guild {guild.id}")
+
+def guild_indexed(guild_id):
+    index = guild_indexes.get(guild_id)
+    return index is not None and index.done() and index.exception() is None
+
+# Index a guild on first use, concurrent commands in the same guild wait on the same run
+async def ensure_guild_index(pool, guild):
+    index = guild_indexes.get(guild.id)
+    if index is None or (index.done() and index.exception() is not None):
+        index = asyncio.ensure_future(index_guild(pool, guild))
+        guild_indexes[guild.id] = index
+    await asyncio.shield(index)
+
+async def add_guild_member(pool, guild_id, user_id):
+    async with pool.acquire() as conn:
+        await conn.execute('''
+            INSERT INTO guild_members (guild_id, discord_id)
+            SELECT $1, discord_id
+            FROM users
+            WHERE discord_id = $2
+            ON CONFLICT DO NOTHING;
+        ''', guild_id, user_id)
+
+async def remove_guild_member(pool, guild_id, user_id):
+    async with pool.acquire() as conn:
+        await conn.execute('''
+            DELETE FROM guild_members
+            WHERE guild_id = $1 AND discord_id = $2;
+        ''', guild_id, user_id)
 
+async def forget_guild(pool, guild_id):
+    guild_indexes.pop(guild_id, None)
+    async with pool.acquire() as conn:
+        await conn.execute('DELETE FROM guild_members WHERE guild_id = $1;', guild_id)
+
+# A newly linked user may already be in other indexed guilds, look them up there
+async def index_linked_user(pool, guilds, user_id):
+    for guild in guilds:
+        if not guild_indexed(guild.id):
+            continue
+        try:
+            members = await guild.query_members(user_ids=[user_id], limit=1, cache=False)
+            if members:
+                await add_guild_member(pool, guild.id, user_id)
+        except Exception as e:
+            print(f"Could not check {user_id} in guild {guild.id}: {e}")
+
+# Returns (changed, ok): changed when either game had new matches, ok is False when a game's sync failed
 async def update_user_games(pool, user_id, tft_token, lol_token):
+    changed, ok = False, True
+    user_id = int(user_id)
     try:
         async with pool.acquire() as conn:
-            user_id = int(user_id)
             user = await conn.fetchrow('''
                 SELECT *
                 FROM users
                 WHERE discord_id = $1
             ''', user_id)
+    except Exception as e:
+        print(f"[ERROR] update_user_games failed for {user_id}: {e}")
+        return changed, False
 
-            if not user:
-                print(f"[WARN] No user found with discord_id={user_id}")
-                return
-
-            region = user['region']
-            mass_region = user['mass_region']
-
-            # TFT
-            last_tft_match = await conn.fetchrow('''
-                SELECT match_id, elo, update_time
-                FROM lp
-                WHERE puuid = $1 AND game = 'TFT'
-                ORDER BY update_time DESC
-                LIMIT 1
-            ''', user['tft_puuid'])
-
-            # fetch new matches since last seen
-            last_tft_time = last_tft_match['update_time'] if last_tft_match else current_tft_unix
-            err, tft_match_list = await find_all_match_ids(user['tft_puuid'], "TFT", mass_region, tft_token, max(last_tft_time, current_tft_unix))
-
-            if tft_match_list:
-            
-                # add matches one by one to LP table
-                tft_elo = (await calculate_elo(user['tft_puuid'], "TFT", tft_token, region))[0]
-
-                await add_new_match(conn, user['tft_puuid'], "TFT", mass_region, tft_token, tft_match_list, tft_elo)
-
-                last_match_id = tft_match_list[0]
-                await conn.execute("""
-                    INSERT INTO lp (match_id, puuid, game, update_time, elo)
-                    VALUES ($1,$2,'TFT',$3,$4)
-                    ON CONFLICT (puuid)
-                    DO UPDATE SET
-                        match_id = EXCLUDED.match_id,
-                        game = EXCLUDED.game,
-                        update_time = EXCLUDED.update_time,
-                        elo = EXCLUDED.elo
-                    WHERE EXCLUDED.match_id > lp.match_id;
-                """,
-                
-                last_match_id,user['tft_puuid'],int(time.time()),tft_elo)
+    if not user:
+        print(f"[WARN] No user found with discord_id={user_id}")
+        return changed, ok
 
-            else:
-                last_tft_match = {'update_time': int(time.time())}
-
-            # --- League ---
-            last_lol_match = await conn.fetchrow('''
-                SELECT match_id, elo, update_time
-                FROM lp
-                WHERE puuid = $1 AND game = 'League'
-                ORDER BY update_time DESC
-                LIMIT 1
-            ''', user['league_puuid'])
-
-            last_lol_time = last_lol_match['update_time'] if last_lol_match else current_lol_unix
-            err, lol_match_list = await find_all_match_ids(
-                user['league_puuid'], "League", mass_region, lol_token, last_lol_time
-            )
+    # Each game syncs on its own so a TFT failure doesn't hold back League and the other way round
+    for game, puuid, token in (("TFT", user['tft_puuid'], tft_token), ("League", user['league_puuid'], lol_token)):
+        try:
+            if await sync_player_games(pool, puuid, game, user['mass_region'], user['region'], token):
+                changed = True
+        except Exception as e:
+            ok = False
+            print(f"[ERROR] {game} sync failed for {user['game_name']} ({user_id}): {e}")
+
+    print(f"[DONE] Completed update for {user_id}")
+    return changed, ok
+
+# Sync one game for a player, True when the newest match id moved. Connections are taken per query
+# and never held across Riot calls. Anything that could not be fetched or written raises before the
+# cursor and lp are saved, so the next tick sees the player as changed and retries
+async def sync_player_games(pool, puuid, game, mass_region, region, token):
+    latest = await probe_latest_match_id(puuid, game, mass_region, token)
+    async with pool.acquire() as conn:
+        if not await sync_cursor_changed(conn, puuid, game, latest):
+            return False
+        last_match = await conn.fetchrow('''
+            SELECT match_id, elo, update_time
+            FROM lp
+            WHERE puuid = $1 AND game = $2
+            ORDER BY update_time DESC
+            LIMIT 1
+        ''', puuid, game)
+
+    # fetch new matches since last seen
+    if game == "TFT":
+        since = max(last_match['update_time'], current_tft_unix) if last_match else current_tft_unix
+    else:
+        since = last_match['update_time'] if last_match else current_lol_unix
+    err, match_list = await find_all_match_ids(puuid, game, mass_region, token, since)
+    if err:
+        raise Exception(err)
 
-            if lol_match_list:
-                lol_elo = (await calculate_elo(user['league_puuid'], "League", lol_token, region))[0]
-                await add_new_match(conn, user['league_puuid'], "League", mass_region, lol_token, lol_match_list)
-                last_lol_match_id = lol_match_list[0]
+    if match_list:
+        elo = (await calculate_elo(puuid, game, token, region, fresh=True))[0]
+        if not await add_new_match(pool, puuid, game, mass_region, token, match_list, elo if game == "TFT" else None):
+            raise Exception(f"not every {game} match could be stored, will retry")
 
-                await conn.execute("""
-                    INSERT INTO lp (match_id, puuid, game, update_time, elo)
-                    VALUES ($1, $2, 'League', $3, $4)
-                    ON CONFLICT (puuid)
-                    DO UPDATE SET
-                        match_id = EXCLUDED.match_id,
-                        game = EXCLUDED.game,
-                        update_time = EXCLUDED.update_time,
-                        elo = EXCLUDED.elo
-                    WHERE EXCLUDED.match_id > lp.match_id;
-                """, last_lol_match_id, user['league_puuid'], int(time.time()), lol_elo)
+        async with pool.acquire() as conn:
+            await conn.execute("""
+                INSERT INTO lp (match_id, puuid, game, update_time, elo)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (puuid)
+                DO UPDATE SET
+                    match_id = EXCLUDED.match_id,
+                    game = EXCLUDED.game,
+                    update_time = EXCLUDED.update_time,
+                    elo = EXCLUDED.elo
+                WHERE EXCLUDED.match_id > lp.match_id;
+            """, match_list[0], puuid, game, int(time.time()), elo)
 
-            else:
-                last_lol_match = {'update_time': int(time.time())}
+    async with pool.acquire() as conn:
+        await save_sync_cursor(conn, puuid, game, latest)
+    return True
+
+# Newest match id for a player using a single count=1 request, None if they have no matches.
+# League is filtered to the same ranked solo queue find_all_match_ids pages through
+async def probe_latest_match_id(puuid, game, mass_region, token):
+    client = get_riot_client(token)
+    if game == "TFT":
+        matches = await client.get_tft_match_v1_match_ids_by_puuid(
+            region=mass_region,
+            puuid=puuid,
+            queries={"start": 0, "count": 1}
+        )
+    else:
+        matches = await client.get_lol_match_v5_match_ids_by_puuid(
+            region=mass_region,
+            puuid=puuid,
+            queries={"queue": 420, "type": "ranked", "start": 0, "count": 1}
+        )
+    return matches[0] if matches else None
 
-            print(f"[INFO] Updated matches for {user['game_name']}")
+# Compare the probed id with the stored cursor, idle players just get their check time bumped
+async def sync_cursor_changed(conn, puuid, game, latest_match_id):
+    cursor = await conn.fetchrow('''
+        SELECT last_match_id
+        FROM sync_cursors
+        WHERE puuid = $1 AND game = $2
+    ''', puuid, game)
 
-    except Exception as e:
-        print(f"[ERROR] update_user_games failed for {user_id}: {e}")
+    if cursor is None or cursor['last_match_id'] != latest_match_id:
+        return True
 
-    finally:
-        print(f"[DONE] Completed update for {user_id}")
-        
-async def add_new_match(conn, puuid, game, mass_region, token, match_list, elo=None):
+    await conn.execute('''
+        UPDATE sync_cursors
+        SET checked_at = $3
+        WHERE puuid = $1 AND game = $2
+    ''', puuid, game, int(time.time()))
+    return False
+
+# Only called once the new matches were written so a failed sync is retried next tick
+async def save_sync_cursor(conn, puuid, game, latest_match_id):
+    now = int(time.time())
+    await conn.execute('''
+        INSERT INTO sync_cursors (puuid, game, last_match_id, last_seen_at, checked_at)
+        VALUES ($1, $2, $3, $4, $4)
+        ON CONFLICT (puuid, game)
+        DO UPDATE SET
+            last_match_id = EXCLUDED.last_match_id,
+            last_seen_at = EXCLUDED.last_seen_at,
+            checked_at = EXCLUDED.checked_at;
+    ''', puuid, game, latest_match_id, now)
+
+# Matches are fetched concurrently and written in batches, each batch in one transaction.
+# Every linked player found in a lobby gets their row from the same pass, so the match is
+# fetched once and already stored ids are skipped when the other players sync
+MATCH_BATCH_SIZE = int(os.getenv("MATCH_BATCH_SIZE", 100))
+
+# Returns True only when every id in match_list was fetched and written
+async def add_new_match(pool, puuid, game, mass_region, token, match_list, elo=None):
     if not match_list:
-        return
+        return True
+    complete = True
     
     target_queues = {
         "TFT": dicts.game_type_to_id["Ranked"],
         "League": dicts.game_type_to_id["Ranked Solo/Duo"]
     }
-    try:
-        async with RiotAPIClient(default_headers={'X-Riot-Token': token}) as client:
-            for match_id in match_list:
-                print(f"Attempting to add {game} match id {match_id} for {puuid}")
-                if game == 'TFT':
-                    match_info = await client.get_tft_match_v1_match(region=mass_region, id=match_id)
-                    queue_id = match_info['info'].get('queue_id')
-                    if queue_id != target_queues['TFT']:
-                        print(f"{game} match id {match_id} not ranked")
-                        continue
-
-                    game_datetime = match_info['info']['game_datetime']
-                    participants = match_info['info']['participants']
-                    if game_datetime < current_tft_unix * 1000:
-                        print(f"{game} match id {match_id} before current set, skipping")
-                        continue
-
-                    p = next((p for p in participants if p['puuid'] == puuid), None)
-                    if p:
-                        champions = [c['character_id'] for c in p.get('units', [])]
-                        items = [i for c in p.get('units', []) for i in c.get('itemNames', [])]
-                        traits = [{"name": t["name"], "style": t["style"]} for t in p.get("traits", [])]
-                        await conn.execute(
-                            '''
-                            INSERT INTO tft_games (match_id, tft_puuid, game_datetime, placement, champions, items, traits, damage_dealt, level, elo)
-                            VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
-                            ON CONFLICT (match_id, tft_puuid) DO NOTHING;
-                            ''',
-                            match_id, puuid, game_datetime, p['placement'], champions, items, traits,
-                            p['total_damage_to_players'], p['level'], elo
-                        )
-
-                elif game == 'League':
-                    match_info = await client.get_lol_match_v5_match(region=mass_region, id=match_id)
-                    queue_id = match_info['info'].get('queueId')
-                    if queue_id != target_queues['League']:
-                        print(f"{game} match id {match_id} not ranked")
-                        continue
-
-                    game_datetime = match_info['info']['gameEndTimestamp']
-
-                    if game_datetime < current_lol_unix * 1000:
-                        print(f"{game} match id {match_id} before current set, skipping")
-                        continue
-
-                    participants = match_info['info']['participants']
-                    for p in participants:
-                        if p['puuid'] == puuid:
+    games_table, puuid_column = ("tft_games", "tft_puuid") if game == "TFT" else ("league_games", "league_puuid")
+    # Elo at sync time for the linked players found in these matches, this player's is passed in
+    linked_elo = {puuid: elo}
+
+    for start in range(0, len(match_list), MATCH_BATCH_SIZE):
+        batch = match_list[start:start + MATCH_BATCH_SIZE]
+        try:
+            # Skip ids another linked player's sync already wrote for this player
+            async with pool.acquire() as conn:
+                stored = await conn.fetch(f'''
+                    SELECT match_id
+                    FROM {games_table}
+                    WHERE {puuid_column} = $1 AND match_id = ANY($2::text[])
+                ''', puuid, batch)
+            stored = {row['match_id'] for row in stored}
+            batch = [match_id for match_id in batch if match_id not in stored]
+            if not batch:
+                continue
+
+            fetch_start = time.perf_counter()
+            failed = {}
+            matches = await get_matches(game, mass_region, batch, token, pool, failed)
+            fetch_time = time.perf_counter() - fetch_start
+            # Matches Riot refuses for good are counted as handled so they can't hold the cursor back forever
+            if any(fetch_retryable(status) for status in failed.values()):
+                complete = False
+
+            async with pool.acquire() as conn:
+                linked = await linked_participants(conn, game, matches.values())
+
+            # Elo of linked players seen in these lobbies for the first time, looked up together
+            if game == 'TFT':
+                async def resolve_elo(linked_puuid):
+                    try:
+                        linked_elo[linked_puuid] = (await calculate_elo(linked_puuid, game, token, linked[linked_puuid], fresh=True))[0]
+                    except Exception as e:
+                        # Leave it to that player's own sync
+                        print(f"[WARN] Could not fetch elo for linked player {linked_puuid}: {e}")
+
+                ranked_players = {
+                    p['puuid']
+                    for match_info in matches.values()
+                    if match_info['info'].get('queue_id') == target_queues['TFT']
+                    and match_info['info']['game_datetime'] >= current_tft_unix * 1000
+                    for p in match_info['info']['participants']
+                }
+                async with TaskGroup(asyncio.Semaphore(MATCH_FETCH_CONCURRENCY)) as tg:
+                    for linked_puuid in linked:
+                        if linked_puuid in ranked_players and linked_puuid not in linked_elo:
+                            await tg.create_task(resolve_elo(linked_puuid))
+
+            rows = []
+            for match_id in batch:
+                match_info = matches.get(match_id)
+                if not match_info:
+                    continue
+
+                # A payload that doesn't have the expected shape is skipped for good rather than failing the batch
+                match_rows = []
+                try:
+                    if game == 'TFT':
+                        if match_info['info'].get('queue_id') != target_queues['TFT']:
+                            continue
+
+                        game_datetime = match_info['info']['game_datetime']
+                        if game_datetime < current_tft_unix * 1000:
+                            continue
+
+                        for p in match_info['info']['participants']:
+                            if p['puuid'] != puuid and p['puuid'] not in linked:
+                                continue
+                            if p['puuid'] not in linked_elo:
+                                continue
+                            champions = [c['character_id'] for c in p.get('units', [])]
+                            items = [i for c in p.get('units', []) for i in c.get('itemNames', [])]
+                            traits = [{"name": t["name"], "style": t["style"]} for t in p.get("traits", [])]
+                            match_rows.append((
+                                match_id, p['puuid'], game_datetime, p['placement'], champions, items, traits,
+                                p['total_damage_to_players'], p['level'], linked_elo[p['puuid']]
+                            ))
+
+                    elif game == 'League':
+                        if match_info['info'].get('queueId') != target_queues['League']:
+                            continue
+
+                        game_datetime = match_info['info']['gameEndTimestamp']
+                        if game_datetime < current_lol_unix * 1000:
+                            continue
+
+                        for p in match_info['info']['participants']:
+                            if p['puuid'] != puuid and p['puuid'] not in linked:
+                                continue
                             cs = p['totalMinionsKilled'] + p['neutralMinionsKilled']
-                            await conn.execute('''
-                                INSERT INTO league_games (match_id, league_puuid, game_datetime, win_loss, champion, kills, deaths, assists, cs, game_duration)
-                                VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
-                                ON CONFLICT (match_id, league_puuid) DO NOTHING;
-                            ''', match_id, puuid, game_datetime, p['win'], p['championName'], p['kills'], p['deaths'], p['assists'], cs, match_info['info']['gameDuration'])
-                print(f"Inserting match {match_id}, placement {p['placement']}")
-    except Exception as e:
-        print(f"[ERROR] Failed to insert match {match_id}, placement {p['placement']}: {e}")
+                            match_rows.append((
+                                match_id, p['puuid'], game_datetime, p['win'], p['championName'], p['kills'],
+                                p['deaths'], p['assists'], cs, match_info['info']['gameDuration']
+                            ))
+                except (KeyError, TypeError) as e:
+                    print(f"[ERROR] Skipping malformed {game} match {match_id}: {e!r}")
+                    continue
+                rows.extend(match_rows)
+
+            write_start = time.perf_counter()
+            async with pool.acquire() as conn, conn.transaction():
+                if game == 'TFT':
+                    # Every fetched match goes into the index, whatever its queue, so !h and !r can use it
+                    await index_matches(conn, [row for match_id, match_info in matches.items() for row in match_index_rows(match_id, match_info)])
+                    await conn.executemany('''
+                        INSERT INTO tft_games (match_id, tft_puuid, game_datetime, placement, champions, items, traits, damage_dealt, level, elo)
+                        VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
+                        ON CONFLICT (match_id, tft_puuid) DO NOTHING;
+                    ''', rows)
+                else:
+                    await conn.executemany('''
+                        INSERT INTO league_games (match_id, league_puuid, game_datetime, win_loss, champion, kills, deaths, assists, cs, game_duration)
+                        VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
+                        ON CONFLICT (match_id, league_puuid) DO NOTHING;
+                    ''', rows)
+                # Keep the daily rollups of every player that got rows in step with the games tables
+                oldest_new_game = {}
+                for row in rows:
+                    oldest_new_game[row[1]] = min(row[2], oldest_new_game.get(row[1], row[2]))
+                for row_puuid, since in oldest_new_game.items():
+                    await refresh_rollups(conn, row_puuid, game, since)
+            write_time = time.perf_counter() - write_start
+
+            print(f"[SYNC] {game} batch for {puuid}: {len(batch)} ids ({len(stored)} already stored), {len(matches)} fetched, {len(rows)} ranked rows written, fetch {fetch_time:.2f}s, write {write_time:.2f}s")
+        except Exception as e:
+            complete = False
+            print(f"[ERROR] Failed to insert {game} batch starting at {batch[0]} for {puuid}: {e}")
+
+    return complete
+
+# Other linked players in these matches, {puuid: region}
+async def linked_participants(conn, game, match_infos):
+    participant_puuids = {p['puuid'] for match_info in match_infos for p in match_info['info']['participants']}
+    puuid_column = "tft_puuid" if game == "TFT" else "league_puuid"
+    rows = await conn.fetch(f'''
+        SELECT {puuid_column} AS puuid, region
+        FROM users
+        WHERE {puuid_column} = ANY($1::text[])
+    ''', list(participant_puuids))
+    return {row['puuid']: row['region'] for row in rows}
 
 async def find_missing_games(pool, tft_token, lol_token):
+    riot_priority.set(BACKGROUND)
     async with pool.acquire() as conn:
 
         rows = await conn.fetch("""
@@ -219,14 +1087,15 @@ async def find_missing_games(pool, tft_token, lol_token):
             ON lol.puuid = u.league_puuid AND lol.game = 'League';
         """)
 
-        for row in rows:
-            err, tft_match_ids = await find_all_match_ids(row['tft_puuid'], "TFT", row['mass_region'], tft_token, timestamp=current_tft_unix)
+    for row in rows:
+        err, tft_match_ids = await find_all_match_ids(row['tft_puuid'], "TFT", row['mass_region'], tft_token, timestamp=current_tft_unix)
 
-            if tft_match_ids:
-                tft_elo, _, _, _ = await calculate_elo(row['tft_puuid'], "TFT", tft_token, row['region'])
-                await add_new_match(conn, row['tft_puuid'], 'TFT', row['mass_region'], tft_token, tft_match_ids, tft_elo)
+        if tft_match_ids:
+            tft_elo, _, _, _ = await calculate_elo(row['tft_puuid'], "TFT", tft_token, row['region'], fresh=True)
+            await add_new_match(pool, row['tft_puuid'], 'TFT', row['mass_region'], tft_token, tft_match_ids, tft_elo)
 
-                last_match_id = tft_match_ids[0]
+            last_match_id = tft_match_ids[0]
+            async with pool.acquire() as conn:
                 await conn.execute("""
                     INSERT INTO lp (match_id, puuid, game, update_time, elo)
                     VALUES ($1,$2,'TFT',$3,$4)
@@ -240,15 +1109,16 @@ async def find_missing_games(pool, tft_token, lol_token):
                 """,
                 last_match_id,row['tft_puuid'],int(time.time()),tft_elo)
 
-            # ---------- League ----------
-            err, lol_match_ids = await find_all_match_ids(row['league_puuid'], "League", row['mass_region'], lol_token, timestamp=current_lol_unix)
+        # ---------- League ----------
+        err, lol_match_ids = await find_all_match_ids(row['league_puuid'], "League", row['mass_region'], lol_token, timestamp=current_lol_unix)
 
-            if lol_match_ids:
+        if lol_match_ids:
 
-                last_lol_match_id = lol_match_ids[0]
+            last_lol_match_id = lol_match_ids[0]
 
-                lol_elo, _, _, _ = await calculate_elo(row['league_puuid'], "League", lol_token, row['region'])
-                await add_new_match(conn, row['league_puuid'], 'League', row['mass_region'], lol_token, lol_match_ids, lol_elo)
+            lol_elo, _, _, _ = await calculate_elo(row['league_puuid'], "League", lol_token, row['region'], fresh=True)
+            await add_new_match(pool, row['league_puuid'], 'League', row['mass_region'], lol_token, lol_match_ids, lol_elo)
+            async with pool.acquire() as conn:
                 await conn.execute("""
                     INSERT INTO lp (match_id, puuid, game, update_time, elo)
                     VALUES ($1, $2, 'League', $3, $4)
@@ -261,99 +1131,307 @@ async def find_missing_games(pool, tft_token, lol_token):
                     WHERE EXCLUDED.match_id > lp.match_id;
                 """, last_lol_match_id, row['league_puuid'], int(time.time()), lol_elo)
 
-            print(f"[INFO] Processed {row['game_name']} ({row['discord_id']})")
+        print(f"[INFO] Processed {row['game_name']} ({row['discord_id']})")
     print("All missing matches found!")
 
-async def get_rank_info(region, puuid, tft_token):
-    async with RiotAPIClient(default_headers={"X-Riot-Token": tft_token}) as client:
+# Rank entries are cached per (game, puuid) for RANK_CACHE_TTL seconds, one entries call returns every
+# queue of that game so it serves them all. Lookups in flight are shared, so rendering a lobby and then
+# another board of it costs no extra calls. The sync passes fresh=True so elo stored with new games is current
+RANK_CACHE_TTL = int(os.getenv("RANK_CACHE_TTL", 120))
+RANK_CACHE_SIZE = 4096
+rank_cache = {}
+rank_lookups = {}
+rank_cache_stats = {"hits": 0, "misses": 0}
+
+async def get_rank_info(region, puuid, tft_token, fresh=False):
+    return await cached_rank_info("TFT", region, puuid, tft_token, fresh)
+
+async def get_lol_rank_info(region, puuid, lol_token, fresh=False):
+    return await cached_rank_info("League", region, puuid, lol_token, fresh)
+
+async def cached_rank_info(game, region, puuid, token, fresh=False):
+    key = (game, puuid)
+    cached = rank_cache.get(key)
+    if cached and not fresh and time.monotonic() - cached[0] < RANK_CACHE_TTL:
+        rank_cache_stats["hits"] += 1
+        return cached[1]
+
+    lookup = rank_lookups.get(key)
+    if lookup is None:
+        lookup = asyncio.ensure_future(download_rank_info(game, region, puuid, token))
+        rank_lookups[key] = lookup
+        lookup.add_done_callback(lambda _: rank_lookups.pop(key, None))
+    return await asyncio.shield(lookup)
+
+async def download_rank_info(game, region, puuid, token):
+    client = get_riot_client(token)
+    rank_cache_stats["misses"] += 1
+    if game == "TFT":
         info = await client.get_tft_league_v1_entries_by_puuid(region=region, puuid=puuid)
-        return info
-
-async def get_lol_rank_info(region, puuid, lol_token):
-    async with RiotAPIClient(default_headers={"X-Riot-Token": lol_token}) as client:
+    else:
         info = await client.get_lol_league_v4_entries_by_puuid(region=region, puuid=puuid)
-        return info
+
+    # Entries are stored in fetch order, so the first one is always the oldest
+    rank_cache.pop((game, puuid), None)
+    rank_cache[(game, puuid)] = (time.monotonic(), info)
+    while len(rank_cache) > RANK_CACHE_SIZE:
+        rank_cache.pop(next(iter(rank_cache)))
+
+    await record_rank(puuid, game, info)
+    return info
+
+rank_queue_types = {"TFT": "RANKED_TFT", "League": "RANKED_SOLO_5x5"}
+
+# Elo, tier, rank and lp of the ranked queue in a league entries response
+def parse_rank(game, rank_info):
+    for entry in rank_info:
+        if entry['queueType'] == rank_queue_types[game]:
+            return dicts.rank_to_elo[entry['tier'] + " " + entry['rank']] + int(entry['leaguePoints']), entry['tier'], entry['rank'], entry['leaguePoints']
+    return 0, "UNRANKED", "", 0  # If no ranked entry is found
+
+# Every rank lookup of a linked player refreshes the ranks table the leaderboards read from,
+# lobby players and one-off lookups of unlinked players are not stored
+async def record_rank(puuid, game, rank_info):
+    if not db_pool:
+        return
+    elo, tier, rank, lp = parse_rank(game, rank_info)
+    puuid_column = "tft_puuid" if game == "TFT" else "league_puuid"
+    try:
+        async with db_pool.acquire() as conn:
+            await conn.execute(f'''
+                INSERT INTO ranks (puuid, game, tier, rank, lp, elo, updated_at)
+                SELECT $1, $2, $3, $4, $5, $6, $7
+                WHERE EXISTS (SELECT 1 FROM users WHERE {puuid_column} = $1)
+                ON CONFLICT (puuid, game)
+                DO UPDATE SET
+                    tier = EXCLUDED.tier,
+                    rank = EXCLUDED.rank,
+                    lp = EXCLUDED.lp,
+                    elo = EXCLUDED.elo,
+                    updated_at = EXCLUDED.updated_at;
+            ''', puuid, game, tier, rank, int(lp), elo, int(time.time()))
+    except Exception as e:
+        print(f"[WARN] Could not store {game} rank for {puuid}: {e}")
+
+# Leaderboard entries from the ranks table in one query, sorted by elo. Linked users that have
+# no stored rank yet are looked up once, returns (entries, oldest updated_at)
+async def leaderboard(pool, game, token, guild_id=None):
+    puuid_column = "tft_puuid" if game == "TFT" else "league_puuid"
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(f'''
+            SELECT u.game_name, u.tag_line, u.{puuid_column} AS puuid, u.region,
+                   r.elo, r.tier, r.rank, r.lp, r.updated_at
+            FROM users u
+            LEFT JOIN ranks r ON r.puuid = u.{puuid_column} AND r.game = $1
+            WHERE $2::BIGINT IS NULL OR EXISTS (
+                SELECT 1 FROM guild_members g WHERE g.guild_id = $2 AND g.discord_id = u.discord_id
+            )
+            ORDER BY r.elo DESC NULLS LAST;
+        ''', game, guild_id)
+
+    entries = []
+
+    async def add_entry(row):
+        name_and_tag = f"{row['game_name']}#{row['tag_line']}"
+        if row['elo'] is not None:
+            entries.append((row['elo'], row['tier'], row['rank'], row['lp'], name_and_tag, row['region'], row['updated_at']))
+            return
+        try:
+            elo, tier, rank, lp = await calculate_elo(row['puuid'], game, token, row['region'])
+            entries.append((elo, tier, rank, lp, name_and_tag, row['region'], int(time.time())))
+        except Exception as e:
+            print(f"Error fetching {game} rank for {name_and_tag}: {e}")
+
+    async with TaskGroup(asyncio.Semaphore(20)) as tg:
+        for row in rows:
+            await tg.create_task(add_entry(row))
+
+    entries.sort(reverse=True, key=lambda x: x[0])
+    oldest = min((entry[6] for entry in entries), default=None)
+    return [entry[:6] for entry in entries], oldest
 
 # Function to return cutoff lp for challenger and grandmaster
 async def get_cutoff(tft_token, region):
     # grab all players who are challenger, grandmaster, and master
-    async with RiotAPIClient(default_headers={"X-Riot-Token": tft_token}) as client:
-        start = time.perf_counter()
-        challengers, grandmasters, masters = await asyncio.gather(
-            client.get_tft_league_v1_challenger_league(region=region),
-            client.get_tft_league_v1_grandmaster_league(region=region),
-            client.get_tft_league_v1_master_league(region=region),
-        )
-        end = time.perf_counter()
-        print(f"Execution time: {end - start:.4f} seconds")
-
-        # put all the lps into a list
-        lps = [entry.get('leaguePoints') for entry in challengers['entries']]
-        lps.extend(entry.get('leaguePoints') for entry in grandmasters['entries'])
-        lps.extend(entry.get('leaguePoints') for entry in masters['entries'])
-        end = time.perf_counter()
-        print(f"Execution time: {end - start:.4f} seconds")
-
-        # sort lps 
-        lps_sorted = sorted(lps, reverse=True)
-        end = time.perf_counter()
-        print(f"Execution time: {end - start:.4f} seconds")
-
-        # in the case there are less than 250 masters+ players
-        if len(lps_sorted) < 250:
-            return 500, 200
-        
-        # in the case there are between 250 and 750 masters+ players
-        if len(lps_sorted) < 750:
-            challenger_cutoff = max(500,lps_sorted[249])
-            return challenger_cutoff, 200
+    client = get_riot_client(tft_token)
+    start = time.perf_counter()
+    challengers, grandmasters, masters = await asyncio.gather(
+        client.get_tft_league_v1_challenger_league(region=region),
+        client.get_tft_league_v1_grandmaster_league(region=region),
+        client.get_tft_league_v1_master_league(region=region),
+    )
+    end = time.perf_counter()
+    print(f"Execution time: {end - start:.4f} seconds")
+
+    # put all the lps into a list
+    lps = [entry.get('leaguePoints') for entry in challengers['entries']]
+    lps.extend(entry.get('leaguePoints') for entry in grandmasters['entries'])
+    lps.extend(entry.get('leaguePoints') for entry in masters['entries'])
+    end = time.perf_counter()
+    print(f"Execution time: {end - start:.4f} seconds")
+
+    # sort lps 
+    lps_sorted = sorted(lps, reverse=True)
+    end = time.perf_counter()
+    print(f"Execution time: {end - start:.4f} seconds")
+
+    # in the case there are less than 250 masters+ players
+    if len(lps_sorted) < 250:
+        return 500, 200
         
-        # return cutoffs, default to 500 and 200 if not enough players to fill out chall/gm
+    # in the case there are between 250 and 750 masters+ players
+    if len(lps_sorted) < 750:
         challenger_cutoff = max(500,lps_sorted[249])
-        grandmaster_cutoff = max(200,lps_sorted[749])
+        return challenger_cutoff, 200
+        
+    # return cutoffs, default to 500 and 200 if not enough players to fill out chall/gm
+    challenger_cutoff = max(500,lps_sorted[249])
+    grandmaster_cutoff = max(200,lps_sorted[749])
     return challenger_cutoff, grandmaster_cutoff
 
+# On-disk copies of the CommunityDragon json files, revalidated with ETag/Last-Modified on startup
+DATA_CACHE_DIR = "data_cache"
+STATIC_DATA_TIMEOUT = aiohttp.ClientTimeout(total=120, connect=10)
+
+def read_json_file(path):
+    with open(path, "rb") as f:
+        return json.loads(f.read())
+
+def write_json_file(path, data):
+    # Write to a temp file first so a crash never leaves a half-written cache behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+# Keep only the given fields of each entry so the full documents can be freed
+def project_fields(entries, fields):
+    return [{field: entry[field] for field in fields if field in entry} for entry in entries]
+
+def parse_static_json(body, transform):
+    data = json.loads(body)
+    return transform(data) if transform else data
+
+async def fetch_static_json(session, name, url, transform=None, variant=None):
+    data_path = os.path.join(DATA_CACHE_DIR, f"{name}.json")
+    meta_path = os.path.join(DATA_CACHE_DIR, f"{name}.meta.json")
+
+    meta = {}
+    if os.path.exists(data_path) and os.path.exists(meta_path):
+        meta = await asyncio.to_thread(read_json_file, meta_path)
+        # A cache written for another variant (e.g. an older set) or url can't be revalidated or reused
+        if meta.get("variant") != variant or meta.get("url") != url:
+            meta = {}
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304:
+                print(f"{name} unchanged, loading cached copy")
+                return await asyncio.to_thread(read_json_file, data_path)
+            response.raise_for_status()
+            body = await response.read()
+            new_meta = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "variant": variant,
+                "url": url,
+            }
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if meta:
+            print(f"Failed to fetch {name} ({e}), loading cached copy")
+            return await asyncio.to_thread(read_json_file, data_path)
+        if os.path.exists(data_path):
+            raise RuntimeError(f"Failed to fetch {name} ({e}) and the cached copy is for another variant or url") from e
+        raise
+
+    data = await asyncio.to_thread(parse_static_json, body, transform)
+    del body  # the raw download can be tens of MB, don't keep it around while writing the cache
+    await asyncio.to_thread(write_json_file, data_path, data)
+    await asyncio.to_thread(write_json_file, meta_path, new_meta)
+    print(f"{name} downloaded and parsed successfully")
+    return data
+
+# Load all static game data in parallel, sources maps name -> (url, transform, variant)
+async def load_static_data(sources):
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+    async with aiohttp.ClientSession(timeout=STATIC_DATA_TIMEOUT) as session:
+        results = await asyncio.gather(*[
+            fetch_static_json(session, name, url, transform, variant)
+            for name, (url, transform, variant) in sources.items()
+        ])
+    return dict(zip(sources, results))
+
+# Field each CommunityDragon list is indexed by, so icon lookups are dict hits instead of list scans
+mapping_index_fields = {
+    "champ_mapping": "apiName",
+    "trait_icon_mapping": "apiName",
+    "item_mapping": "nameId",
+    "companion_mapping": "contentId",
+    "lol_item_mapping": "id",
+    "keystone_mapping": "id",
+    "runes_mapping": "id",
+    "summs_mapping": "id",
+}
+
+# Build the mapping index from the raw json lists, pass the existing index to rebuild it in place
+# so every holder of the nested dicts sees refreshed data
+def build_mapping_index(raw_mappings, index=None):
+    if index is None:
+        index = {}
+    for name, field in mapping_index_fields.items():
+        entries = index.setdefault(name, {})
+        entries.clear()
+        for entry in raw_mappings.get(name, []):
+            key = entry.get(field)
+            if name == "champ_mapping" and key:
+                key = key.lower()
+            entries.setdefault(key, entry)  # first entry wins, like the old linear scan
+    return index
+
 # Function to get the trait icon path
 def get_trait_icon(traits_data, traitName):
-    for trait in traits_data:
-        if trait.get("apiName") == traitName:
-            return trait.get("icon", "")[:-4] # Removes the beginning of the datadragon icon_path 
+    trait = traits_data.get(traitName)
+    if trait:
+        return trait.get("icon", "")[:-4] # Removes the beginning of the datadragon icon_path 
     print("Trait not Found")
     return None  # Return None if the trait_id is not found
 
 # Function to get the champ icon path
 def get_champ_icon(champs_data, characterName):
-    # Loop through each champion in the list
-    for champion in champs_data:        
-        # Check if the apiName matches the provided characterName
-        if champion.get("apiName").lower() == characterName.lower():
-            # Assuming 'champion' dictionary contains a 'squareIcon' key with the icon pat
-            return champion.get("tileIcon", "")[:-4]  # Remove the last 4 characters (usually file extension)
+    champion = champs_data.get(characterName.lower())
+    if champion:
+        return champion.get("tileIcon", "")[:-4]  # Remove the last 4 characters (usually file extension)
     
     print(f"{characterName} Not Found")
     return None
 
 # Function to get the item icon path
 def get_item_icon(items_data, itemName):
-    for item in items_data:
-        if item.get("nameId") == itemName:
-            return item.get("squareIconPath", "")[21:]
+    item = items_data.get(itemName)
+    if item:
+        return item.get("squareIconPath", "")[21:]
     print(f"{itemName} Not Found")
     return "assets/maps/tft/icons/items/hexcore/tft_item_blank.tft_set13.png"
 
 def get_companion_icon(companions_json, contentId):
-    for companion in companions_json:
-        if contentId == companion.get("contentId"):
-            return companion.get("loadoutsIcon")[21:]
+    companion = companions_json.get(contentId)
+    if companion:
+        return companion.get("loadoutsIcon")[21:]
     print(f"{contentId} Not Found")
     return None
 
 def get_lol_item_icon(lol_item_json, itemId):
     if itemId == 0:
         return "assets/items/icons2d/gp_ui_placeholder.png"
-    for item in lol_item_json:
-        if itemId == item.get("id"):
-            return item.get("iconPath", "")[21:]
+    item = lol_item_json.get(itemId)
+    if item:
+        return item.get("iconPath", "")[21:]
     print(f"{itemId}Not Found")
     return None
 
@@ -361,32 +1439,43 @@ def get_lol_champ_icon(championId):
     return f"v1/champion-icons/{championId}"
 
 def get_keystone_icon(keystones_json, style):
-    for keystone in keystones_json:
-        if style == keystone.get("id"):
-            return keystone.get("iconPath", "")[21:]
+    keystone = keystones_json.get(style)
+    if keystone:
+        return keystone.get("iconPath", "")[21:]
     print(f"{style} Not Found")
     return None
 
 def get_rune_icon(runes_json, style):
-    for rune in runes_json:
-        if style == rune.get("id"):
-            return rune.get("iconPath", "")[21:]
+    rune = runes_json.get(style)
+    if rune:
+        return rune.get("iconPath", "")[21:]
     print(f"{style} Not Found")
     return None
 
 def get_summs_icon(summs_json, summonerId):
-    for summ in summs_json:
-        if summonerId == summ.get("id"):
-            return summ.get("iconPath", "")[21:]
-    print(f"{summ} Not Found")
+    summ = summs_json.get(summonerId)
+    if summ:
+        return summ.get("iconPath", "")[21:]
+    print(f"{summonerId} Not Found")
     return None 
 
 async def get_pfp(region, puuid, lol_token):
-    async with RiotAPIClient(default_headers={"X-Riot-Token": lol_token}) as client:
-        profile = await client.get_lol_summoner_v4_by_puuid(region=region, puuid=puuid)
-        pfp_id = profile['profileIconId']
-        url = f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/v1/profile-icons/{pfp_id}.jpg"
-        return url
+    client = get_riot_client(lol_token)
+    profile = await client.get_lol_summoner_v4_by_puuid(region=region, puuid=puuid)
+    pfp_id = profile['profileIconId']
+    url = f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/v1/profile-icons/{pfp_id}.jpg"
+    return url
+
+# Pillow and matplotlib drawing runs in this pool so renders never block the event loop.
+# Render functions only take plain specs (values and fetched images) and return PNG bytes
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 4))
+render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+
+async def run_render(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(render_executor, fn, *args)
+
+def close_render_executor():
+    render_executor.shutdown(wait=False, cancel_futures=True)
 
 def center_square_crop(image: Image.Image) -> Image.Image:
     w, h = image.size
@@ -417,7 +1506,80 @@ def circular_crop(image: Image.Image) -> Image.Image:
 
     return result
 
+# Image downloads share one pooled session, bounded by IMAGE_FETCH_CONCURRENCY connections
+IMAGE_FETCH_CONCURRENCY = int(os.getenv("IMAGE_FETCH_CONCURRENCY", 16))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", 15))
+image_session = None
+
+# Downloads in flight by cache path, concurrent requests for the same url wait on the same task
+image_downloads = {}
+
+def get_image_session():
+    global image_session
+    if image_session is None or image_session.closed:
+        image_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=IMAGE_FETCH_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=IMAGE_FETCH_CONCURRENCY, keepalive_timeout=60),
+        )
+    return image_session
+
+async def close_image_session():
+    if image_session and not image_session.closed:
+        await image_session.close()
+
+def write_image_file(path, content):
+    # Write to a temp file first so other lookups never open a half-written image
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+async def download_image(url, cache_path):
+    async with get_image_session().get(url) as response:
+        if response.status != 200:
+            raise Exception(f"Failed to fetch image from {url} (status {response.status})")
+        content = await response.read()
+
+    # Save to cache
+    await asyncio.to_thread(write_image_file, cache_path, content)
+    return content
+
+# Decoded, already-resized images by (url, size), evicted least recently used once over the byte budget
+IMAGE_MEMORY_CACHE_BYTES = int(os.getenv("IMAGE_MEMORY_CACHE_MB", 64)) * 1024 * 1024
+image_memory_cache = OrderedDict()
+image_memory_cache_bytes = 0
+image_cache_stats = {"hits": 0, "misses": 0}
+
+def image_nbytes(image):
+    return image.width * image.height * len(image.getbands())
+
+def cache_decoded_image(key, image):
+    global image_memory_cache_bytes
+    nbytes = image_nbytes(image)
+    if nbytes > IMAGE_MEMORY_CACHE_BYTES:
+        return
+    if key in image_memory_cache:
+        image_memory_cache_bytes -= image_nbytes(image_memory_cache.pop(key))
+    image_memory_cache[key] = image
+    image_memory_cache_bytes += nbytes
+    while image_memory_cache_bytes > IMAGE_MEMORY_CACHE_BYTES:
+        _, evicted = image_memory_cache.popitem(last=False)
+        image_memory_cache_bytes -= image_nbytes(evicted)
+
 async def fetch_image(url: str, size: tuple = None):
+    key = (url, tuple(size) if size else None)
+    cached = image_memory_cache.get(key)
+    if cached is not None:
+        image_memory_cache.move_to_end(key)
+        image_cache_stats["hits"] += 1
+        # Callers paste onto and recolor what they get back, so hand out a copy
+        return cached.copy()
+    image_cache_stats["misses"] += 1
+    image = await load_image(url, size)
+    cache_decoded_image(key, image)
+    return image.copy()
+
+async def load_image(url: str, size: tuple = None):
     print("looking for " + url) # troubleshooting line
     # Generate a unique filename from the URL
     url_hash = hashlib.sha256(url.encode()).hexdigest()
@@ -431,49 +1593,240 @@ async def fetch_image(url: str, size: tuple = None):
             image = image.resize(size, Image.LANCZOS)
         return image
 
-    # Otherwise, download the image in a thread
-    response = await asyncio.to_thread(requests.get, url)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch image from {url} (status {response.status_code})")
+    # Otherwise download it once, even if several renders ask for it at the same time
+    download = image_downloads.get(cache_path)
+    if download is None:
+        download = asyncio.ensure_future(download_image(url, cache_path))
+        image_downloads[cache_path] = download
+        download.add_done_callback(lambda _: image_downloads.pop(cache_path, None))
+    # Shield so one cancelled caller doesn't cancel the download for everyone else
+    content = await asyncio.shield(download)
 
-    # Save to cache
-    with open(cache_path, "wb") as f:
-        f.write(response.content)
-
-    image = Image.open(BytesIO(response.content)).convert("RGBA")
+    image = Image.open(BytesIO(content)).convert("RGBA")
     if size:
         image = image.resize(size, Image.LANCZOS)
 
     return image
 
+# Riot ID -> puuid lookups, in memory and in riot_id_lookups so they survive restarts. Keys are the
+# lowercased name and tag plus a hash of the token, since every API key sees different puuids.
+# Players that don't exist are remembered for a shorter time so a typo isn't retried every command
+PUUID_CACHE_TTL = int(os.getenv("PUUID_CACHE_HOURS", 24)) * 3600
+PUUID_NEGATIVE_TTL = int(os.getenv("PUUID_NEGATIVE_MINUTES", 10)) * 60
+PUUID_CACHE_SIZE = 4096
+puuid_cache = OrderedDict()
+puuid_lookups = {}
+puuid_cache_stats = {"hits": 0, "db_hits": 0, "misses": 0}
+
+def riot_id_key(gameName, tagLine, riot_token):
+    return gameName.replace("_", " ").strip().lower(), tagLine.strip().lower(), token_id(riot_token)
+
+def remember_puuid(key, puuid, expires_at):
+    puuid_cache[key] = (puuid, expires_at)
+    puuid_cache.move_to_end(key)
+    if len(puuid_cache) > PUUID_CACHE_SIZE:
+        puuid_cache.popitem(last=False)
+
 # Function to fetch PUUID
 async def get_puuid(gameName, tagLine, mass_region, riot_token):
+    key = riot_id_key(gameName, tagLine, riot_token)
+    cached = puuid_cache.get(key)
+    if cached and cached[1] > time.time():
+        puuid_cache.move_to_end(key)
+        puuid_cache_stats["hits"] += 1
+        return cached[0]
+
+    lookup = puuid_lookups.get(key)
+    if lookup is None:
+        lookup = asyncio.ensure_future(lookup_puuid(key, gameName, tagLine, mass_region, riot_token))
+        puuid_lookups[key] = lookup
+        lookup.add_done_callback(lambda _: puuid_lookups.pop(key, None))
+    return await asyncio.shield(lookup)
+
+async def lookup_puuid(key, gameName, tagLine, mass_region, riot_token):
+    now = int(time.time())
+    name_key, tag_key, token_key = key
+    if db_pool:
+        async with db_pool.acquire() as conn:
+            row = await conn.fetchrow('''
+                SELECT puuid, expires_at
+                FROM riot_id_lookups
+                WHERE name_key = $1 AND tag_key = $2 AND token_id = $3 AND expires_at > $4
+            ''', name_key, tag_key, token_key, now)
+        if row:
+            puuid_cache_stats["db_hits"] += 1
+            remember_puuid(key, row['puuid'], row['expires_at'])
+            return row['puuid']
+
+    puuid_cache_stats["misses"] += 1
     try:
-        async with RiotAPIClient(default_headers={"X-Riot-Token": riot_token}) as client:
-            account = await client.get_account_v1_by_riot_id(region=mass_region, game_name=gameName, tag_line=tagLine)
-        return account['puuid']
+        client = get_riot_client(riot_token)
+        account = await client.get_account_v1_by_riot_id(region=mass_region, game_name=gameName, tag_line=tagLine)
+        puuid = account['puuid']
+        expires_at = now + PUUID_CACHE_TTL
+        remember_riot_id(puuid, account.get('gameName', gameName), account.get('tagLine', tagLine))
+
+    except aiohttp.ClientResponseError as err:
+        print(f"Failed to retrieve PUUID for {gameName}#{tagLine}.{err}")
+        if err.status != 404:
+            return None
+        puuid = None
+        expires_at = now + PUUID_NEGATIVE_TTL
 
     except Exception as err:
         print(f"Failed to retrieve PUUID for {gameName}#{tagLine}.{err}")
         return None
 
+    remember_puuid(key, puuid, expires_at)
+    if db_pool:
+        try:
+            async with db_pool.acquire() as conn:
+                await conn.execute('''
+                    INSERT INTO riot_id_lookups (name_key, tag_key, token_id, puuid, expires_at)
+                    VALUES ($1, $2, $3, $4, $5)
+                    ON CONFLICT (name_key, tag_key, token_id)
+                    DO UPDATE SET
+                        puuid = EXCLUDED.puuid,
+                        expires_at = EXCLUDED.expires_at;
+                ''', name_key, tag_key, token_key, puuid, expires_at)
+        except Exception as e:
+            print(f"[WARN] Could not store PUUID lookup for {gameName}#{tagLine}: {e}")
+    return puuid
+
+# Stats days run from 6am to 6am America/New_York. daily_rollups keeps one row per player, game
+# and day (games, placements newest first or W/L, elo before the day's first game and after its
+# last), so !today, !todayleague, !sum and !sumw read O(days) rows instead of every game
+ROLLUP_TZ = pytz.timezone("America/New_York")
+ROLLUP_DAY_START = timedelta(hours=6)
+
+def rollup_day(when=None):
+    when = datetime.now(ROLLUP_TZ) if when is None else when.astimezone(ROLLUP_TZ)
+    return (when - ROLLUP_DAY_START).date()
+
+def rollup_day_start(day):
+    return ROLLUP_TZ.localize(datetime.combine(day, datetime.min.time()) + ROLLUP_DAY_START)
+
+# Recompute every rollup day from the one containing since (ms) onwards. Later days are included
+# because an older game arriving late changes the opening elo of the day after it
+async def refresh_rollups(conn, puuid, game, since):
+    day = rollup_day(datetime.fromtimestamp(since / 1000, ROLLUP_TZ))
+    day_start = int(rollup_day_start(day).timestamp() * 1000)
+    if game == "TFT":
+        games_table, puuid_column = "tft_games", "tft_puuid"
+        totals = '''
+            ARRAY_AGG(placement ORDER BY game_datetime DESC) AS placements,
+            SUM(placement) AS placement_sum,
+            0 AS wins,
+            0 AS losses,'''
+    else:
+        games_table, puuid_column = "league_games", "league_puuid"
+        totals = '''
+            NULL::SMALLINT[] AS placements,
+            0 AS placement_sum,
+            COUNT(*) FILTER (WHERE win_loss) AS wins,
+            COUNT(*) FILTER (WHERE NOT win_loss) AS losses,'''
+
+    await conn.execute(f'''
+        INSERT INTO daily_rollups (puuid, game, day, games, placements, placement_sum, wins, losses, open_elo, close_elo, updated_at)
+        SELECT $1, $2, d.day, d.games, d.placements, d.placement_sum, d.wins, d.losses, o.elo, d.close_elo, $4
+        FROM (
+            SELECT
+                ((to_timestamp(game_datetime / 1000.0) AT TIME ZONE 'America/New_York') - INTERVAL '6 hours')::DATE AS day,
+                COUNT(*) AS games,{totals}
+                (ARRAY_AGG(elo ORDER BY game_datetime DESC))[1] AS close_elo,
+                MIN(game_datetime) AS first_game
+            FROM {games_table}
+            WHERE {puuid_column} = $1 AND game_datetime >= $3
+            GROUP BY 1
+        ) d
+        LEFT JOIN LATERAL (
+            SELECT elo
+            FROM {games_table}
+            WHERE {puuid_column} = $1 AND game_datetime < d.first_game
+            ORDER BY game_datetime DESC
+            LIMIT 1
+        ) o ON TRUE
+        ON CONFLICT (puuid, game, day)
+        DO UPDATE SET
+            games = EXCLUDED.games,
+            placements = EXCLUDED.placements,
+            placement_sum = EXCLUDED.placement_sum,
+            wins = EXCLUDED.wins,
+            losses = EXCLUDED.losses,
+            open_elo = EXCLUDED.open_elo,
+            close_elo = EXCLUDED.close_elo,
+            updated_at = EXCLUDED.updated_at;
+    ''', puuid, game, day_start, int(time.time()))
+
+# Build rollups for every stored game, run once when the table is first created
+async def backfill_rollups(conn):
+    print("Backfilling daily rollups...")
+    players = await conn.fetch('''
+        SELECT tft_puuid AS puuid, 'TFT' AS game, MIN(game_datetime) AS since FROM tft_games GROUP BY tft_puuid
+        UNION ALL
+        SELECT league_puuid, 'League', MIN(game_datetime) FROM league_games GROUP BY league_puuid;
+    ''')
+    for player in players:
+        await refresh_rollups(conn, player['puuid'], player['game'], player['since'])
+    print(f"Backfilled daily rollups for {len(players)} players.")
+
+# One player's totals from from_day through today. With no games in the window both elos are
+# the close of the last day before it
+async def rollup_window(conn, puuid, game, from_day):
+    rows = await conn.fetch('''
+        SELECT games, placements, placement_sum, wins, losses, open_elo, close_elo
+        FROM daily_rollups
+        WHERE puuid = $1 AND game = $2 AND day >= $3
+        ORDER BY day DESC;
+    ''', puuid, game, from_day)
+
+    if not rows:
+        previous = await conn.fetchval('''
+            SELECT close_elo
+            FROM daily_rollups
+            WHERE puuid = $1 AND game = $2 AND day < $3
+            ORDER BY day DESC
+            LIMIT 1;
+        ''', puuid, game, from_day)
+        return {"games": 0, "placements": [], "placement_sum": 0, "wins": 0, "losses": 0, "open_elo": previous, "close_elo": previous}
+
+    return {
+        "games": sum(row['games'] for row in rows),
+        "placements": [placement for row in rows for placement in (row['placements'] or [])],
+        "placement_sum": sum(row['placement_sum'] for row in rows),
+        "wins": sum(row['wins'] for row in rows),
+        "losses": sum(row['losses'] for row in rows),
+        "open_elo": rows[-1]['open_elo'],
+        "close_elo": rows[0]['close_elo'],
+    }
+
+# Per-player totals from from_day through today for the linked users in member_ids, in one query.
+# first_elo is the elo before the period's first game, last_elo after its newest one
+async def period_summary(conn, game, member_ids, from_day):
+    puuid_column = "tft_puuid" if game == "TFT" else "league_puuid"
+    return await conn.fetch(f'''
+        SELECT u.game_name, u.tag_line,
+               SUM(r.games) AS games,
+               SUM(r.placement_sum) AS placement_sum,
+               SUM(r.wins) AS wins,
+               (ARRAY_AGG(r.open_elo ORDER BY r.day))[1] AS first_elo,
+               (ARRAY_AGG(r.close_elo ORDER BY r.day DESC))[1] AS last_elo
+        FROM users u
+        JOIN daily_rollups r ON r.puuid = u.{puuid_column} AND r.game = $2
+        WHERE u.discord_id = ANY($1::BIGINT[]) AND r.day >= $3
+        GROUP BY u.discord_id, u.game_name, u.tag_line;
+    ''', member_ids, game, from_day)
+
 # Function to calculate ranked elo based on given PUUID
-async def calculate_elo(puuid, game, token, region):
+async def calculate_elo(puuid, game, token, region, fresh=False):
     while True:
         try:
             # Fetch summoner data
             if game == "TFT":
-                rank_info = await get_rank_info(region, puuid, token)
-                for entry in rank_info:
-                    if entry['queueType'] == 'RANKED_TFT':
-                        return dicts.rank_to_elo[entry['tier'] + " " + entry['rank']] + int(entry['leaguePoints']), entry['tier'], entry['rank'], entry['leaguePoints']
-                return 0, "UNRANKED", "", 0  # If no ranked TFT entry is found
+                rank_info = await get_rank_info(region, puuid, token, fresh)
             else:
-                rank_info = await get_lol_rank_info(region, puuid, token)
-                for entry in rank_info:
-                    if entry['queueType'] == 'RANKED_SOLO_5x5':
-                        return dicts.rank_to_elo[entry['tier'] + " " + entry['rank']] + int(entry['leaguePoints']), entry['tier'], entry['rank'], entry['leaguePoints']
-                return 0, "UNRANKED", "", 0  # If no ranked League entry is found
+                rank_info = await get_lol_rank_info(region, puuid, token, fresh)
+            return parse_rank(game, rank_info)
 
         except requests.exceptions.HTTPError as e:
             raise e  # Re-raise other errors
@@ -592,47 +1945,44 @@ async def find_all_match_ids(puuid, game, mass_region, token, timestamp):
     counter = 0
 
     try:
-        async with RiotAPIClient(default_headers={"X-Riot-Token": token}) as client:
-            while counter < 1000:
-                if game == "TFT":
-                    if timestamp:
-                        matches = await client.get_tft_match_v1_match_ids_by_puuid(
-                            region=mass_region,
-                            puuid=puuid,
-                            queries={"start": counter, "startTime": timestamp, "count": 100}
-                        )
-                    else:
-                        matches = await client.get_tft_match_v1_match_ids_by_puuid(
-                            region=mass_region,
-                            puuid=puuid,
-                            queries={"start": counter, "count": 100}
-                        )
-
-                elif game == "League":
-                    if timestamp:
-                        matches = await client.get_lol_match_v5_match_ids_by_puuid(
-                            region=mass_region,
-                            puuid=puuid,
-                            queries={"queue": 420, "type": "ranked", "start": counter, "startTime": timestamp, "count": 100}
-                        )
-                    else:
-                        matches = await client.get_lol_match_v5_match_ids_by_puuid(
-                            region=mass_region,
-                            puuid=puuid,
-                            queries={"queue": 420, "type": "ranked", "start": counter, "count": 100}
-                        )
+        client = get_riot_client(token)
+        while counter < 1000:
+            if game == "TFT":
+                if timestamp:
+                    matches = await client.get_tft_match_v1_match_ids_by_puuid(
+                        region=mass_region,
+                        puuid=puuid,
+                        queries={"start": counter, "startTime": timestamp, "count": 100}
+                    )
+                else:
+                    matches = await client.get_tft_match_v1_match_ids_by_puuid(
+                        region=mass_region,
+                        puuid=puuid,
+                        queries={"start": counter, "count": 100}
+                    )
 
+            elif game == "League":
+                if timestamp:
+                    matches = await client.get_lol_match_v5_match_ids_by_puuid(
+                        region=mass_region,
+                        puuid=puuid,
+                        queries={"queue": 420, "type": "ranked", "start": counter, "startTime": timestamp, "count": 100}
+                    )
                 else:
-                    return f"Invalid game type: {game}", None, puuid
+                    matches = await client.get_lol_match_v5_match_ids_by_puuid(
+                        region=mass_region,
+                        puuid=puuid,
+                        queries={"queue": 420, "type": "ranked", "start": counter, "count": 100}
+                    )
 
-                if not matches:
-                    break
+            else:
+                return f"Invalid game type: {game}", None, puuid
 
-                match_list.extend(matches)
-                counter += 100  # Move to next batch
+            if not matches:
+                break
 
-        if not match_list:
-            return f"No matches found for {puuid}.", None
+            match_list.extend(matches)
+            counter += 100  # Move to next batch
 
         return None, match_list
 
@@ -646,65 +1996,130 @@ async def find_match_ids(gameName, tagLine, mode, game, mass_region, token, num_
         return f"Could not find PUUID for {gameName}#{tagLine}.", None
 
     try:
-        async with RiotAPIClient(default_headers={"X-Riot-Token": token}) as client:
+        client = get_riot_client(token)
+        if game == "TFT":
+            match_list = await client.get_tft_match_v1_match_ids_by_puuid(region=mass_region, puuid=puuid)
+        elif game == "League":
+            match_list = await client.get_lol_match_v5_match_ids_by_puuid(region=mass_region, puuid=puuid, queries={"start": 0, "count": num_matches})
+
+        if not match_list:
+            return f"No matches found for {gameName}#{tagLine}.", None, puuid
+
+        target_queue = dicts.game_type_to_id[mode]
+        matching_data = []
+
+        async def mark_match_time(game, match_id, target_queue):
             if game == "TFT":
-                match_list = await client.get_tft_match_v1_match_ids_by_puuid(region=mass_region, puuid=puuid)
+                match_info = await get_match("TFT", mass_region, match_id, token)
+                queue_id = match_info['info']['queue_id']
+                if queue_id == target_queue:
+                    matching_data.append({
+                        "match_id": match_id,
+                        "timestamp": match_info['info']['game_datetime']
+                    })
             elif game == "League":
-                match_list = await client.get_lol_match_v5_match_ids_by_puuid(region=mass_region, puuid=puuid, queries={"start": 0, "count": num_matches})
-
-            if not match_list:
-                return f"No matches found for {gameName}#{tagLine}.", None, puuid
-
-            target_queue = dicts.game_type_to_id[mode]
-            matching_data = []
-
-            async def mark_match_time(game, match_id, target_queue):
-                if game == "TFT":
-                    match_info = await client.get_tft_match_v1_match(region=mass_region, id=match_id)
-                    queue_id = match_info['info']['queue_id']
-                    if queue_id == target_queue:
-                        matching_data.append({
-                            "match_id": match_id,
-                            "timestamp": match_info['info']['game_datetime']
-                        })
-                elif game == "League":
-                    match_info = await client.get_lol_match_v5_match(region=mass_region, id=match_id)
-                    queue_id = match_info['info']['queueId']
-                    if queue_id == target_queue:
-
-                        matching_data.append({
-                            "match_id": match_id,
-                            "timestamp": match_info['info']['gameEndTimestamp']
-                        })
-
-            await asyncio.gather(*[mark_match_time(game, match_id, target_queue) for match_id in match_list])
-
-            time_sorted = sorted(matching_data, key=lambda x: x["timestamp"], reverse=True)
-            return None, time_sorted, puuid
+                match_info = await get_match("League", mass_region, match_id, token)
+                queue_id = match_info['info']['queueId']
+                if queue_id == target_queue:
+
+                    matching_data.append({
+                        "match_id": match_id,
+                        "timestamp": match_info['info']['gameEndTimestamp']
+                    })
+
+        await asyncio.gather(*[mark_match_time(game, match_id, target_queue) for match_id in match_list])
+
+        time_sorted = sorted(matching_data, key=lambda x: x["timestamp"], reverse=True)
+        return None, time_sorted, puuid
     except Exception as err:
             return f"Error fetching last match for {gameName}#{tagLine}: {err}", None, puuid
 
 async def generate_board_preview(index, puuid, region, mass_region, match_id, tft_token, mappings):
 
-    async with RiotAPIClient(default_headers={"X-Riot-Token": tft_token}) as client:
-        match_info = await client.get_tft_match_v1_match(region=mass_region, id=match_id)
+    match_info = await get_match("TFT", mass_region, match_id, tft_token)
 
     participants = match_info['info']['participants']
 
     # Sort in ascending order
     if puuid not in [p['puuid'] for p in participants]:
-        return f"Could not find participant with PUUID: {puuid}"
+        return None, f"Could not find participant with PUUID: {puuid}"
 
     participants_sorted = sorted(participants, key=lambda x: x['placement'])
-    puuid_list = [p['puuid'] for p in participants_sorted]
-    current_index = puuid_list.index(puuid)
     participant = participants_sorted[index]
 
+    # Get summoner's gameName and tagLine from the match_info
+    gameName = participant.get('riotIdGameName', 'Unknown')
+    tagLine = participant.get('riotIdTagline', 'Unknown')
+
     # --- Traits Processing ---
     traits = participant['traits']
     filtered_traits = [trait for trait in traits if trait['style'] >= 1]
     sorted_traits = sorted(filtered_traits, key=lambda x: dicts.style_order.get(x['style'], 5))
-    num_traits = len(sorted_traits)
+
+    companion_id = participant.get("companion", {}).get("content_ID")
+    companion_path = get_companion_icon(mappings["companion_mapping"], companion_id)
+    companion_url = f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/" + companion_path.lower()
+
+    # Fetch trait badges, companion, unit icons and stat icons concurrently
+    trait_images, companion_image, units, gold_image, damage_image = await asyncio.gather(
+        asyncio.gather(*[trait_image(trait['name'], trait['style'], mappings["trait_icon_mapping"]) for trait in sorted_traits]),
+        fetch_image(companion_url),
+        fetch_units(participant.get('units', []), mappings),
+        fetch_image("https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-tft/global/default/images/home/tft_icon_coins.png", (40,40)),
+        fetch_image("https://cdn.tft.tools/general/announce_icon_combat.png", (40,40)),
+    )
+
+    try: 
+        rank_info = await get_rank_info(region, participant["puuid"], tft_token)
+    except Exception as err:
+        return None, f"Error fetching rank info for {gameName}#{tagLine}: {err}"
+
+    tier = "UNRANKED"
+    rank = "I"
+    if rank_info:
+        for entry in rank_info:
+            if entry['queueType'] == 'RANKED_TFT':
+                tier = entry['tier']
+                rank = entry['rank']
+
+    player_placement = participant.get("placement")
+    spec = {
+        "background_color": "#2F3136" if puuid == participant['puuid'] else (0,0,0,0),
+        "trait_images": trait_images,
+        "companion_image": companion_image,
+        "display_name": gameName,
+        "placement": player_placement,
+        "level": participant.get("level","?"),
+        "tier": tier,
+        "rank": rank,
+        "units": units,
+        "unit_count": len(participant.get('units', [])),
+        "gold_image": gold_image,
+        "damage_image": damage_image,
+        "gold_left": participant.get('gold_left','Unknown'),
+        "last_round": participant.get('last_round','Unknown'),
+        "total_damage_to_players": participant.get('total_damage_to_players','Unknown'),
+    }
+    board_png = await run_render(render_board_preview, spec)
+
+    # Return Image & Embed
+    embed_colors = ['#F0B52B', "#B8B5B5", '#A45F00', '#595988', "#748283", '#748283', '#748283', '#748283']
+    embed = discord.Embed(
+        color=discord.Color(int(embed_colors[player_placement - 1].strip("#"), 16))
+    )
+
+    file = discord.File(BytesIO(board_png), filename="player_board.png")
+    embed.set_image(url="attachment://player_board.png")
+
+    return embed, file
+
+# Draw one board preview from already fetched assets, runs in the render pool
+def render_board_preview(spec):
+    background_color = spec["background_color"]
+
+    # --- Traits Processing ---
+    trait_images = spec["trait_images"]
+    num_traits = len(trait_images)
     start_y = 15
 
     if num_traits == 0:
@@ -714,23 +2129,15 @@ async def generate_board_preview(index, puuid, region, mass_region, match_id, tf
 
     trait_img_height = 110
     trait_final_width = 675
-    if puuid == participant['puuid']:
-        background_color = "#2F3136"
-    else:
-        background_color = (0,0,0,0)
-
     trait_final_image = Image.new("RGBA", (trait_final_width, trait_img_height), background_color)
 
-    async def process_trait(trait, i):
-        temp_image = await trait_image(trait['name'], trait['style'], mappings["trait_icon_mapping"])
+    for i, temp_image in enumerate(trait_images):
         if temp_image:
             temp_image = temp_image.convert("RGBA")
             temp_image.thumbnail((trait_img_width, int(trait_img_width*1.16)))
             mask = temp_image.split()[3]
             trait_final_image.paste(temp_image, (trait_img_width * i, start_y), mask)
 
-    # Fetch trait images concurrently
-    await asyncio.gather(*[process_trait(trait, i) for i, trait in enumerate(sorted_traits)])
     font = ImageFont.truetype("fonts/NotoSans-Bold.ttf", size=28)
     bold_font = ImageFont.truetype("fonts/NotoSans-Black.ttf", size=60)  
 
@@ -738,31 +2145,18 @@ async def generate_board_preview(index, puuid, region, mass_region, match_id, tf
     companion_width = 225
     companion_size = 100
     companion_final_image = Image.new("RGBA", (companion_width,  companion_height), background_color)
-    companion_id = participant.get("companion", {}).get("content_ID")
-    companion_path = get_companion_icon(mappings["companion_mapping"], companion_id)
-    companion_url = f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/" + companion_path.lower()
-    companion_image = await fetch_image(companion_url)
-    square = center_square_crop(companion_image)
+    square = center_square_crop(spec["companion_image"])
     circle_img = circular_crop(square)
     circle_img.thumbnail((companion_size,companion_size))
     draw = ImageDraw.Draw(companion_final_image)
 
-    def truncate_text(draw, text, font, max_width):
-        # Truncate text with ellipsis (…) if it exceeds the given pixel width.
-        ellipsis = "…"
-        if draw.textlength(text, font=font) <= max_width:
-            return text
-        while text and draw.textlength(text + ellipsis, font=font) > max_width:
-            text = text[:-1]
-        return text + ellipsis
-        
-    display_name = truncate_text(draw, participant.get('riotIdGameName', 'Unknown'), font, 210)
+    display_name = truncate_text(draw, spec["display_name"], font, 210)
     bbox = font.getbbox(display_name)  # (x_min, y_min, x_max, y_max)
     name_w = bbox[2] - bbox[0]
 
     placements = ["1st", "2nd", "3rd", "4th", "5th", "6th", "7th", "8th"]
     font_color = ['#F0B52B', "#B8B5B5", '#A45F00', '#595988', "#748283", '#748283', '#748283', '#748283']
-    player_placement = participant.get("placement")
+    player_placement = spec["placement"]
     
     draw.text((15, 5), placements[player_placement - 1], font=bold_font, fill=font_color[player_placement - 1])
     if name_w <= companion_size:
@@ -771,20 +2165,8 @@ async def generate_board_preview(index, puuid, region, mass_region, match_id, tf
         draw.text((15,190), display_name, font=font, fill="white")
     companion_final_image.paste(circle_img, (15,90), circle_img)
 
-    try: 
-        rank_info = await get_rank_info(region, participant["puuid"], tft_token)
-    except Exception as err:
-        return None, f"Error fetching rank info for {gameName}#{tagLine}: {err}"
-
-    tier = "UNRANKED"
-    rank = "I"
-    if rank_info:
-        for entry in rank_info:
-            if entry['queueType'] == 'RANKED_TFT':
-                tier = entry['tier']
-                rank = entry['rank']
-
-    rank_str = f"{dicts.rank_to_acronym[tier]}{dicts.rank_to_number[rank]}"
+    tier = spec["tier"]
+    rank_str = f"{dicts.rank_to_acronym[tier]}{dicts.rank_to_number[spec['rank']]}"
 
     bbox = font.getbbox(rank_str)  # (x_min, y_min, x_max, y_max)
     text_w = bbox[2] - bbox[0]
@@ -798,66 +2180,31 @@ async def generate_board_preview(index, puuid, region, mass_region, match_id, tf
     ]
     draw.rounded_rectangle(rect_coords, radius=8, fill=dicts.rank_to_text_fill[tier], outline=None)
     draw.circle((100,175),15, fill="Black", outline="White")
-    draw_centered(draw, str(participant.get("level","?")), font, 100, y=155, fill="White")
+    draw_centered(draw, str(spec["level"]), font, 100, y=155, fill="White")
     draw.text((x + padding_x/2, y), rank_str, font=font, fill="#fdda82" if tier == "CHALLENGER" else "white")
 
     # --- Champions Processing ---
-    units = participant.get('units', [])
-    champ_unit_data_unsorted = []
+    unit_count = spec["unit_count"]
 
     # Calculate total champion image width
-    champ_img_width = int(min((655) / len(units), 70)) if units else 70
+    champ_img_width = int(min((655) / unit_count, 70)) if unit_count else 70
     champ_img_height = 125
     champ_final_image = Image.new("RGBA", (675, champ_img_height), background_color)
 
-    async def process_unit(unit):
-        champion_name = unit["character_id"]
-        tier = unit["tier"]
-        rarity = unit["rarity"]
-        item_names = unit["itemNames"]
-
-        custom_rarity = dicts.rarity_map.get(rarity, rarity)
-        champ_icon_path = get_champ_icon(mappings["champ_mapping"], champion_name).lower()
-        rarity_url = f"https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-tft-team-planner/global/default/images/cteamplanner_championbutton_tier{custom_rarity}.png"
-
-        if champ_icon_path:
-            champion_url = f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{champ_icon_path}.png"
-            champ_task = fetch_image(champion_url, (64, 64))
-            rarity_task = fetch_image(rarity_url, (72, 72))
-            
-            icon_resized, rarity_resized = await asyncio.gather(champ_task, rarity_task)
-
-            champ_unit_data_unsorted.append({
-                "champion_name": champion_name,
-                "icon_resized": icon_resized,
-                "rarity_resized": rarity_resized,
-                "rarity": rarity,
-                "tier": tier,
-                "item_names": item_names
-            })
-
-    # Fetch all champion icons & rarity images concurrently
-    await asyncio.gather(*[process_unit(unit) for unit in units])
-    champ_unit_data = sorted(champ_unit_data_unsorted, key=lambda x: x['rarity'])
-
     # --- Paste Champions & Items ---
-    async def paste_champion(unit, i): 
-        champ_image = await champion_image(unit, mappings["item_mapping"])
-        if champ_image:
-            champ_image.thumbnail((champ_img_width, champ_img_height))
-            champ_final_image.paste(champ_image, (((champ_img_width + 1)* i), 0), champ_image)
-
-    # Process and paste champions concurrently
-    await asyncio.gather(*[paste_champion(unit, i) for i, unit in enumerate(champ_unit_data)])
+    for i, unit in enumerate(spec["units"]):
+        champ_image = compose_champion_tile(unit)
+        champ_image.thumbnail((champ_img_width, champ_img_height))
+        champ_final_image.paste(champ_image, (((champ_img_width + 1)* i), 0), champ_image)
 
     stats_height = 50
     stats_image = Image.new("RGBA", (900, stats_height), background_color)
-    gold_image = await fetch_image("https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-tft/global/default/images/home/tft_icon_coins.png", (40,40))
-    damage_image = await fetch_image("https://cdn.tft.tools/general/announce_icon_combat.png", (40,40))
+    gold_image = spec["gold_image"]
+    damage_image = spec["damage_image"]
 
-    gold_left = str(participant.get('gold_left','Unknown')) + " |"
-    stage, round_num  = divmod(participant.get('last_round','Unknown') - 4 , 7)
-    total_damage_to_players = str(participant.get('total_damage_to_players','Unknown'))
+    gold_left = str(spec['gold_left']) + " |"
+    stage, round_num  = divmod(spec['last_round'] - 4 , 7)
+    total_damage_to_players = str(spec['total_damage_to_players'])
     round_str = f"| {stage+2} - {round_num}"
 
     draw = ImageDraw.Draw(stats_image)
@@ -879,22 +2226,201 @@ async def generate_board_preview(index, puuid, region, mass_region, match_id, tf
     final_combined_image.paste(companion_final_image, (0,0), companion_final_image)
     final_combined_image.paste(stats_image, (0,companion_height), stats_image)
 
-    # Get summoner's gameName and tagLine from the match_info
-    gameName = participant.get('riotIdGameName', 'Unknown')
-    tagLine = participant.get('riotIdTagline', 'Unknown')
+    return image_to_png(final_combined_image)
 
-    # Save & Return Image & Embed
-    final_combined_image.save("player_board.png")
-    embed_colors = ['#F0B52B', "#B8B5B5", '#A45F00', '#595988', "#748283", '#748283', '#748283', '#748283']
-    embed = discord.Embed(
-        color=discord.Color(int(embed_colors[player_placement - 1].strip("#"), 16))
-    )
+# Draw one 1200x150 strip of the "All Boards" view from already fetched assets
+def render_board_strip(spec):
+    background_color = spec["background_color"]
 
-    file = discord.File("player_board.png", filename="player_board.png")
-    embed.set_image(url="attachment://player_board.png")
+    # --- Traits Processing ---
+    trait_images = spec["trait_images"]
+    num_traits = len(trait_images)
+    if num_traits <= 5:
+        start_y = 40
+    elif num_traits <= 9:
+        start_y = 20
+    else: 
+        start_y = 0
+
+    trait_img_width = 56
+    trait_img_height = 150
+    trait_final_width = 310
+    trait_final_image = Image.new("RGBA", (trait_final_width, trait_img_height), background_color)
 
-    return embed, file, final_combined_image
+    for i, temp_image in enumerate(trait_images):
+        if temp_image:
+            temp_image = temp_image.convert("RGBA")
+            temp_image.thumbnail((trait_img_width, int(trait_img_width*1.16)))
+            mask = temp_image.split()[3]
+            if i < 5:
+                trait_final_image.paste(temp_image, (10 + trait_img_width * i, start_y), mask)
+            elif i < 9:
+                trait_final_image.paste(temp_image, (10 + int(trait_img_width * (i - 4.5)), start_y + int(trait_img_width * 0.8)), mask)
+            else:
+                trait_final_image.paste(temp_image, (10 + trait_img_width * int(i - 9), start_y + int(trait_img_width*1.6)), mask)
 
+    font = ImageFont.truetype("fonts/NotoSans-Bold.ttf", size=36)
+
+    companion_height = 150
+    companion_width = 220
+    companion_final_image = Image.new("RGBA", (companion_width,  companion_height), background_color)
+    square = center_square_crop(spec["companion_image"])
+    circle_img = circular_crop(square)
+    circle_img.thumbnail((70,70))
+    draw = ImageDraw.Draw(companion_final_image)
+
+    display_name = truncate_text(draw, spec["display_name"], font, 200)
+
+    draw.text((20,90), display_name, font=font, fill="white")
+    companion_final_image.paste(circle_img, (20,20), circle_img)
+
+    tier = spec["tier"]
+    rank_str = f"{dicts.rank_to_acronym[tier]}{dicts.rank_to_number[spec['rank']]}"
+
+    bbox = font.getbbox(rank_str)  # (x_min, y_min, x_max, y_max)
+    text_w = bbox[2] - bbox[0]
+    padding_x = 12
+    x, y = 100, 25
+    rect_coords = [
+        x, 
+        y, 
+        x + text_w + padding_x, 
+        80
+    ]
+    draw.rounded_rectangle(rect_coords, radius=8, fill=dicts.rank_to_text_fill[tier], outline=None)
+    draw.text((x + padding_x/2, y), rank_str, font=font, fill="#fdda82" if tier == "CHALLENGER" else "white")
+
+    # --- Champions Processing ---
+    unit_count = spec["unit_count"]
+
+    # Calculate total champion image width
+    champ_img_width = int(min((1180 - trait_final_width - companion_width) / unit_count, 70)) if unit_count else 70
+    champ_img_height = 150
+    champ_final_image = Image.new("RGBA", ((1200 - trait_final_width - companion_width), champ_img_height), background_color)
+
+    # --- Paste Champions & Items ---
+    for i, unit in enumerate(spec["units"]):
+        champ_image = compose_champion_tile(unit)
+        champ_image.thumbnail((champ_img_width, 150))
+        champ_final_image.paste(champ_image, (((champ_img_width + 1)* i), 15), champ_image)
+
+    # --- Combine Images ---
+    final_combined_image = Image.new("RGBA", (1200, 150), (0, 0, 0, 0))
+    final_combined_image.paste(trait_final_image, (companion_width, 0), trait_final_image)
+    final_combined_image.paste(champ_final_image, (companion_width + trait_final_width, 0), champ_final_image)
+    final_combined_image.paste(companion_final_image, (0,0), companion_final_image)
+
+    return final_combined_image
+
+# Stack up to four board strips into one 1200x600 image, runs in the render pool
+def render_board_strips(specs):
+    combined_image = Image.new("RGBA", (1200, 600), (255, 255, 255, 0))
+
+    current_y = 0
+    for spec in specs:
+        img = render_board_strip(spec)
+        combined_image.paste(img, (0, current_y), img)
+        current_y += img.height
+
+    return image_to_png(combined_image)
+
+# Per-player TFT match index: queue, time and placement for every participant of every match the bot
+# has seen, filled by the sync and by !r/!h. The Nth match of a queue is picked from here and match
+# documents are only fetched, a window at a time, for ids it hasn't seen yet
+def match_index_rows(match_id, match_info):
+    info = match_info['info']
+    return [
+        (match_id, p['puuid'], info['queue_id'], info['game_datetime'], p['placement'])
+        for p in info['participants']
+    ]
+
+async def index_matches(conn, rows):
+    await conn.executemany('''
+        INSERT INTO match_index (match_id, puuid, queue_id, game_datetime, placement)
+        VALUES ($1, $2, $3, $4, $5)
+        ON CONFLICT (puuid, match_id) DO NOTHING;
+    ''', rows)
+
+# Index every TFT match already in match_cache and every stored ranked game, run once when the table is first created
+async def backfill_match_index(conn):
+    print("Backfilling match index...")
+    matches = 0
+    rows = []
+    async with conn.transaction():
+        async for record in conn.cursor("SELECT match_id, data FROM match_cache WHERE game = 'TFT';"):
+            rows.extend(match_index_rows(record['match_id'], json.loads(zlib.decompress(record['data']))))
+            matches += 1
+            if len(rows) >= 4000:
+                await index_matches(conn, rows)
+                rows = []
+        if rows:
+            await index_matches(conn, rows)
+        # Ranked games stored before match_cache existed
+        await conn.execute('''
+            INSERT INTO match_index (match_id, puuid, queue_id, game_datetime, placement)
+            SELECT match_id, tft_puuid, $1, game_datetime, placement
+            FROM tft_games
+            ON CONFLICT (puuid, match_id) DO NOTHING;
+        ''', dicts.game_type_to_id["Ranked"])
+    print(f"Backfilled match index from {matches} matches.")
+
+# "GameMode" covers every rotating mode queued above it, other modes are one queue
+def queue_matches(mode, queue_id):
+    target_queue = dicts.game_type_to_id[mode]
+    return queue_id > target_queue if mode == "GameMode" else queue_id == target_queue
+
+# Up to limit {match_id, queue_id, game_datetime, placement} of this player's matches in the given mode,
+# newest first. match_ids is Riot's newest-first list, unknown ids are fetched MATCH_FETCH_CONCURRENCY
+# at a time and the walk stops as soon as enough matches of the mode are found
+async def indexed_matches(puuid, match_ids, mode, limit, mass_region, token):
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch('''
+            SELECT match_id, queue_id, game_datetime, placement
+            FROM match_index
+            WHERE puuid = $1 AND match_id = ANY($2::text[])
+        ''', puuid, match_ids)
+    known = {row['match_id']: dict(row) for row in rows}
+
+    found = []
+    for start in range(0, len(match_ids), MATCH_FETCH_CONCURRENCY):
+        window = match_ids[start:start + MATCH_FETCH_CONCURRENCY]
+        unknown = [match_id for match_id in window if match_id not in known]
+        failed = {}
+        if unknown:
+            matches = await get_matches("TFT", mass_region, unknown, token, db_pool, failed)
+            new_rows = [row for match_id, match_info in matches.items() for row in match_index_rows(match_id, match_info)]
+            async with db_pool.acquire() as conn:
+                await index_matches(conn, new_rows)
+            for match_id, row_puuid, queue_id, game_datetime, placement in new_rows:
+                if row_puuid == puuid:
+                    known[match_id] = {"match_id": match_id, "queue_id": queue_id, "game_datetime": game_datetime, "placement": placement}
+
+        for match_id in window:
+            # A gap would shift every later match up a place, so give up instead of skipping it
+            if match_id in failed:
+                raise Exception(f"Could not fetch match {match_id}, try again later")
+            entry = known.get(match_id)
+            if entry and queue_matches(mode, entry['queue_id']):
+                found.append(entry)
+                if len(found) >= limit:
+                    return found
+    return found
+
+# Placements of a linked player's last limit matches in the given mode straight from the index, newest
+# first, with the time of their last sync check
+async def stored_placements(pool, puuid, mode, limit):
+    target_queue = dicts.game_type_to_id[mode]
+    async with pool.acquire() as conn:
+        rows = await conn.fetch('''
+            SELECT placement
+            FROM match_index
+            WHERE puuid = $1 AND game_datetime >= $2
+            AND CASE WHEN $3 THEN queue_id > $4 ELSE queue_id = $4 END
+            ORDER BY game_datetime DESC
+            LIMIT $5;
+        ''', puuid, current_tft_unix * 1000, mode == "GameMode", target_queue, limit)
+        checked_at = await last_synced(conn, [puuid])
+    return [row['placement'] for row in rows], checked_at
 
 # Function to grab previous match data
 async def last_match(gameName, tagLine, mode, mass_region, tft_token, region, game_num):
@@ -906,79 +2432,74 @@ async def last_match(gameName, tagLine, mode, mass_region, tft_token, region, ga
         return f"Please enter a number between 1 and 20.", None, None, 0, None, None
 
     try:
-        async with RiotAPIClient(default_headers={"X-Riot-Token": tft_token}) as client:
-            match_list = await client.get_tft_match_v1_match_ids_by_puuid(region=mass_region, puuid=puuid)
-            if not match_list:
-                return f"No matches found for {gameName}#{tagLine}.", None, None, 0, None, None
+        client = get_riot_client(tft_token)
+        match_list = await client.get_tft_match_v1_match_ids_by_puuid(region=mass_region, puuid=puuid)
+        if not match_list:
+            return f"No matches found for {gameName}#{tagLine}.", None, None, 0, None, None
+
+        # Queue and placement come from the match index, only unseen ids are fetched
+        matching = await indexed_matches(puuid, match_list, mode, game_num, mass_region, tft_token)
+        match_id = matching[game_num - 1]['match_id'] if len(matching) >= game_num else None
+
+        if not match_id:
+            return f"No recent {mode.lower()} matches found for {gameName}#{tagLine}.", None, None, 0, None, None
+
+        match_info = await get_match("TFT", mass_region, match_id, tft_token)
+        participants = match_info['info']['participants']
+        timestamp = match_info['info']['game_datetime'] / 1000
+        formatted_time = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        time_and_time_ago = formatted_time + ", " + time_ago(timestamp)
+        # Names come from the match payload through the Riot ID cache, account-v1 is only a fallback
+        rank_info_tasks = [get_rank_info(region, p['puuid'], tft_token) for p in participants]
+        riot_ids, ranks = await asyncio.gather(
+            resolve_riot_ids([p['puuid'] for p in participants], mass_region, tft_token),
+            asyncio.gather(*rank_info_tasks)
+        )
 
-            target_queue = dicts.game_type_to_id[mode]
-            match_id = None
+        players_data = []
+        player_elos = 0
+        ranked_players = 8
+
+        for i, participant in enumerate(participants):
+            placement = participant['placement']
+            riot_id = riot_ids.get(participant['puuid'])
+            rank_info = ranks[i]
+
+            name = f"{riot_id[0]}#{riot_id[1]}" if riot_id else "Unknown Player"
+            tier_and_rank = ""
+            lp = 0
+
+            for entry in rank_info:
+                if entry['queueType'] == 'RANKED_TFT':
+                    tier = entry['tier']
+                    rank = entry['rank']
+                    tier_and_rank = f"{tier} {rank}"
+                    lp = entry['leaguePoints']
+                    break
 
-            for match in match_list:
-                match_info = await client.get_tft_match_v1_match(region=mass_region, id=match)
-                queue_id = match_info['info']['queue_id']
-                if (mode == "GameMode" and queue_id > target_queue) or (mode != "GameMode" and queue_id == target_queue):
-                    game_num -= 1
-                    if game_num == 0:
-                        match_id = match
-                        break
-
-            if not match_id:
-                return f"No recent {mode.lower()} matches found for {gameName}#{tagLine}.", None, None, 0, None, None
-
-            match_info = await client.get_tft_match_v1_match(region=mass_region, id=match_id)
-            participants = match_info['info']['participants']
-            timestamp = match_info['info']['game_datetime'] / 1000
-            formatted_time = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-            time_and_time_ago = formatted_time + ", " + time_ago(timestamp)
-            riot_ids_tasks = [client.get_account_v1_by_puuid(region=mass_region, puuid=p['puuid']) for p in participants]
-            rank_info_tasks = [get_rank_info(region, p['puuid'], tft_token) for p in participants]
-            riot_ids, ranks = await asyncio.gather(asyncio.gather(*riot_ids_tasks), asyncio.gather(*rank_info_tasks))
-
-            players_data = []
-            player_elos = 0
-            ranked_players = 8
-
-            for i, participant in enumerate(participants):
-                placement = participant['placement']
-                riot_id = riot_ids[i]
-                rank_info = ranks[i]
-
-                name = f"{riot_id.get('gameName', 'Unknown')}#{riot_id.get('tagLine', '')}" if 'gameName' in riot_id else "Unknown Player"
-                tier_and_rank = ""
-                lp = 0
-
-                for entry in rank_info:
-                    if entry['queueType'] == 'RANKED_TFT':
-                        tier = entry['tier']
-                        rank = entry['rank']
-                        tier_and_rank = f"{tier} {rank}"
-                        lp = entry['leaguePoints']
-                        break
-
-                if tier_and_rank:
-                    player_elos += dicts.rank_to_elo.get(tier_and_rank, 0) + lp
-                    rank_icon = dicts.tier_to_rank_icon.get(tier, dicts.tier_to_rank_icon["UNRANKED"])
-                else:
-                    ranked_players -= 1
-                    rank_icon = dicts.tier_to_rank_icon["UNRANKED"]
+            if tier_and_rank:
+                player_elos += dicts.rank_to_elo.get(tier_and_rank, 0) + lp
+                rank_icon = dicts.tier_to_rank_icon.get(tier, dicts.tier_to_rank_icon["UNRANKED"])
+            else:
+                ranked_players -= 1
+                rank_icon = dicts.tier_to_rank_icon["UNRANKED"]
 
-                players_data.append((placement, name, rank_icon))
+            players_data.append((placement, name, rank_icon))
 
-            players_data.sort()
-            avg_elo = player_elos / ranked_players if ranked_players else 0
-            avg_rank, master_lp = round_elo_to_rank(avg_elo)
+        players_data.sort()
+        avg_elo = player_elos / ranked_players if ranked_players else 0
+        avg_rank, master_lp = round_elo_to_rank(avg_elo)
 
-            result = ""
-            full_name = f"{gameName}#{tagLine}"
-            for placement, name, icon in players_data:
-                if custom_equal(full_name, name, "_ "):
-                    result += f"{icon} **{placement}** - **__{name}__**\n"
-                    player_placement = placement
-                else:
-                    result += f"{icon} **{placement}** - {name}\n"
+        result = ""
+        full_name = f"{gameName}#{tagLine}"
+        for placement, name, icon in players_data:
+            if custom_equal(full_name, name, "_ "):
+                result += f"{icon} **{placement}** - **__{name}__**\n"
+                player_placement = placement
+            else:
+                result += f"{icon} **{placement}** - {name}\n"
 
-            return result, match_id, avg_rank, master_lp, time_and_time_ago, player_placement
+        return result, match_id, avg_rank, master_lp, time_and_time_ago, player_placement
 
     except Exception as err:
         return f"Error fetching last match for {gameName}#{tagLine}: {err}", None, None, 0, None
@@ -986,183 +2507,301 @@ async def last_match(gameName, tagLine, mode, mass_region, tft_token, region, ga
 # Function to grab previous match data
 async def league_last_match(gameName, tagLine, mass_region, lol_token, puuid, match_id, mode, mappings, background_color, header):
     try:
-        async with RiotAPIClient(default_headers={"X-Riot-Token": lol_token}) as client:
-
-            match_info = await client.get_lol_match_v5_match(region=mass_region, id=match_id)
-
-            duration = match_info["info"]["gameDuration"]
-            participants = match_info["info"]["participants"]
-            endstamp = match_info["info"]["gameEndTimestamp"] / 1000
-            maxDamage = participants[0]["totalDamageDealtToChampions"]
-            maxTaken = participants[0]["totalDamageTaken"]
-            blue_team = [p for p in participants if p["teamId"] == 100]
-            red_team = [p for p in participants if p["teamId"] == 200]
-
-            blue_win = match_info["info"]["teams"][0]["win"]
-            remake = False
-            for participant in participants:
-                maxDamage = max(participant["totalDamageDealtToChampions"],maxDamage)
-                maxTaken = max(participant["totalDamageTaken"],maxTaken)
-                if participant["gameEndedInEarlySurrender"] == True:
-                    remake = True
-
-                if participant["puuid"] == puuid:
-                    cs = participant["totalMinionsKilled"] + participant["neutralMinionsKilled"]
-                    level = participant["champLevel"]
-                    kills = participant["kills"]
-                    deaths = participant["deaths"]
-                    assists = participant["assists"]
-                    gold = participant["goldEarned"]
-                    killparticipation = participant.get("challenges", {}).get("killParticipation", 0)
-                    win = participant["win"]
-                    tab_final = Image.new("RGBA", (500, 100), background_color)
-
-                    champ_path = get_lol_champ_icon(participant["championId"])
-                    keystone_path = get_keystone_icon(mappings["keystone_mapping"], participant["perks"]["styles"][0]["selections"][0]["perk"]).lower()
-                    runes_path = get_rune_icon(mappings["runes_mapping"], participant["perks"]["styles"][1]["style"]).lower()
-                    summ1_path = get_summs_icon(mappings["summs_mapping"], participant["summoner1Id"]).lower()
-                    summ2_path = get_summs_icon(mappings["summs_mapping"], participant["summoner2Id"]).lower()
-                    items = [participant[f"item{i}"] for i in range(7)]
-                    items_urls = [f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{get_lol_item_icon(mappings['lol_item_mapping'], item).lower()}" for item in items]
-
-                    # --- Fetch images concurrently ---
-                    fetch_tasks = [
-                        fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{champ_path}.png", (60,60)),
-                        fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{keystone_path}", (30,30)),
-                        fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{runes_path}", (20,20)),
-                        fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{summ1_path}", (30,30)),
-                        fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{summ2_path}", (30,30)),
-                        fetch_image(f"https://wiki.leagueoflegends.com/en-us/images/thumb/Gold_colored_icon.png/20px-Gold_colored_icon.png?39991", (20,20)),
-                    ]
-                    # Add item icons
-                    fetch_tasks.extend([fetch_image(url, (30,30)) for url in items_urls])
-
-                    images = await asyncio.gather(*fetch_tasks)
-                    champ_image, keystone_image, runes_image, summ1_image, summ2_image, gold_image, *item_icons = images
-
-                    for i, item_icon in enumerate(item_icons):
-                        tab_final.paste(item_icon, (170 + 30*i, 70), item_icon)
-
-                    tab_final.paste(champ_image, (170,0))
-                    tab_final.paste(keystone_image, (260,0))
-                    tab_final.paste(runes_image,(265,35))
-                    tab_final.paste(summ1_image,(230,0))
-                    tab_final.paste(summ2_image,(230,30))
-                    tab_final.paste(gold_image, (390,75))
-                    draw = ImageDraw.Draw(tab_final)
-
-                    font = ImageFont.truetype("fonts/NotoSans-Bold.ttf", 15)
-                    bold_font = ImageFont.truetype("fonts/NotoSans-Black.ttf", 17)  
-
-                    kda_str = f"{kills} / {deaths} / {assists}"
-                    if deaths == 0:
-                        kda_ratio_str = "Perfect"
-                    else:
-                        kda_ratio = (kills + assists) / deaths
-                        kda_ratio_str = f"{kda_ratio:.2f}:1  KDA"
-                    minutes, secs = divmod(duration, 60)
-                    cspm = cs * 60 / duration
-                    time_str = f"{minutes}m {secs}s"
-                    kp_str = f"P/Kill {killparticipation:.0%}"
-                    cs_str = f"CS {cs} ({cspm:.1f})"
-                    gold_str = f" {gold:,}"
-
-                    if win:
-                        font_color = "#5485eb"
-                    else:
-                        font_color = "#e64253"
-
-                    if remake:
-                        font_color = "#8a8a8a"
-
-                    kda_color = "#8a8a8a"
-                    if kda_ratio_str == "Perfect":
-                        kda_color = "#f78324"
-                    elif kda_ratio >= 5.00:
-                        kda_color = "#f78324"
-                    elif kda_ratio >= 4.00:
-                        kda_color = "#188ae9"
-                    elif kda_ratio >= 3.00:
-                        kda_color = "#29b0a3"
-
-                    if win:
-                        result_str = "Victory"
-                    elif remake:
-                        result_str = "Remake"
-                    else:
-                        result_str = "Defeat"
-
-                    end_str = time_ago(endstamp)
-
-                    draw.text((15,0), f"{mode}", font=bold_font, fill=font_color)
-                    draw.text((15,23), end_str, font=font, fill="white")
-                    draw.text((15,61), result_str, font=font, fill="white")
-                    draw.text((15,81), time_str, font=font, fill="white")
-                    draw.text((295,0), kda_str, font=bold_font, fill="white")
-                    draw.text((295,26), kda_ratio_str, font=font, fill=kda_color)
-                    draw.text((390,0), kp_str, font=font, fill="white")
-                    draw.text((390,26), cs_str, font=font, fill="white")
-                    draw.text((410,75), gold_str, font=font, fill="white")
-                    draw.rectangle([210,40,228,60], fill="black", outline=None)
-                    draw_centered(draw, str(participant["champLevel"]), font, 220, y=40, fill="white")
-                    buffer = BytesIO()
-                    tab_final.save(buffer, format="PNG")
-                    buffer.seek(0)
-
-                    filename = f"tab_{match_id}.png"
-                    final_file = discord.File(buffer, filename=filename)
-
-                    tab_embed = discord.Embed(
-                        title=f"Recent League match for {gameName}#{tagLine}"if header else None,
-                        color=int(font_color.strip("#"), 16)
-                    )
+        match_info = await get_match("League", mass_region, match_id, lol_token)
+
+        duration = match_info["info"]["gameDuration"]
+        participants = match_info["info"]["participants"]
+        endstamp = match_info["info"]["gameEndTimestamp"] / 1000
+        maxDamage = participants[0]["totalDamageDealtToChampions"]
+        maxTaken = participants[0]["totalDamageTaken"]
+        blue_team = [p for p in participants if p["teamId"] == 100]
+        red_team = [p for p in participants if p["teamId"] == 200]
+
+        blue_win = match_info["info"]["teams"][0]["win"]
+        remake = False
+        for participant in participants:
+            maxDamage = max(participant["totalDamageDealtToChampions"],maxDamage)
+            maxTaken = max(participant["totalDamageTaken"],maxTaken)
+            if participant["gameEndedInEarlySurrender"] == True:
+                remake = True
+
+        for participant in participants:
+            if participant["puuid"] == puuid:
+                champ_path = get_lol_champ_icon(participant["championId"])
+                keystone_path = get_keystone_icon(mappings["keystone_mapping"], participant["perks"]["styles"][0]["selections"][0]["perk"]).lower()
+                runes_path = get_rune_icon(mappings["runes_mapping"], participant["perks"]["styles"][1]["style"]).lower()
+                summ1_path = get_summs_icon(mappings["summs_mapping"], participant["summoner1Id"]).lower()
+                summ2_path = get_summs_icon(mappings["summs_mapping"], participant["summoner2Id"]).lower()
+                items = [participant[f"item{i}"] for i in range(7)]
+                items_urls = [f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{get_lol_item_icon(mappings['lol_item_mapping'], item).lower()}" for item in items]
+
+                # --- Fetch images concurrently ---
+                fetch_tasks = [
+                    fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{champ_path}.png", (60,60)),
+                    fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{keystone_path}", (30,30)),
+                    fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{runes_path}", (20,20)),
+                    fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{summ1_path}", (30,30)),
+                    fetch_image(f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{summ2_path}", (30,30)),
+                    fetch_image(f"https://wiki.leagueoflegends.com/en-us/images/thumb/Gold_colored_icon.png/20px-Gold_colored_icon.png?39991", (20,20)),
+                ]
+                # Add item icons
+                fetch_tasks.extend([fetch_image(url, (30,30)) for url in items_urls])
+
+                images = await asyncio.gather(*fetch_tasks)
+                champ_image, keystone_image, runes_image, summ1_image, summ2_image, gold_image, *item_icons = images
+
+                spec = {
+                    "background_color": background_color,
+                    "mode": mode,
+                    "duration": duration,
+                    "end_str": time_ago(endstamp),
+                    "remake": remake,
+                    "win": participant["win"],
+                    "kills": participant["kills"],
+                    "deaths": participant["deaths"],
+                    "assists": participant["assists"],
+                    "cs": participant["totalMinionsKilled"] + participant["neutralMinionsKilled"],
+                    "gold": participant["goldEarned"],
+                    "level": participant["champLevel"],
+                    "killparticipation": participant.get("challenges", {}).get("killParticipation", 0),
+                    "champ_image": champ_image,
+                    "keystone_image": keystone_image,
+                    "runes_image": runes_image,
+                    "summ1_image": summ1_image,
+                    "summ2_image": summ2_image,
+                    "gold_image": gold_image,
+                    "item_icons": item_icons,
+                }
+                tab_png, font_color = await run_render(render_league_tab, spec)
+
+                filename = f"tab_{match_id}.png"
+                final_file = discord.File(BytesIO(tab_png), filename=filename)
+
+                tab_embed = discord.Embed(
+                    title=f"Recent League match for {gameName}#{tagLine}"if header else None,
+                    color=int(font_color.strip("#"), 16)
+                )
 
-                    tab_embed.set_image(url=f"attachment://{filename}")
+                tab_embed.set_image(url=f"attachment://{filename}")
 
-            return None, final_file, tab_embed, maxDamage, maxTaken, duration, blue_team, red_team, blue_win
+        return None, final_file, tab_embed, maxDamage, maxTaken, duration, blue_team, red_team, blue_win
 
     except Exception as err:
         return f"Error fetching last match for {gameName}#{tagLine}: {err}",  None, None, None, None, None, None, None, None
+
+# Draw the player's League match tab from already fetched icons, runs in the render pool
+def render_league_tab(spec):
+    kills = spec["kills"]
+    deaths = spec["deaths"]
+    assists = spec["assists"]
+    cs = spec["cs"]
+    gold = spec["gold"]
+    duration = spec["duration"]
+    win = spec["win"]
+    remake = spec["remake"]
+    killparticipation = spec["killparticipation"]
+    tab_final = Image.new("RGBA", (500, 100), spec["background_color"])
+
+    for i, item_icon in enumerate(spec["item_icons"]):
+        tab_final.paste(item_icon, (170 + 30*i, 70), item_icon)
+
+    tab_final.paste(spec["champ_image"], (170,0))
+    tab_final.paste(spec["keystone_image"], (260,0))
+    tab_final.paste(spec["runes_image"],(265,35))
+    tab_final.paste(spec["summ1_image"],(230,0))
+    tab_final.paste(spec["summ2_image"],(230,30))
+    tab_final.paste(spec["gold_image"], (390,75))
+    draw = ImageDraw.Draw(tab_final)
+
+    font = ImageFont.truetype("fonts/NotoSans-Bold.ttf", 15)
+    bold_font = ImageFont.truetype("fonts/NotoSans-Black.ttf", 17)  
+
+    kda_str = f"{kills} / {deaths} / {assists}"
+    if deaths == 0:
+        kda_ratio_str = "Perfect"
+    else:
+        kda_ratio = (kills + assists) / deaths
+        kda_ratio_str = f"{kda_ratio:.2f}:1  KDA"
+    minutes, secs = divmod(duration, 60)
+    cspm = cs * 60 / duration
+    time_str = f"{minutes}m {secs}s"
+    kp_str = f"P/Kill {killparticipation:.0%}"
+    cs_str = f"CS {cs} ({cspm:.1f})"
+    gold_str = f" {gold:,}"
+
+    if win:
+        font_color = "#5485eb"
+    else:
+        font_color = "#e64253"
+
+    if remake:
+        font_color = "#8a8a8a"
+
+    kda_color = "#8a8a8a"
+    if kda_ratio_str == "Perfect":
+        kda_color = "#f78324"
+    elif kda_ratio >= 5.00:
+        kda_color = "#f78324"
+    elif kda_ratio >= 4.00:
+        kda_color = "#188ae9"
+    elif kda_ratio >= 3.00:
+        kda_color = "#29b0a3"
+
+    if win:
+        result_str = "Victory"
+    elif remake:
+        result_str = "Remake"
+    else:
+        result_str = "Defeat"
+
+    draw.text((15,0), f"{spec['mode']}", font=bold_font, fill=font_color)
+    draw.text((15,23), spec["end_str"], font=font, fill="white")
+    draw.text((15,61), result_str, font=font, fill="white")
+    draw.text((15,81), time_str, font=font, fill="white")
+    draw.text((295,0), kda_str, font=bold_font, fill="white")
+    draw.text((295,26), kda_ratio_str, font=font, fill=kda_color)
+    draw.text((390,0), kp_str, font=font, fill="white")
+    draw.text((390,26), cs_str, font=font, fill="white")
+    draw.text((410,75), gold_str, font=font, fill="white")
+    draw.rectangle([210,40,228,60], fill="black", outline=None)
+    draw_centered(draw, str(spec["level"]), font, 220, y=40, fill="white")
+
+    return image_to_png(tab_final), font_color
+
+# Draw one player's strip in the League team breakdown, runs in the render pool
+def render_league_strip(spec):
+    kills = spec["kills"]
+    deaths = spec["deaths"]
+    assists = spec["assists"]
+    cs = spec["cs"]
+    damagedealt = spec["damagedealt"]
+    gameName = spec["gameName"]
+    tier = spec["tier"]
+    rank = spec["rank"]
+
+    bold_font = ImageFont.truetype("fonts/NotoSans-Black.ttf", 18)  
+
+    strip = Image.new("RGBA", (600, 60), spec["background_color"])
+    draw = ImageDraw.Draw(strip)
+    if deaths == 0:
+        kda_ratio_str = "Perfect"
+    else:
+        kda_ratio = (kills + assists) / deaths
+        kda_ratio_str = f"{kda_ratio:.2f}:1 KDA"
+    cspm = cs * 60 / spec["duration"]
+    kda_str = f"{kills}/{deaths}/{assists}"
+    cs_str = f" CS {cs} "
+    cspm_str = f"{cspm:.1f}/m"
+
+    if len(gameName) > 15:
+        gameName = gameName[:14] + "…"
+
+    keystone_image = spec["keystone_image"]
+    runes_image = spec["runes_image"]
+    gold_image = spec["gold_image"]
+    strip.paste(spec["champ_image"], (15,5))
+    strip.paste(spec["summ1_image"], (65,5))
+    strip.paste(spec["summ2_image"], (65,30))
+    strip.paste(keystone_image, (90,5), keystone_image)
+    strip.paste(runes_image, (94,34), runes_image)
+    strip.paste(gold_image, (515,35), gold_image)
+    for i, item_icon in enumerate(spec["item_icons"]):
+        strip.paste(item_icon, (410 + i*25, 5), item_icon)  # adjust position as needed
+    
+    percentMaxDamage = damagedealt / spec["max_damage"]
+
+    damage_coords = [
+        410,
+        35,
+        410 + percentMaxDamage * 100,
+        55
+    ]
+
+    damageFill_coords = [
+        410 + percentMaxDamage * 100,
+        35,
+        510,
+        55
+
+    ]
+    bbox = bold_font.getbbox(kda_str)  # (x_min, y_min, x_max, y_max)
+    width1 = bbox[2] - bbox[0]         # text width
+
+    kda_color = "#8a8a8a"
+    if kda_ratio_str == "Perfect":
+        kda_color = "#f78324"
+    elif kda_ratio >= 5.00:
+        kda_color = "#f78324"
+    elif kda_ratio >= 4.00:
+        kda_color = "#188ae9"
+    elif kda_ratio >= 3.00:
+        kda_color = "#29b0a3"
+
+    rank_str = f"{dicts.rank_to_acronym[tier]}{dicts.rank_to_number[rank]}"
+    damage_str = f"{damagedealt/1000:.1f}k"
+    participant_gold_str = f"{spec['gold']/1000:.1f}k"
+
+    damage_font = ImageFont.truetype("fonts/NotoSans-Black.ttf", 16)  
+    bbox = bold_font.getbbox(rank_str)  # (x_min, y_min, x_max, y_max)
+    text_w = bbox[2] - bbox[0]
+
+    padding_x = 6
+
+    x, y = 115, 5
+
+    rect_coords = [
+        x, 
+        y, 
+        x + text_w + padding_x, 
+        30
+    ]
+    
+    draw.rectangle([409,34,511,56], fill="black", outline=None)
+    draw.rectangle(damage_coords, fill="#e94054", outline=None)
+    draw.rectangle(damageFill_coords, fill="#2a2736", outline=None)
+    draw.rectangle([45,35,65,55], fill="black", outline=None)
+    draw.text((412,35), damage_str, font = damage_font, fill = "white")
+    draw.rounded_rectangle(rect_coords, radius=8, fill=dicts.rank_to_text_fill[tier], outline=None)
+    draw.text((118, 5), rank_str, font=bold_font, fill="#fdda82" if tier == "CHALLENGER" else "white")
+    draw.text((130 + text_w,5), f"{gameName}", font=bold_font, fill="white")
+    draw.text((115,30), kda_str, font=bold_font, fill="white")
+    draw.text((125 + width1, 30), kda_ratio_str, font=bold_font, fill=kda_color)
+    draw.text((535,35),participant_gold_str, font=damage_font, fill="white")
+
+    draw_centered(draw, cs_str, damage_font, 360, y=10, fill="white")
+    draw_centered(draw, cspm_str, damage_font, 360, y=30, fill="white")
+    draw_centered(draw, str(spec["level"]), damage_font, 55, y=35, fill="white")
+
+    return strip
+
+# Stack the five player strips of one League team, runs in the render pool
+def render_league_team(specs, background_color):
+    # Each strip is 600x60 → total height = 300
+    team_img = Image.new("RGBA", (600, 300), background_color)
+
+    for i, spec in enumerate(specs):
+        team_img.paste(render_league_strip(spec), (0, i * 60)) 
+
+    return image_to_png(team_img)
         
 # Get recent x matches
 async def recent_matches(gameName, tagLine, puuid, mode, mass_region, tft_token, num_matches):
     try:
         # Fetch the latest x matches
-        placements = []
-        real_num_matches = 0
         if num_matches > 20 or num_matches < 0:
             print(f"Please enter a number between 1 and 20.")
             return f"Please enter a number between 1 and 20.", None, None
         
-        async with RiotAPIClient(default_headers={"X-Riot-Token": tft_token}) as client:
-            match_list = await client.get_tft_match_v1_match_ids_by_puuid(region=mass_region, puuid=puuid)
-            if not match_list:
-                print(f"No matches found for {gameName}#{tagLine}.")
-                return f"No matches found for {gameName}#{tagLine}.", None, None
-
-            for match in match_list:
-                match_info = await client.get_tft_match_v1_match(region=mass_region, id=match)
-                if mode == "GameMode":
-                    if match_info['info']['queue_id'] > dicts.game_type_to_id[mode]:
-                        num_matches -= 1
-                        real_num_matches += 1
-                        for participant in match_info['info']['participants']:
-                            player_puuid = participant['puuid']
-                            if player_puuid == puuid:
-                                placements.append(participant['placement'])
-                                break
-                else:
-                    if match_info['info']['queue_id'] == dicts.game_type_to_id[mode]:
-                        num_matches -= 1
-                        real_num_matches += 1
-                        for participant in match_info['info']['participants']:
-                            player_puuid = participant['puuid']
-                            if player_puuid == puuid:
-                                placements.append(participant['placement'])
-                                break
-                if num_matches <= 0:
-                    break
-                
+        client = get_riot_client(tft_token)
+        match_list = await client.get_tft_match_v1_match_ids_by_puuid(region=mass_region, puuid=puuid)
+        if not match_list:
+            print(f"No matches found for {gameName}#{tagLine}.")
+            return f"No matches found for {gameName}#{tagLine}.", None, None
+
+        matching = await indexed_matches(puuid, match_list, mode, num_matches, mass_region, tft_token)
+        placements = [entry['placement'] for entry in matching]
+        real_num_matches = len(placements)
+
         if real_num_matches == 0:
             print(f"No recent {mode} matches found for {gameName}#{tagLine}.")
             return f"No recent {mode} matches found for {gameName}#{tagLine}.", None, None
@@ -1219,87 +2858,134 @@ async def check_data_name_tag(name, tag, pool, game):
         # User not found
         return False, name, tag, None, None, None, None
 
+# Finished trait badges (icon on style texture) are built once per (icon, style) and kept on disk,
+# keyed by the icon path so a new set's data never reuses an old badge
+BADGE_CACHE_DIR = os.path.join(CACHE_DIR, "trait_badges")
+os.makedirs(BADGE_CACHE_DIR, exist_ok=True)
+
+def build_trait_badge(texture, icon):
+    # Convert white parts of the icon to black for better visibility (retain transparency)
+    pixels = np.array(icon.convert("RGBA"))
+    white = (pixels[..., 0] > 200) & (pixels[..., 1] > 200) & (pixels[..., 2] > 200)
+    pixels[white, :3] = 0
+    icon_resized = Image.fromarray(pixels, "RGBA").resize((64, 64), Image.LANCZOS)
+
+    # Paste the icon onto the texture
+    texture.paste(icon_resized, (12, 18), icon_resized)
+    return texture
+
 # Command to get trait icon with texture 
 async def trait_image(trait_name: str, style: int, trait_icon_mapping):
     try:
-        # Download the trait texture  
-        texture_url = f"https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-tft/global/default/{dicts.style_to_texture.get(style, 'default_texture')}.png"
-        texture = await fetch_image(texture_url)
-
-        # Download the trait icon
         icon_path = get_trait_icon(trait_icon_mapping, trait_name).lower()
-        icon_url = f"https://raw.communitydragon.org/latest/game/{icon_path}.png"
-
-        icon = await fetch_image(icon_url)
-
-        # Convert white parts of the icon to black for better visibility
-        icon = icon.convert("RGBA")
-        pixels = icon.load()
-        for i in range(icon.width):
-            for j in range(icon.height):
-                r, g, b, a = pixels[i, j]
-                if r > 200 and g > 200 and b > 200:  # If the pixel is white
-                    pixels[i, j] = (0, 0, 0, a)  # Change it to black (retain transparency)
-
-        # Resize the icon
-        icon_resized = icon.resize((64, 64), Image.LANCZOS)
+        key = ("trait_badge", icon_path, style)
+        cached = image_memory_cache.get(key)
+        if cached is not None:
+            image_memory_cache.move_to_end(key)
+            image_cache_stats["hits"] += 1
+            return cached.copy()
+        image_cache_stats["misses"] += 1
+
+        badge_hash = hashlib.sha256(f"{icon_path}:{style}".encode()).hexdigest()
+        badge_path = os.path.join(BADGE_CACHE_DIR, f"{badge_hash}.png")
+        if os.path.exists(badge_path):
+            badge = Image.open(badge_path).convert("RGBA")
+        else:
+            # Download the trait texture  
+            texture_url = f"https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-tft/global/default/{dicts.style_to_texture.get(style, 'default_texture')}.png"
+            # Download the trait icon
+            icon_url = f"https://raw.communitydragon.org/latest/game/{icon_path}.png"
+            texture, icon = await asyncio.gather(fetch_image(texture_url), fetch_image(icon_url))
 
-        # Ensure the texture is large enough to paste the icon
-        if texture.width < 64 or texture.height < 64:
-            print(f"Warning: Texture is too small ({texture.width}x{texture.height}), skipping overlay.")
-            return None
+            # Ensure the texture is large enough to paste the icon
+            if texture.width < 64 or texture.height < 64:
+                print(f"Warning: Texture is too small ({texture.width}x{texture.height}), skipping overlay.")
+                return None
 
-        # Paste the icon onto the texture
-        texture.paste(icon_resized, (12, 18), icon_resized)
+            badge = build_trait_badge(texture, icon)
+            buffer = BytesIO()
+            badge.save(buffer, format="PNG")
+            await asyncio.to_thread(write_image_file, badge_path, buffer.getvalue())
 
-        return texture
+        cache_decoded_image(key, badge)
+        return badge.copy()
 
     except Exception as e:
         print(f"Error in trait_image for {trait_name} (style {style}): {e}")
         return None
 
-async def champion_image(unit, item_mapping):
-
-    try:
+# Fetch the portrait, rarity frame, star and item icons for each unit, sorted by rarity
+async def fetch_units(units, mappings):
+    async def fetch_unit(unit):
+        champion_name = unit["character_id"]
         tier = unit["tier"]
-        item_names = unit["item_names"]
-
-        rarity_resized = unit["rarity_resized"]
-        icon_resized = unit["icon_resized"]
-        tile_image = Image.new("RGBA", (72, 115), (0, 0, 0, 0))
-
-        tile_image.paste(rarity_resized, (0, 20), rarity_resized)
-        tile_image.paste(icon_resized, (4, 24), icon_resized)
-
-        # Add tier stars (2★ or 3★)
-        if tier in {2, 3}:
-            tier_url = f"https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-tft/global/default/tft-piece-star-{tier}.png"
-            tier_icon = await fetch_image(tier_url, (72, 36))
-            if tier_icon:
-                tile_image.paste(tier_icon, (0, 0), tier_icon)
-
-        # Add item icons if available
-        if item_names:
-            item_urls = [
-                f"https://raw.communitydragon.org/latest/game/{get_item_icon(item_mapping, item).lower()}"
+        rarity = unit["rarity"]
+        item_names = unit["itemNames"]
+
+        custom_rarity = dicts.rarity_map.get(rarity, rarity)
+        champ_icon_path = get_champ_icon(mappings["champ_mapping"], champion_name)
+        rarity_url = f"https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-tft-team-planner/global/default/images/cteamplanner_championbutton_tier{custom_rarity}.png"
+
+        if not champ_icon_path:
+            return None
+
+        try:
+            champion_url = f"https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/{champ_icon_path.lower()}.png"
+            champ_task = fetch_image(champion_url, (64, 64))
+            rarity_task = fetch_image(rarity_url, (72, 72))
+
+            # Add tier stars (2★ or 3★)
+            if tier in {2, 3}:
+                tier_url = f"https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-tft/global/default/tft-piece-star-{tier}.png"
+                tier_task = fetch_image(tier_url, (72, 36))
+            else:
+                tier_task = asyncio.sleep(0)  # resolves to None
+
+            # Add item icons if available
+            item_tasks = [
+                fetch_image(f"https://raw.communitydragon.org/latest/game/{get_item_icon(mappings['item_mapping'], item).lower()}", (24,24))
                 for item in item_names
             ]
 
-            fetch_tasks = [
-                fetch_image(url, (24,24))
-                for url in item_urls
-            ]
-            item_icons = await asyncio.gather(*fetch_tasks)
+            icon_resized, rarity_resized, tier_icon, item_icons = await asyncio.gather(
+                champ_task, rarity_task, tier_task, asyncio.gather(*item_tasks)
+            )
+        except Exception as e:
+            print(f"Error building champion image for {champion_name}: {e}")
+            return None
 
-            # Center the items horizontally below the portrait
-            for i, item_icon in enumerate(item_icons):
-                tile_image.paste(item_icon, (24 * i, 92), item_icon)
+        return {
+            "champion_name": champion_name,
+            "icon_resized": icon_resized,
+            "rarity_resized": rarity_resized,
+            "rarity": rarity,
+            "tier": tier,
+            "tier_icon": tier_icon,
+            "item_icons": item_icons,
+        }
 
-        return tile_image
+    # Fetch all champion icons & rarity images concurrently
+    unit_data = await asyncio.gather(*[fetch_unit(unit) for unit in units])
+    return sorted([unit for unit in unit_data if unit], key=lambda x: x['rarity'])
 
-    except Exception as e:
-        print(f"Error building champion image for {unit.get('champion_name', 'Unknown')}: {e}")
-        return None
+# Draw one champion tile (frame, portrait, stars, items) from fetched icons
+def compose_champion_tile(unit):
+    rarity_resized = unit["rarity_resized"]
+    icon_resized = unit["icon_resized"]
+    tile_image = Image.new("RGBA", (72, 115), (0, 0, 0, 0))
+
+    tile_image.paste(rarity_resized, (0, 20), rarity_resized)
+    tile_image.paste(icon_resized, (4, 24), icon_resized)
+
+    tier_icon = unit["tier_icon"]
+    if tier_icon:
+        tile_image.paste(tier_icon, (0, 0), tier_icon)
+
+    # Center the items horizontally below the portrait
+    for i, item_icon in enumerate(unit["item_icons"]):
+        tile_image.paste(item_icon, (24 * i, 92), item_icon)
+
+    return tile_image
 
 # Calculate how long ago timestamp was to include in !r response
 def time_ago(timestamp):
@@ -1364,6 +3050,9 @@ def lp_to_div(elo_value):
     return tier, division, excess
 
 async def is_user_in_guild(guild: discord.Guild, user_id: int) -> bool:
+    # Members are only cached when the gateway profile allows it, fall back to a fetch
+    if guild.get_member(user_id):
+        return True
     try:
         await guild.fetch_member(user_id)
         return True
@@ -1419,4 +3108,45 @@ def draw_centered(draw, text, font, center_x, y, fill="white"):
     text_w = bbox[2] - bbox[0]
     # left x so that text's midpoint sits on center_x
     x = center_x - text_w // 2
-    draw.text((x, y), text, font=font, fill=fill)
\ No newline at end of file
+    draw.text((x, y), text, font=font, fill=fill)
+
+def truncate_text(draw, text, font, max_width):
+    # Truncate text with ellipsis (…) if it exceeds the given pixel width.
+    ellipsis = "…"
+    if draw.textlength(text, font=font) <= max_width:
+        return text
+    while text and draw.textlength(text + ellipsis, font=font) > max_width:
+        text = text[:-1]
+    return text + ellipsis
+
+def image_to_png(image):
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+# Draw the placement frequency bar chart for !history, runs in the render pool.
+# Uses a standalone Figure rather than pyplot, whose global state is not thread safe
+def render_placement_chart(frequencies, x_labels, y_labels):
+    fig = Figure()
+    ax = fig.subplots()
+    bar_colors = ['#F0B52B', '#969696', '#A45F00', '#595988', '#596263', '#596263', '#596263', '#596263']
+
+    ax.bar(x_labels, frequencies, color=bar_colors)
+    ax.set_ylabel('Count', color = "white", fontsize=17)
+    ax.set_xticks(x_labels)
+    ax.set_yticks(y_labels)
+    [t.set_color('white') for t in ax.xaxis.get_ticklabels()]
+    [t.set_color('white') for t in ax.yaxis.get_ticklabels()]
+    ax.tick_params(axis='x', color = 'white', labelsize=16)
+    ax.tick_params(axis='y', color = 'white', labelsize=16)
+
+    for spine in ax.spines.values():
+        spine.set_edgecolor('white')
+
+    fig.tight_layout(pad=0.8)
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", transparent=True, dpi=300)
+    buffer.seek(0)
+    img = Image.open(buffer)
+    img = img.resize((240, 180))  # Width, Height in pixels
+    return image_to_png(img)
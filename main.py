@@ -1,6 +1,5 @@
 import re
 import discord
-import requests
 import os
 import pytz
 import datetime
@@ -15,9 +14,9 @@ load_dotenv()
 
 async def create_pool():
     params = config()
-    pool = await asyncpg.create_pool(**params, min_size=2, max_size=10)
+    pool = await asyncpg.create_pool(**params, min_size=2, max_size=int(os.getenv("DB_POOL_MAX_SIZE", 10)))
     print("Connection pool created.")
-    return pool
+    return helpers.InstrumentedPool(pool)
 
 # Get the token
 bot_token = os.getenv("DISCORD_BOT_TOKEN")
@@ -33,73 +32,71 @@ keystone_json_url = "https://raw.communitydragon.org/latest/plugins/rcp-be-lol-g
 runes_json_url = "https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/v1/perkstyles.json"
 summs_json_url = "https://raw.communitydragon.org/latest/plugins/rcp-be-lol-game-data/global/default/v1/summoner-spells.json"
 
-# Setting champion and trait mapping
-response = requests.get(json_url)
-if response.status_code == 200:
-    data = response.json()  # Assuming data is a dictionary
-    
-    # Access the 'sets' property
-    sets_data = data.get("sets", {})  # Get the 'sets' dictionary, default to empty if not found
-    
-    # Change this property at start of each set
-    current_set = sets_data.get("17", {})
-    
-    # Access the 'champions' and 'traits' lists within current set
-    champ_mapping = current_set.get("champions", [])  # Get the 'champions' list, default to empty list if not found
-    trait_icon_mapping = current_set.get("traits", []) # Get the 'traits' list, default to empty list if not found
-    print("Traits and Champions parsed successfully")
-else:
-    print("Failed to fetch data")
-
-# Setting item mapping based on item json
-response = requests.get(item_json_url)
-if response.status_code == 200:
-    item_mapping = response.json()  # Assuming data is a dictionary
-    print("Items parsed successfully")
-else:
-    print("Failed to fetch data")
-
-# Setting item mapping based on item json
-response = requests.get(lol_item_json_url)
-if response.status_code == 200:
-    lol_item_mapping = response.json()  # Assuming data is a dictionary
-    print("Lol items parsed successfully")
-else:
-    print("Failed to fetch data")
-
-response = requests.get(companion_json_url)
-if response.status_code == 200:
-    companion_mapping = response.json()  # Assuming data is a dictionary
-    print("Companions parsed successfully")
-else:
-    print("Failed to fetch data")
-response = requests.get(keystone_json_url)
-if response.status_code == 200:
-    keystone_mapping = response.json()  # Assuming data is a dictionary
-    print("Keystones parsed successfully")
-else:
-    print("Failed to fetch data")
-
-response = requests.get(runes_json_url)
-if response.status_code == 200:
-    runes_data = response.json() 
-    runes_mapping = runes_data.get("styles", [])
-    print("Runes parsed successfully")
-else:
-    print("Failed to fetch data")
+# Change this property at start of each set (or set TFT_SET)
+current_set = os.getenv("TFT_SET", "17")
+
+# Keep only the current set's champions and traits, and only the fields the bot reads.
+# The rest of en_us.json (every past set, all items) is dropped as soon as it is parsed
+def current_set_mapping(data):
+    set_data = data.get("sets", {}).get(current_set, {})
+    return {
+        "champions": helpers.project_fields(set_data.get("champions", []), ("apiName", "tileIcon", "traits")),
+        "traits": helpers.project_fields(set_data.get("traits", []), ("apiName", "icon")),
+    }
+
+# Static game data: name -> (url, transform applied before caching, cache variant)
+# Bump the variant suffix when a projection changes so old cache files aren't reused
+static_sources = {
+    "tft": (json_url, current_set_mapping, f"{current_set}:compact"),
+    "items": (item_json_url, lambda data: helpers.project_fields(data, ("nameId", "squareIconPath")), "compact"),
+    "lol_items": (lol_item_json_url, lambda data: helpers.project_fields(data, ("id", "iconPath")), "compact"),
+    "companions": (companion_json_url, lambda data: helpers.project_fields(data, ("contentId", "loadoutsIcon")), "compact"),
+    "keystones": (keystone_json_url, lambda data: helpers.project_fields(data, ("id", "iconPath")), "compact"),
+    "runes": (runes_json_url, lambda data: helpers.project_fields(data.get("styles", []), ("id", "iconPath")), "compact"),
+    "summs": (summs_json_url, lambda data: helpers.project_fields(data, ("id", "iconPath")), "compact"),
+}
+
+# Fetch everything in parallel, revalidating the on-disk cache and falling back to it when offline
+static_data = asyncio.run(helpers.load_static_data(static_sources))
+
+champ_mapping = static_data["tft"]["champions"]
+trait_icon_mapping = static_data["tft"]["traits"]
+item_mapping = static_data["items"]
+lol_item_mapping = static_data["lol_items"]
+companion_mapping = static_data["companions"]
+keystone_mapping = static_data["keystones"]
+runes_mapping = static_data["runes"]
+summs_mapping = static_data["summs"]
+
+# Index every mapping once so icon lookups are dict hits, helpers.build_mapping_index(raw, mapping_index)
+# rebuilds it in place when the data is refreshed
+mapping_index = helpers.build_mapping_index({
+    "champ_mapping": champ_mapping,
+    "trait_icon_mapping": trait_icon_mapping,
+    "item_mapping": item_mapping,
+    "companion_mapping": companion_mapping,
+    "lol_item_mapping": lol_item_mapping,
+    "keystone_mapping": keystone_mapping,
+    "runes_mapping": runes_mapping,
+    "summs_mapping": summs_mapping,
+})
+
+def env_flag(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+# Gateway profile. No command reads presences, and linked members are tracked in guild_members and looked up
+# on demand, so by default presence updates are off, members aren't cached and guilds aren't chunked on startup
+intents = discord.Intents.default()
+intents.message_content = True                                      # Enable message content intent
+intents.members = env_flag("DISCORD_MEMBERS_INTENT", True)          # Member join/leave events and query_members
+intents.presences = env_flag("DISCORD_PRESENCES_INTENT", False)     # Presence updates, unused by any command
 
-response = requests.get(summs_json_url)
-if response.status_code == 200:
-    summs_mapping = response.json()  # Assuming data is a dictionary
-    print("Summoner spells parsed successfully")
+# DISCORD_MEMBER_CACHE: "none" keeps no members, "intents" caches whatever the enabled intents allow
+if os.getenv("DISCORD_MEMBER_CACHE", "none").strip().lower() == "intents":
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
 else:
-    print("Failed to fetch data")
-
-# Enable all necessary intents
-intents = discord.Intents.default()
-intents.message_content = True  # Enable message content intent
-intents.members = True          # Enable server members intent
-intents.presences = True        # Enable presence intent
+    member_cache_flags = discord.MemberCacheFlags.none()
+chunk_guilds = env_flag("DISCORD_CHUNK_GUILDS", False)
 
 def bot_prefix(bot, message): 
     # Only match if "!" is followed by a letter
@@ -108,26 +105,33 @@ def bot_prefix(bot, message):
     return commands.when_mentioned(bot, message)
 
 # Create bot instance
-bot = commands.Bot(command_prefix=bot_prefix, intents=intents, case_insensitive=True)
+bot = commands.Bot(
+    command_prefix=bot_prefix,
+    intents=intents,
+    member_cache_flags=member_cache_flags,
+    chunk_guilds_at_startup=chunk_guilds,
+    case_insensitive=True
+)
 # Define regions
 mass_region = "americas"
 region = "na1"        
 
 # Take a snapshot of games and LP for !today command
-async def scheduler(pool, interval_minutes=5):
-    """Runs the scheduled task every N minutes in the background."""
+async def scheduler(pool, tick_seconds=60):
+    """Checks every tick for users whose next poll is due and syncs only those."""
     await bot.wait_until_ready()
     eastern = pytz.timezone("America/New_York")
 
-    print(f"Background scheduler started. Updating every {interval_minutes} minutes.")
+    print(f"Background scheduler started. Checking for due users every {tick_seconds} seconds.")
     
     while not bot.is_closed():
-        await asyncio.sleep(interval_minutes * 60)
+        await asyncio.sleep(tick_seconds)
 
         start_time = datetime.datetime.now(eastern).strftime("%Y-%m-%d %H:%M:%S %Z")
         try:
-            await helpers.update_db_games(pool, tft_token, lol_token)
-            print(f"Updated games at {start_time}")
+            polled = await helpers.update_db_games(pool, tft_token, lol_token)
+            if polled:
+                print(f"Updated games for {polled} users at {start_time}, Riot queue depth: {helpers.riot_scheduler.queue_depth()}")
         except Exception as e:
             print(f"Scheduler failed at {start_time}: {e}")
 
@@ -136,22 +140,25 @@ async def scheduler(pool, interval_minutes=5):
 @bot.event
 async def on_ready():
     pool = await create_pool()
+    await helpers.init_db(pool)
+    await helpers.open_riot_clients(tft_token, lol_token)
 
     bot.tft_token = tft_token
     bot.lol_token = lol_token
     bot.region = region
     bot.mass_region = mass_region
-    bot.champ_mapping = champ_mapping
-    bot.item_mapping = item_mapping
-    bot.trait_icon_mapping = trait_icon_mapping
-    bot.companion_mapping = companion_mapping
-    bot.lol_item_mapping = lol_item_mapping
-    bot.keystone_mapping = keystone_mapping
-    bot.runes_mapping = runes_mapping
-    bot.summs_mapping = summs_mapping
+    bot.mapping_index = mapping_index
+    bot.champ_mapping = mapping_index["champ_mapping"]
+    bot.item_mapping = mapping_index["item_mapping"]
+    bot.trait_icon_mapping = mapping_index["trait_icon_mapping"]
+    bot.companion_mapping = mapping_index["companion_mapping"]
+    bot.lol_item_mapping = mapping_index["lol_item_mapping"]
+    bot.keystone_mapping = mapping_index["keystone_mapping"]
+    bot.runes_mapping = mapping_index["runes_mapping"]
+    bot.summs_mapping = mapping_index["summs_mapping"]
     bot.pool = pool
 
-    bot.loop.create_task(scheduler(pool, interval_minutes=5))
+    bot.loop.create_task(scheduler(pool, tick_seconds=int(os.getenv("POLL_TICK_SECONDS", 60))))
     try:
         await bot.load_extension('commands')
         await bot.tree.sync()
@@ -172,9 +179,47 @@ async def on_command_error(ctx, error):
 async def on_command(ctx):
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"Command used: {ctx.command} at {timestamp}")
+    try:
+        await helpers.mark_user_active(bot.pool, ctx.author.id)
+    except Exception as e:
+        print(f"Failed to mark {ctx.author.id} active: {e}")
+
+# Keep the guild_members index current for server leaderboards and summaries
+@bot.event
+async def on_member_join(member):
+    try:
+        await helpers.add_guild_member(bot.pool, member.guild.id, member.id)
+    except Exception as e:
+        print(f"Failed to index {member.id} joining {member.guild.id}: {e}")
+
+@bot.event
+async def on_member_remove(member):
+    try:
+        await helpers.remove_guild_member(bot.pool, member.guild.id, member.id)
+    except Exception as e:
+        print(f"Failed to unindex {member.id} leaving {member.guild.id}: {e}")
+
+# on_member_remove only fires for cached members, the raw event covers the rest
+@bot.event
+async def on_raw_member_remove(payload):
+    if not isinstance(payload.user, discord.Member):
+        try:
+            await helpers.remove_guild_member(bot.pool, payload.guild_id, payload.user.id)
+        except Exception as e:
+            print(f"Failed to unindex {payload.user.id} leaving {payload.guild_id}: {e}")
+
+@bot.event
+async def on_guild_remove(guild):
+    try:
+        await helpers.forget_guild(bot.pool, guild.id)
+    except Exception as e:
+        print(f"Failed to drop guild index for {guild.id}: {e}")
 
 @bot.event
 async def on_close():
+    await helpers.close_riot_clients()
+    await helpers.close_image_session()
+    helpers.close_render_executor()
     await bot.pool.close()
 
 bot.run(bot_token)
\ No newline at end of file